@@ -0,0 +1,346 @@
+"""
+评分审计日志（只追加）
+
+    audit = AuditLog(reader="alice", scorer=scorer)   # 订阅 scorer，记录每个单元格的变更
+    audit.open(audit_path(session_path))              # <session>.audit.sqlite；打开前的事件先缓存在内存
+    audit.flush() / audit.close()
+
+    audit.events(case_path=..., reader=...)           # [(ts, reader, case_path, LorR, mode, joint, old, new)]
+    audit.scoring_time_per_case()                     # {(case_path, reader): 秒}
+    audit.edits_per_joint()                           # {(mode, joint): 次数}
+
+- SQLite（WAL）：阅片者 / case 路径 / 关节存为整数 id，单条事件连同索引约 60 字节，
+  (case, ts) 与 (reader, ts) 上建索引；百万级事件下按 case / 阅片者查询仍是毫秒级
+- 表上有触发器禁止 UPDATE / DELETE，只能追加
+- 写入按批进行：缓存超过 FLUSH_EVENTS 条或距上次写入超过 FLUSH_SECONDS 秒时提交一次
+- 共享会话里每位阅片者的客户端只记录自己的修改：合并其他阅片者变更时用 muted() 包起来
+"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from scorer import REVIEWED, SVDH_SCHEMA
+
+FLUSH_EVENTS = 256
+FLUSH_SECONDS = 2.0
+IDLE_GAP = 300.0      # 同一 case 上相邻两次修改间隔超过该值（秒）不计入评分时长
+
+_MODES = ('JSN', 'BE', REVIEWED)
+_MODE_CODE = {mode: code for code, mode in enumerate(_MODES)}
+_JOINTS = (SVDH_SCHEMA.jsn_keys, SVDH_SCHEMA.be_keys, ('',))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readers (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS cases   (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS joints  (id INTEGER PRIMARY KEY, mode TEXT NOT NULL, joint TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    ts     REAL    NOT NULL,
+    reader INTEGER NOT NULL REFERENCES readers(id),
+    case_  INTEGER NOT NULL REFERENCES cases(id),
+    side   TEXT    NOT NULL,
+    joint  INTEGER NOT NULL REFERENCES joints(id),
+    old,
+    new
+);
+CREATE INDEX IF NOT EXISTS events_case   ON events (case_, ts);
+CREATE INDEX IF NOT EXISTS events_reader ON events (reader, ts);
+CREATE TRIGGER IF NOT EXISTS events_no_update BEFORE UPDATE ON events
+    BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS events_no_delete BEFORE DELETE ON events
+    BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE VIEW IF NOT EXISTS audit AS
+    SELECT e.ts, r.name AS reader, c.path AS case_path, e.side AS LorR,
+           j.mode, j.joint, e.old, e.new
+    FROM events e
+    JOIN readers r ON r.id = e.reader
+    JOIN cases c   ON c.id = e.case_
+    JOIN joints j  ON j.id = e.joint;
+"""
+
+
+def audit_path(session_path):
+    return f"{session_path}.audit.sqlite"
+
+
+def _joint_id(mode_code, joint_index):
+    # joints 表的 id 固定为 mode * 100 + 下标，写入时不用查表
+    return mode_code * 100 + joint_index
+
+
+class AuditLog:
+    def __init__(self, path=None, reader="", scorer=None):
+        self.reader = reader
+        self.path = None
+        self.db = None
+        self.scorer = None
+        self._pending = []          # (ts, case_path, LorR, joint_id, old, new)
+        self._last_flush = time.monotonic()
+        self._muted = 0
+        self._reader_ids = {}
+        self._case_ids = {}
+        self._joint_index = {
+            (mode, joint): _joint_id(code, i)
+            for code, mode in enumerate(_MODES) for i, joint in enumerate(_JOINTS[code])
+        }
+        if path is not None:
+            self.open(path)
+        if scorer is not None:
+            self.attach(scorer)
+
+    # ====================================================
+    #  数据库
+    # ====================================================
+    def open(self, path):
+        """
+        打开（或新建）审计库；之前缓存的事件写入新库
+        """
+        if self.db is not None:
+            if path == self.path:
+                return
+            self.close()
+        db = sqlite3.connect(path, timeout=10.0)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        with db:
+            db.executescript(_SCHEMA)
+            db.executemany(
+                "INSERT OR IGNORE INTO joints (id, mode, joint) VALUES (?, ?, ?)",
+                [(joint_id, mode, joint) for (mode, joint), joint_id in self._joint_index.items()],
+            )
+        self.db = db
+        self.path = path
+        self._reader_ids = {}
+        self._case_ids = {}
+        self.flush()
+
+    def close(self):
+        if self.db is None:
+            return
+        self.flush()
+        self.db.close()
+        self.db = None
+        self.path = None
+
+    def _name_id(self, table, column, cache, name):
+        key = cache.get(name)
+        if key is None:
+            self.db.execute(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", (name,))
+            key = cache[name] = self.db.execute(
+                f"SELECT id FROM {table} WHERE {column} = ?", (name,)).fetchone()[0]
+        return key
+
+    def flush(self):
+        """
+        把缓存的事件写入数据库，返回写入条数；还没有打开数据库时继续缓存
+        """
+        if self.db is None or not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        with self.db:
+            reader = self._name_id("readers", "name", self._reader_ids, self.reader)
+            case_ids = self._case_ids
+            rows = []
+            for ts, case_path, LorR, joint, old, new in pending:
+                case = case_ids.get(case_path)
+                if case is None:
+                    case = self._name_id("cases", "path", case_ids, case_path)
+                rows.append((ts, reader, case, LorR, joint, old, new))
+            self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self._last_flush = time.monotonic()
+        return len(rows)
+
+    # ====================================================
+    #  记录
+    # ====================================================
+    def attach(self, scorer):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+        self.scorer = scorer
+        scorer.subscribe(self._on_score_event)
+
+    def detach(self):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+            self.scorer = None
+
+    @contextmanager
+    def muted(self):
+        """
+        with 块内的变更不记录（例如合并其他阅片者的变更）
+        """
+        self._muted += 1
+        try:
+            yield
+        finally:
+            self._muted -= 1
+
+    def _on_score_event(self, event):
+        if event.kind == 'reload' or self._muted or not event.changes:
+            return
+        ts = time.time()
+        joint_index = self._joint_index
+        self._pending.extend(
+            (ts, event.case_path, event.LorR, joint_index[key], old, new)
+            for key, (old, new) in event.changes.items()
+        )
+        if len(self._pending) >= FLUSH_EVENTS or time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    # ====================================================
+    #  查询
+    # ====================================================
+    def _where(self, case_path=None, reader=None, since=None, until=None):
+        clauses, params = [], []
+        if case_path is not None:
+            clauses.append("case_ = (SELECT id FROM cases WHERE path = ?)")
+            params.append(case_path)
+        if reader is not None:
+            clauses.append("reader = (SELECT id FROM readers WHERE name = ?)")
+            params.append(reader)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def events(self, case_path=None, reader=None, since=None, until=None):
+        """
+        按时间顺序返回 [(ts, reader, case_path, LorR, mode, joint, old, new)]
+        """
+        self.flush()
+        where, params = self._where(case_path, reader, since, until)
+        return self.db.execute(
+            "SELECT e.ts, r.name, c.path, e.side, j.mode, j.joint, e.old, e.new "
+            f"FROM (SELECT * FROM events{where}) e "
+            "JOIN readers r ON r.id = e.reader JOIN cases c ON c.id = e.case_ "
+            "JOIN joints j ON j.id = e.joint ORDER BY e.ts, e.rowid",
+            params,
+        ).fetchall()
+
+    def scoring_time_per_case(self, reader=None, idle=IDLE_GAP):
+        """
+        {(case_path, reader): 秒}。同一阅片者在同一 case 上相邻两次修改的间隔之和，
+        超过 idle 秒的间隔视为离开，不计入
+        """
+        self.flush()
+        where, params = self._where(reader=reader)
+        rows = self.db.execute(
+            "SELECT c.path, r.name, t.seconds FROM ("
+            "  SELECT case_, reader, SUM(CASE WHEN gap <= ? THEN gap ELSE 0 END) AS seconds FROM ("
+            "    SELECT case_, reader, ts - LAG(ts, 1, ts) OVER (PARTITION BY case_, reader ORDER BY ts) AS gap"
+            f"    FROM events{where}"
+            "  ) GROUP BY case_, reader"
+            ") t JOIN cases c ON c.id = t.case_ JOIN readers r ON r.id = t.reader",
+            [idle] + params,
+        )
+        return {(case_path, name): seconds for case_path, name, seconds in rows}
+
+    def edits_per_joint(self, reader=None, since=None, until=None):
+        """
+        {(mode, joint): 修改次数}，不含 reviewed 标记
+        """
+        self.flush()
+        where, params = self._where(reader=reader, since=since, until=until)
+        rows = self.db.execute(
+            "SELECT j.mode, j.joint, n FROM ("
+            f"  SELECT joint, COUNT(*) AS n FROM events{where} GROUP BY joint"
+            ") t JOIN joints j ON j.id = t.joint WHERE j.mode != ?",
+            params + [REVIEWED],
+        )
+        return {(mode, joint): n for mode, joint, n in rows}
+
+    def edits_per_reader(self, since=None, until=None):
+        """
+        {reader: (修改次数, 涉及的 case 数)}
+        """
+        self.flush()
+        where, params = self._where(since=since, until=until)
+        rows = self.db.execute(
+            "SELECT r.name, n, cases FROM ("
+            f"  SELECT reader, COUNT(*) AS n, COUNT(DISTINCT case_) AS cases FROM events{where} GROUP BY reader"
+            ") t JOIN readers r ON r.id = t.reader",
+            params,
+        )
+        return {name: (n, cases) for name, n, cases in rows}
+
+    def reviewed_per_hour(self, reader=None):
+        """
+        {小时起点时间戳: 标记为 reviewed 的 case 数}，用于统计阅片吞吐量
+        """
+        self.flush()
+        where, params = self._where(reader=reader)
+        where += (" AND " if where else " WHERE ") + "joint = ? AND new = 1"
+        rows = self.db.execute(
+            f"SELECT CAST(ts / 3600 AS INTEGER) * 3600 AS hour, COUNT(DISTINCT case_) FROM events{where} "
+            "GROUP BY hour ORDER BY hour",
+            params + [_joint_id(_MODE_CODE[REVIEWED], 0)],
+        )
+        return dict(rows.fetchall())
+
+
+if __name__ == "__main__":
+    import tempfile
+    from scorer import Scorer
+
+    scorer = Scorer()
+    for LorR in ('L', 'R'):
+        scorer.new_info("a.bmp", "a", "a", LorR)
+        scorer.new_info("b.bmp", "b", "b", LorR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = audit_path(os.path.join(tmp, "s.json"))
+        audit = AuditLog(reader="alice", scorer=scorer)
+
+        # 打开数据库之前的修改先缓存
+        scorer.update_info("a.bmp", "L", {"MCP-T": 2, "MCP-I": 1}, None)
+        audit.open(path)
+        scorer.update_info("a.bmp", "L", {"MCP-T": 3, "MCP-I": 1}, {"IP": 5})
+        scorer.set_reviewed("a.bmp", True)
+        with audit.muted():
+            scorer.update_info("b.bmp", "R", {"SC": 4}, None)
+
+        events = audit.events(case_path="a.bmp")
+        assert [(e[4], e[5], e[6], e[7]) for e in events[:4]] == [
+            ("JSN", "MCP-T", None, 2), ("JSN", "MCP-I", None, 1), ("JSN", "MCP-T", 2, 3), ("BE", "IP", None, 5)]
+        assert events[-1][1:] == ("alice", "a.bmp", "R", REVIEWED, "", False, True)
+        assert audit.events(case_path="b.bmp") == []
+        assert audit.edits_per_joint()[("JSN", "MCP-T")] == 2
+        assert audit.edits_per_reader() == {"alice": (6, 1)}
+        assert sum(audit.reviewed_per_hour().values()) == 1
+
+        try:
+            audit.db.execute("DELETE FROM events")
+            raise AssertionError("audit log must be append-only")
+        except sqlite3.DatabaseError:
+            pass
+
+        # 评分时长：间隔超过 idle 的不计入
+        audit.close()
+        other = AuditLog(path, reader="bob")
+        other._pending = [(1000.0, "c.bmp", "L", 0, None, 1), (1030.0, "c.bmp", "L", 1, None, 1),
+                          (5000.0, "c.bmp", "L", 2, None, 1), (5010.0, "c.bmp", "L", 3, None, 1)]
+        other.flush()
+        assert other.scoring_time_per_case(reader="bob") == {("c.bmp", "bob"): 40.0}
+
+        # 百万级事件：批量写入与按 case / 阅片者查询
+        n = 1_000_000
+        t0 = time.perf_counter()
+        for chunk in range(0, n, 100_000):
+            other._pending = [(2e9 + i, f"/data/P{i % 20_000:06d}.bmp", "LR"[i & 1], i % 15, i % 5, (i + 1) % 5)
+                              for i in range(chunk, chunk + 100_000)]
+            other.flush()
+        insert = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        rows = other.events(case_path="/data/P012345.bmp")
+        by_case = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        times = other.scoring_time_per_case(reader="alice")
+        by_reader = time.perf_counter() - t0
+        assert len(rows) == n // 20_000 and ("a.bmp", "alice") in times
+        other.close()
+        print(f"{n} events: insert {insert:.1f}s, {os.path.getsize(path) / n:.0f} B/event, "
+              f"case query {by_case * 1000:.1f} ms, reader query {by_reader * 1000:.1f} ms")
+    print("[OK] audit")
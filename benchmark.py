@@ -0,0 +1,915 @@
+"""
+RA-Scorer 性能基准脚本
+
+用法：
+    python benchmark.py startup      # 启动耗时 + import 耗时拆分
+    python benchmark.py bulk         # Scorer 批量接口 vs 逐条调用
+    python benchmark.py schema       # 1M 条记录创建：模板深拷贝 vs SvdhSchema
+    python benchmark.py server       # 本地评分服务压测（并发客户端 p50 / p99）
+    python benchmark.py mmap         # 图像加载：VTK reader vs 内存映射（延迟 + RSS）
+    python benchmark.py readers      # reader 注册表：各格式 / 各 reader 的加载耗时
+    python benchmark.py thumbnails   # 1 万张缩略图：总耗时与 GUI 线程单次占用
+    python benchmark.py export       # 训练数据导出：各进程数的吞吐与续传
+    python benchmark.py enhance      # 图像增强：各滤波首次计算与缓存命中后切换的耗时
+    python benchmark.py profiling    # 埋点开销：关闭 / 开启时每次调用多花的时间
+    python benchmark.py scorer       # Scorer 各接口随规模的耗时：默认 1k–100k case，--full 加上 1M，--sizes 自定
+    python benchmark.py gui          # offscreen MainWindow 经 LW_Files 切换 case 的延迟（不含渲染）
+
+每次运行的结果追加到 benchmark_history.json（--history 指定其他路径，--no-history 不写），
+并与上一次相同基准的结果比较，耗时增加 20% 以上的指标标记为 [REGRESSION]。
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import random
+import statistics
+import tempfile
+import time
+
+from scorer import Scorer, SVDH_SCHEMA, SVDH_TEMPLATE
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+# ================================
+#        启动耗时
+# ================================
+# 在子进程中冷启动 MainWindow，分别记录 import / 窗口显示 / VTK 初始化 的时间点
+_STARTUP_SNIPPET = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from PyQt5 import QtWidgets
+app = QtWidgets.QApplication(sys.argv)
+t_qt = time.perf_counter()
+import main
+t_import = time.perf_counter()
+window = main.MainWindow()
+window.show()
+t_show = time.perf_counter()
+print(json.dumps({"qt": t_qt - t0, "import_main": t_import - t_qt,
+                  "window_shown": t_show - t0}), flush=True)
+app.processEvents()
+window._init_viewer()
+t_viewer = time.perf_counter()
+print(json.dumps({"viewer_ready": t_viewer - t0}), flush=True)
+"""
+
+
+def _run_python(args, env=None):
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+
+
+def import_time_breakdown(module="main", top=15):
+    """
+    用 python -X importtime 统计 import 耗时，按顶层包汇总（单位 ms）
+    """
+    proc = _run_python(["-X", "importtime", "-c", f"import {module}"])
+    totals = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        self_us, _, name = parts
+        # 只累加 self 时间，避免嵌套重复计算
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+    return [(name, us / 1000.0) for name, us in ranked[:top]], proc.returncode
+
+
+def bench_startup(repeat=3):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = _run_python(["-c", _STARTUP_SNIPPET], env=env)
+        wall = time.perf_counter() - t0
+
+        result = {"process_wall": wall}
+        for line in proc.stdout.splitlines():
+            try:
+                result.update(json.loads(line))
+            except ValueError:
+                pass
+        if "window_shown" not in result:
+            print(proc.stderr[-2000:])
+            raise RuntimeError("startup benchmark failed")
+        runs.append(result)
+
+    print("===== 启动耗时 (s, 取最小值) =====")
+    keys = ["qt", "import_main", "window_shown", "viewer_ready", "process_wall"]
+    summary = {}
+    for key in keys:
+        values = [r[key] for r in runs if key in r]
+        if values:
+            summary[key] = min(values)
+            print(f"{key:>14}: {summary[key]:.3f}")
+        else:
+            print(f"{key:>14}: n/a")
+
+    print("\n===== import 耗时拆分 (ms, self time) =====")
+    for module in ("main", "viewer", "scorer"):
+        breakdown, _ = import_time_breakdown(module)
+        total = sum(ms for _, ms in breakdown)
+        print(f"-- import {module} (top {len(breakdown)}, {total:.1f} ms)")
+        for name, ms in breakdown:
+            print(f"   {name:<24}{ms:8.1f}")
+
+    return summary
+
+
+# ================================
+#        Scorer 批量接口
+# ================================
+def _synthetic_cases(n, seed=0):
+    """
+    生成 n 个 case（每个 case L/R 两条记录）的路径与随机评分
+    """
+    rng = random.Random(seed)
+    jsn_keys = list(SVDH_TEMPLATE['JSN'])
+    be_keys = list(SVDH_TEMPLATE['BE'])
+    cases = []
+    for i in range(n):
+        case_path = f"/synthetic/P{i // 3:06d}_{20100101 + i % 3 * 10000}.bmp"
+        for side in ('L', 'R'):
+            jsn = {k: rng.randint(0, 4) for k in jsn_keys}
+            be = {k: rng.choice((0, 1, 2, 3, 5)) for k in be_keys}
+            cases.append((case_path, side, jsn, be))
+    return cases
+
+
+def _timeit(func):
+    t0 = time.perf_counter()
+    func()
+    return time.perf_counter() - t0
+
+
+LOOP_NEW_CASES = 1000
+
+
+def bench_bulk(n=10000):
+    cases = _synthetic_cases(n)
+    case_paths = list(dict.fromkeys(c[0] for c in cases))
+    # 旧版逐条新建每次都查文件列表，O(n^2)；两种新建只在前 LOOP_NEW_CASES 个 case 上比较
+    head = cases[:2 * min(n, LOOP_NEW_CASES)]
+
+    def loop_new(scorer):
+        for path, side, _, _ in head:
+            name = os.path.basename(path)[:-4]
+            # 与旧版 _write_scorer 一致：每次先查文件列表再新建
+            file_list = scorer.get_file_list()
+            if file_list is None or path not in file_list:
+                scorer.new_info(path, name, name, side)
+
+    def bulk_new(scorer, records):
+        scorer.new_cases(
+            (path, os.path.basename(path)[:-4], os.path.basename(path)[:-4], side)
+            for path, side, _, _ in records
+        )
+
+    results = {
+        "new (loop)": _timeit(lambda: loop_new(Scorer())),
+        "new_cases": _timeit(lambda: bulk_new(Scorer(), head)),
+    }
+    loop_scorer, bulk_scorer = Scorer(), Scorer()
+    bulk_new(loop_scorer, cases)
+    bulk_new(bulk_scorer, cases)
+    results.update({
+        "update (loop)": _timeit(lambda: [loop_scorer.update_info(*c) for c in cases]),
+        "update_many": _timeit(lambda: bulk_scorer.update_many(cases)),
+        "reviewed (loop)": _timeit(lambda: [loop_scorer.set_reviewed(p, True) for p in case_paths]),
+        "set_reviewed_many": _timeit(lambda: bulk_scorer.set_reviewed_many(case_paths)),
+    })
+
+    # 持久化：逐条修改后立即保存 vs 一个事务结束时保存一次
+    save_path = os.path.join(ROOT, "bench_bulk.json")
+    few = cases[:400]
+
+    def loop_save():
+        for record in few:
+            loop_scorer.update_info(*record)
+            loop_scorer.save_to_json(save_path)
+
+    def txn_save():
+        with bulk_scorer.transaction(save_path=save_path):
+            bulk_scorer.update_many(few)
+
+    small = Scorer()
+    small.new_cases((p, "x", "x", s) for p, s, _, _ in few)
+    loop_scorer = bulk_scorer = small
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["update+save (loop)"] = _timeit(loop_save)
+        results["transaction+save"] = _timeit(txn_save)
+    os.remove(save_path)
+
+    print(f"===== Scorer 批量接口 ({n} cases, {len(cases)} records) =====")
+    print(f"注：new (loop) / new_cases 只比较前 {len(head)} 条记录，否则逐条新建 O(n^2) 跑不完")
+    for name, sec in results.items():
+        if name.startswith("new"):
+            count = len(head)
+        elif name.startswith(("reviewed", "set_reviewed")):
+            count = len(case_paths)
+        elif name.endswith("save") or name.endswith("save (loop)"):
+            count = len(few)
+        else:
+            count = len(cases)
+        print(f"{name:>18}: {sec:8.3f} s  {count / sec:12.0f} ops/s")
+    return results
+
+
+# ================================
+#        记录创建（SvdhSchema）
+# ================================
+def _legacy_new_info(case_path, case_id, case_name, LorR, JSN_dict=None, BE_dict=None):
+    # 旧版 Scorer.new_info 的做法：json 往返深拷贝模板，再逐个 key 赋值
+    score_dict = json.loads(json.dumps(SVDH_TEMPLATE))
+    score_dict['case_path'] = case_path
+    score_dict['case_id'] = case_id
+    score_dict['case_name'] = case_name
+    score_dict['LorR'] = LorR
+    for key in score_dict['JSN'].keys():
+        score_dict['JSN'][key] = None if JSN_dict is None else JSN_dict.get(key)
+    for key in score_dict['BE'].keys():
+        score_dict['BE'][key] = None if BE_dict is None else BE_dict.get(key)
+    return score_dict
+
+
+def bench_schema(n=1000000):
+    import tracemalloc
+
+    _, _, jsn, be = _synthetic_cases(1)[0]
+    new_record = SVDH_SCHEMA.new_record
+
+    def create(func, count, with_scores):
+        J, B = (jsn, be) if with_scores else (None, None)
+        return [func("/p/case.bmp", "case", "case", "L", J, B) for _ in range(count)]
+
+    results = {}
+    for label, func in (("json deepcopy", _legacy_new_info), ("SvdhSchema", new_record)):
+        for with_scores in (False, True):
+            name = f"{label} ({'scores' if with_scores else 'empty'})"
+            results[name] = _timeit(lambda: create(func, n, with_scores))
+
+    # 内存：每条记录平均占用
+    memory = {}
+    for label, func in (("json deepcopy", _legacy_new_info), ("SvdhSchema", new_record)):
+        tracemalloc.start()
+        keep = create(func, 100000, True)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory[label] = size / len(keep)
+        del keep
+
+    print(f"===== 记录创建 ({n} 次) =====")
+    for name, sec in results.items():
+        print(f"{name:>24}: {sec:8.3f} s  {n / sec:12.0f} rec/s")
+    for label, per_record in memory.items():
+        print(f"{label:>24}: {per_record:8.0f} B/record")
+    return results
+
+
+# ================================
+#        本地评分服务压测
+# ================================
+async def _http(reader, writer, method, target, body=None, headers=None):
+    payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    lines = [f"{method} {target} HTTP/1.1", "Host: localhost", f"Content-Length: {len(payload)}"]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    data = await reader.readexactly(length)
+    return status, data
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))]
+
+
+def bench_server(n_cases=2000, clients=32, requests_per_client=200):
+    from urllib.parse import quote
+
+    # 合成会话：test/ 下的真实图像 + n_cases 个虚拟 case
+    images = sorted(os.path.join(ROOT, "test", f) for f in os.listdir(os.path.join(ROOT, "test")))
+    scorer = Scorer()
+    scorer.new_cases((p, os.path.basename(p)[:-4], os.path.basename(p)[:-4], side)
+                     for p in images for side in ("L", "R"))
+    scorer.new_cases((p, "x", "x", side, jsn, be) for p, side, jsn, be in _synthetic_cases(n_cases))
+    tmp_dir = tempfile.mkdtemp(prefix="rascorer_bench_")
+    session = os.path.join(tmp_dir, "session.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        scorer.save_to_json(session)
+
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), session, "--port", "0"],
+                            cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        line = proc.stdout.readline()
+        while line and not line.startswith("Serving on"):
+            line = proc.stdout.readline()
+        host, port = line.strip().rsplit("/", 1)[-1].split(":")
+        port = int(port)
+
+        case_paths = scorer.get_file_list()
+        latencies = {}
+        events = {"count": 0}
+
+        async def listen_events():
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(b"GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            await writer.drain()
+            await reader.readuntil(b"\r\n\r\n")
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    if line.startswith(b"data: "):
+                        events["count"] += 1
+            finally:
+                writer.close()
+
+        async def client(seed):
+            rng = random.Random(seed)
+            reader, writer = await asyncio.open_connection(host, port)   # keep-alive，整个客户端复用
+            try:
+                for _ in range(requests_per_client):
+                    r = rng.random()
+                    case_path = rng.choice(case_paths)
+                    query = f"path={quote(case_path)}&side={rng.choice('LR')}"
+                    t0 = time.perf_counter()
+                    if r < 0.6:
+                        kind = "GET info"
+                        status, _ = await _http(reader, writer, "GET", f"/cases/info?{query}")
+                    elif r < 0.85:
+                        kind = "PUT info"
+                        body = {"JSN": {"MCP-T": rng.randint(0, 4)}}
+                        status, _ = await _http(reader, writer, "PUT", f"/cases/info?{query}", body)
+                    elif r < 0.98:
+                        kind = "GET image (range)"
+                        image = quote(rng.choice(images))
+                        start = rng.randint(0, 1000000)
+                        status, _ = await _http(reader, writer, "GET", f"/image?path={image}",
+                                                headers={"Range": f"bytes={start}-{start + 65535}"})
+                    else:
+                        kind = "GET cases"
+                        status, _ = await _http(reader, writer, "GET", "/cases")
+                    latencies.setdefault(kind, []).append(time.perf_counter() - t0)
+                    assert status in (200, 206), (kind, status)
+            finally:
+                writer.close()
+
+        async def run():
+            listener = asyncio.ensure_future(listen_events())
+            await asyncio.sleep(0.1)
+            t0 = time.perf_counter()
+            await asyncio.gather(*(client(i) for i in range(clients)))
+            elapsed = time.perf_counter() - t0
+            await asyncio.sleep(0.2)
+            listener.cancel()
+            return elapsed
+
+        elapsed = asyncio.run(run())
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"===== 评分服务压测 ({clients} clients x {requests_per_client} req, keep-alive) =====")
+    print(f"{total} requests in {elapsed:.2f}s -> {total / elapsed:.0f} req/s, "
+          f"{events['count']} change events pushed")
+    summary = {}
+    for kind, values in sorted(latencies.items()):
+        p50, p99 = _percentile(values, 50) * 1000, _percentile(values, 99) * 1000
+        summary[kind] = {"p50_ms": p50, "p99_ms": p99, "n": len(values)}
+        print(f"{kind:>18}: n={len(values):5d}  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  "
+              f"mean {statistics.mean(values) * 1000:7.2f} ms")
+    return summary
+
+
+# ================================
+#        图像加载：VTK reader vs mmap
+# ================================
+# 子进程中分别测量，避免两种方式的内存互相影响
+_LOAD_SNIPPET = r"""
+import json, os, resource, sys, time
+method, repeat, paths = sys.argv[1], int(sys.argv[2]), sys.argv[3:]
+
+def rss_mb():
+    # (resident, private)：mmap 的文件页属于 shared，可被系统随时回收
+    try:
+        with open("/proc/self/statm") as f:
+            fields = [int(v) for v in f.read().split()]
+        page = os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+        return fields[1] * page, (fields[1] - fields[2]) * page
+    except OSError:
+        return float("nan"), float("nan")
+
+if method == "vtk":
+    from vtkmodules.vtkIOImage import vtkBMPReader
+    def load(path):
+        reader = vtkBMPReader()
+        reader.SetFileName(path)
+        reader.Update()
+        image = reader.GetOutput()
+        image.GetScalarRange()
+        return image
+else:
+    from image_io import load_mapped
+    def load(path):
+        image = load_mapped(path)
+        image.scalar_range()
+        return image.to_vtk()[0]
+
+load(paths[0])   # 预热 import
+base = rss_mb()
+latencies, alive = [], []
+for _ in range(repeat):
+    for path in paths:
+        t0 = time.perf_counter()
+        alive.append(load(path))
+        latencies.append(time.perf_counter() - t0)
+rss, private = rss_mb()
+print(json.dumps({"latencies": latencies, "rss_delta_mb": rss - base[0],
+                  "private_delta_mb": private - base[1],
+                  "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def bench_mmap(repeat=20):
+    paths = sorted(os.path.join(ROOT, "test", f) for f in os.listdir(os.path.join(ROOT, "test")))
+    print(f"===== 图像加载 ({len(paths)} BMP x {repeat}，全部保持在内存中) =====")
+    results = {}
+    for method in ("vtk", "mmap"):
+        proc = _run_python(["-c", _LOAD_SNIPPET, method, str(repeat)] + paths)
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:])
+            raise RuntimeError(f"{method} load benchmark failed")
+        data = json.loads(proc.stdout.strip().splitlines()[-1])
+        lat = data["latencies"]
+        results[method] = {"p50_ms": _percentile(lat, 50) * 1000, "mean_ms": statistics.mean(lat) * 1000,
+                           "rss_delta_mb": data["rss_delta_mb"], "private_delta_mb": data["private_delta_mb"]}
+        print(f"{method:>6}: p50 {results[method]['p50_ms']:7.2f} ms  mean {results[method]['mean_ms']:7.2f} ms  "
+              f"RSS +{data['rss_delta_mb']:7.1f} MB (private +{data['private_delta_mb']:6.1f} MB, "
+              f"{len(lat)} images held)")
+    return results
+
+
+def _write_formats(src, out_dir):
+    """
+    用 VTK writer 把一张 BMP 转存成 PNG / TIFF / JPEG，装有 pydicom 时再写未压缩与 RLE 的 DICOM
+    """
+    from vtkmodules.vtkIOImage import vtkBMPReader, vtkJPEGWriter, vtkPNGWriter, vtkTIFFWriter
+
+    reader = vtkBMPReader()
+    reader.SetFileName(src)
+    reader.Update()
+    paths = {"bmp": src}
+    for ext, writer_cls in (("png", vtkPNGWriter), ("tif", vtkTIFFWriter), ("jpg", vtkJPEGWriter)):
+        writer = writer_cls()
+        writer.SetInputData(reader.GetOutput())
+        writer.SetFileName(os.path.join(out_dir, "image." + ext))
+        writer.Write()
+        paths[ext] = writer.GetFileName()
+
+    try:
+        import pydicom
+        from pydicom.dataset import FileMetaDataset
+        from pydicom.uid import ExplicitVRLittleEndian, RLELossless, generate_uid
+    except ImportError:
+        return paths
+
+    from image_io import read_bmp
+    pixels = read_bmp(src).array
+    if pixels.ndim == 3:
+        pixels = pixels[..., 0]
+    meta = FileMetaDataset()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1.1"
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds = pydicom.Dataset()
+    ds.file_meta = meta
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel, ds.PhotometricInterpretation = 1, "MONOCHROME2"
+    ds.BitsAllocated = ds.BitsStored = 8
+    ds.HighBit, ds.PixelRepresentation = 7, 0
+    ds.PixelData = pixels.tobytes()
+    paths["dcm"] = os.path.join(out_dir, "image.dcm")
+    ds.save_as(paths["dcm"], enforce_file_format=True)
+    try:
+        ds.compress(RLELossless)
+        paths["dcm-rle"] = os.path.join(out_dir, "image_rle.dcm")
+        ds.save_as(paths["dcm-rle"], enforce_file_format=True)
+    except Exception:   # 没有可用的 RLE 编码器
+        pass
+    return paths
+
+
+def bench_readers(repeat=20):
+    from image_io import REGISTRY
+
+    src = sorted(os.path.join(ROOT, "test", f) for f in os.listdir(os.path.join(ROOT, "test")))[0]
+    print(f"===== 图像 reader 注册表（{os.path.basename(src)} 转存为各格式，x {repeat}） =====")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_formats(src, tmp)
+        for label, path in paths.items():
+            for _ in range(repeat):
+                REGISTRY.load(path)
+    stats = REGISTRY.stats()
+    for name, s in stats.items():
+        print(f"{name:>14}: {s['count']:4d} loads  mean {s['mean_ms']:7.2f} ms  max {s['max_ms']:7.2f} ms  "
+              f"({s['failures']} fell through)")
+    return stats
+
+
+def bench_thumbnails(n=10_000):
+    """
+    GUI 线程里的开销：start() 提交耗时 + 单次 poll() 的最大耗时（时间预算 15 ms）
+    """
+    from thumbnails import ThumbnailCache, ThumbnailGenerator
+
+    src = sorted(os.path.join(ROOT, "test", f) for f in os.listdir(os.path.join(ROOT, "test")))
+    print(f"===== 缩略图（{n} 个文件，硬链接自 test/） =====")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(n):
+            path = os.path.join(tmp, f"case_{i:06d}{os.path.splitext(src[i % len(src)])[1]}")
+            os.link(src[i % len(src)], path)
+            paths.append(path)
+
+        generator = ThumbnailGenerator(ThumbnailCache(os.path.join(tmp, "cache")))
+        for label in ("cold", "warm"):
+            t0 = time.perf_counter()
+            generator.start(paths)
+            submit = time.perf_counter() - t0
+            polls = []
+            while not generator.done:
+                t1 = time.perf_counter()
+                generator.poll(budget=0.015)
+                polls.append(time.perf_counter() - t1)
+                time.sleep(0.005)
+            total = time.perf_counter() - t0
+            results[label] = {"total_s": total, "submit_ms": submit * 1000, "max_poll_ms": max(polls) * 1000}
+            print(f"{label:>5}: {total:6.2f} s total, start() {submit * 1000:6.1f} ms, "
+                  f"max poll {max(polls) * 1000:5.1f} ms ({len(polls)} polls)")
+        generator.shutdown()
+    return results
+
+
+def bench_export(n=240):
+    """
+    训练数据导出吞吐：n 个 case（硬链接自 test/），每个 case L / R 各 31 个关节
+    """
+    from dataset import export_dataset, JOINTS
+    from main import JSN_POINT, BE_POINT
+    from scorer import Scorer
+
+    src = sorted(os.path.join(ROOT, "test", f) for f in os.listdir(os.path.join(ROOT, "test")))
+    workers = max(1, (os.cpu_count() or 2) - 1)
+    print(f"===== 训练数据导出（{n} 个 case，{n * 2 * len(JOINTS)} 个裁剪图） =====")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        scorer = Scorer()
+        rng = random.Random(0)
+        with scorer.transaction():
+            for i in range(n):
+                path = os.path.join(tmp, f"case_{i:06d}{os.path.splitext(src[i % len(src)])[1]}")
+                os.link(src[i % len(src)], path)
+                for side in ('L', 'R'):
+                    scorer.new_info(path, f"case_{i}", f"case_{i}", side,
+                                    {k: rng.choice((0, 1, 2, 3, 4)) for k in JSN_POINT},
+                                    {k: rng.choice((0, 1, 2, 3, 5)) for k in BE_POINT})
+        for count in sorted({1, workers}):
+            label = f"{count} worker" + ("s" if count > 1 else "")
+            out = os.path.join(tmp, f"out_{count}")
+            result = export_dataset(scorer, out, JSN_POINT, BE_POINT, (266, 575), workers=count,
+                                    landmarks_file=os.path.join(tmp, "none.json"))
+            rate = result["crops"] / result["seconds"]
+            size = sum(os.path.getsize(os.path.join(out, f)) for f in os.listdir(out)) / 1e6
+            results[label] = {"crops_per_s": rate, "seconds": result["seconds"], "mb": size}
+            print(f"{label:>10}: {result['crops']} crops in {result['seconds']:5.2f} s = {rate:7.0f} crops/s, "
+                  f"{result['shards']} shards, {size:.0f} MB")
+        resumed = export_dataset(scorer, out, JSN_POINT, BE_POINT, (266, 575), workers=workers)
+        print(f"    resume: {resumed['skipped']} cases already exported, {resumed['crops']} crops redone")
+    return results
+
+
+def bench_enhance(repeat=5):
+    """
+    图像增强：各滤波首次计算耗时，与缓存命中后切换的耗时
+    """
+    from enhance import EnhanceCache, EnhanceParams, enhance_image
+    from image_io import DecodeCache
+
+    path = sorted(os.path.join(ROOT, "test", f) for f in os.listdir(os.path.join(ROOT, "test")))[0]
+    decode = DecodeCache()
+    image = decode.load(path)
+    print(f"===== 图像增强（{image.array.shape[1]}x{image.array.shape[0]}） =====")
+    results = {}
+    for label, params in (("clahe", EnhanceParams(clahe=True)), ("unsharp", EnhanceParams(unsharp=1.0)),
+                          ("gamma", EnhanceParams(gamma=0.7)),
+                          ("all", EnhanceParams(clahe=True, unsharp=1.0, gamma=0.7, invert=True))):
+        t = _timeit(lambda: [enhance_image(image, params) for _ in range(repeat)]) / repeat
+        results[label] = t * 1000
+        print(f"{label:>8}: {t * 1000:6.1f} ms")
+    cache = EnhanceCache(decode)
+    params = EnhanceParams(clahe=True, unsharp=1.0)
+    cache.get(path, params)
+    t = _timeit(lambda: [cache.cached(path, params) for _ in range(1000)]) / 1000
+    results["cached_us"] = t * 1e6
+    print(f"  cached: {t * 1e6:6.1f} us")
+    return results
+
+
+def bench_profiling(n=1_000_000):
+    """
+    埋点开销：裸函数 vs @profiled（关闭 / 开启）vs span()（关闭）
+    """
+    from profiling import PROFILER, profiled, span
+
+    def bare():
+        return None
+
+    wrapped = profiled("bench.noop")(bare)
+
+    def with_span():
+        with span("bench.span"):
+            return None
+
+    print(f"===== 埋点开销（{n} 次调用） =====")
+    results = {}
+    was_enabled = PROFILER.enabled
+    for label, func, enabled in (("bare", bare, False), ("profiled-off", wrapped, False),
+                                 ("span-off", with_span, False), ("profiled-on", wrapped, True)):
+        PROFILER.enable(enabled)
+        t = _timeit(lambda: [func() for _ in range(n)])
+        results[label] = t / n * 1e9
+        print(f"{label:>13}: {results[label]:6.0f} ns/call")
+    PROFILER.enable(was_enabled)
+    PROFILER.clear()
+    return results
+
+
+# ================================
+#        基准套件：Scorer 各接口随规模的耗时
+# ================================
+SUITE_SIZES = (1_000, 10_000, 100_000)
+# 1M case 单轮要几分钟、内存数 GB，只在 --full 时运行
+SUITE_SIZES_FULL = SUITE_SIZES + (1_000_000,)
+EXCEL_MAX_ROWS = 1_048_575      # xlsx 单表行数上限（不含表头）
+
+
+def bench_scorer(sizes=SUITE_SIZES):
+    """
+    每个规模（case 数，每个 case L/R 两条记录）逐条调用各接口，单位 s
+    """
+    print("===== Scorer 接口耗时 (s) =====")
+    results = {}
+    for n in sizes:
+        cases = _synthetic_cases(n)
+        keys = [(path, side) for path, side, _, _ in cases]
+        # 每条记录改成下一条记录的评分，保证每次 update 都有实际变化
+        updates = [(path, side, jsn, be) for (path, side, _, _), (_, _, jsn, be) in zip(cases, cases[1:] + cases[:1])]
+        scorer = Scorer()
+        row = {}
+
+        def new_info():
+            for path, side, jsn, be in cases:
+                name = os.path.splitext(os.path.basename(path))[0]
+                scorer.new_info(path, name, name, side, jsn, be)
+
+        def update_info():
+            for path, side, jsn, be in updates:
+                scorer.update_info(path, side, jsn, be)
+
+        def get_info():
+            for path, side in keys:
+                scorer.get_info(path, side)
+
+        row["new_info"] = _timeit(new_info)
+        row["update_info"] = _timeit(update_info)
+        row["get_info"] = _timeit(get_info)
+        row["get_file_list"] = min(_timeit(scorer.get_file_list) for _ in range(5))
+
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            json_path = os.path.join(tmp, "bench.json")
+            row["save_to_json"] = _timeit(lambda: scorer.save_to_json(json_path))
+            row["load_from_json"] = _timeit(lambda: Scorer().load_from_json(json_path))
+            if len(scorer.score_repo) <= EXCEL_MAX_ROWS:
+                row["output_to_excel"] = _timeit(lambda: scorer.output_to_excel(os.path.join(tmp, "bench.xlsx")))
+
+        results[str(n)] = row
+        print(f"-- {n} cases ({len(cases)} records)")
+        for op, t in row.items():
+            print(f"   {op:<16}{t:9.4f}")
+        if "output_to_excel" not in row:
+            print(f"   {'output_to_excel':<16}  skipped (> {EXCEL_MAX_ROWS} rows)")
+    return results
+
+
+# ================================
+#        基准套件：GUI 切换 case（offscreen）
+# ================================
+# 子进程中用 offscreen 平台创建 MainWindow，在 test/ 图像间来回切换。
+# VTK 在 offscreen 平台无法渲染，这里走解码 + scorer + 评分控件这部分，渲染不计入
+_GUI_SNIPPET = r"""
+import json, os, sys, time
+
+if __name__ == "__main__":
+    from PyQt5 import QtWidgets
+    app = QtWidgets.QApplication(sys.argv)
+    import main
+    from image_io import DECODE_CACHE
+    from profiling import PROFILER, span
+
+    class DecodeOnlyViewer:
+        # offscreen 下没有 OpenGL：只做 XRayVTKViewer.update_image 中渲染之前的部分（解码 + vtkImageData）
+        last_reader = None
+
+        def update_image(self, path):
+            with span("image.decode"):
+                image = DECODE_CACHE.load(path)
+            self.last_reader = image.source
+            image.to_vtk()
+            DECODE_CACHE.scalar_range(path)
+            return True
+
+        def focus_on(self, *args):
+            pass
+
+        def reset_view(self):
+            pass
+
+        def set_enhancement(self, params):
+            pass
+
+    rounds = int(sys.argv[1])
+    paths = sys.argv[2:]
+    window = main.MainWindow()
+    window.xray_viewer = DecodeOnlyViewer()
+    window._set_file_list(paths)
+    window.set_enable(True)
+
+    # 经 LW_Files.setCurrentRow → MainWindow._file_changed 切换，与手动点击列表相同：
+    # 写回 / 载入评分、预取、遥测、关节放大与增强的预取、对比视图
+    PROFILER.enable()
+    latencies = []
+    for r in range(rounds):
+        for row in range(len(paths)):
+            t0 = time.perf_counter()
+            window.LW_Files.setCurrentRow(row)
+            app.processEvents()
+            latencies.append(time.perf_counter() - t0)
+    window.close()
+    print(json.dumps({"latencies": latencies, "spans": PROFILER.summary()}))
+"""
+
+
+def bench_gui(rounds=50):
+    env = dict(os.environ)
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    paths = sorted(os.path.join(ROOT, "test", f) for f in os.listdir(os.path.join(ROOT, "test")))
+    proc = _run_python(["-c", _GUI_SNIPPET, str(rounds)] + paths, env=env)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise RuntimeError("GUI benchmark failed")
+    data = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    lat = data["latencies"]
+    results = {"switch_p50_ms": _percentile(lat, 50) * 1000, "switch_p95_ms": _percentile(lat, 95) * 1000}
+    for name, s in data["spans"].items():
+        results[f"{name}_p50_ms"] = s["p50_ms"]
+    print(f"===== GUI 切换 case（{len(paths)} 张 x {rounds} 轮，offscreen，不含渲染） =====")
+    for key, value in results.items():
+        print(f"{key:>34}: {value:7.3f}")
+    return results
+
+
+# ================================
+#        历史记录与回归检查
+# ================================
+HISTORY_PATH = os.path.join(ROOT, "benchmark_history.json")
+REGRESSION_THRESHOLD = 0.2
+# 只比较全部是耗时（越小越好）的基准
+TIMED_BENCHMARKS = ("scorer", "gui")
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def _git_commit():
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return proc.stdout.strip() or None
+
+
+def find_regressions(previous, current, threshold=REGRESSION_THRESHOLD):
+    """
+    返回 [(指标, 上次, 本次)]，本次比上次慢 threshold 以上
+    """
+    old = _flatten({k: v for k, v in previous.items() if k in TIMED_BENCHMARKS})
+    new = _flatten({k: v for k, v in current.items() if k in TIMED_BENCHMARKS})
+    return [(name, old[name], value) for name, value in sorted(new.items())
+            if old.get(name) and value > old[name] * (1 + threshold)]
+
+
+def record_history(results, path=HISTORY_PATH):
+    """
+    追加到历史文件，返回与上一次相同基准结果相比的回归列表
+    """
+    history = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            history = json.load(f)
+
+    previous = {}
+    for entry in reversed(history):
+        for name, value in entry["results"].items():
+            previous.setdefault(name, value)
+
+    history.append({
+        "datetime": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "results": results,
+    })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2, default=str)
+    return find_regressions(previous, results)
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "bulk": bench_bulk,
+    "schema": bench_schema,
+    "server": bench_server,
+    "mmap": bench_mmap,
+    "readers": bench_readers,
+    "thumbnails": bench_thumbnails,
+    "export": bench_export,
+    "enhance": bench_enhance,
+    "profiling": bench_profiling,
+    "scorer": bench_scorer,
+    "gui": bench_gui,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RA-Scorer benchmarks")
+    parser.add_argument("names", nargs="*", default=list(BENCHMARKS),
+                        help="要运行的基准：" + ", ".join(BENCHMARKS))
+    parser.add_argument("--sizes", default=None,
+                        help="scorer 基准的 case 数，逗号分隔（默认 " + ",".join(map(str, SUITE_SIZES)) + "）")
+    parser.add_argument("--full", action="store_true", help="scorer 基准加上 1M case")
+    parser.add_argument("--history", default=HISTORY_PATH, help="结果追加写入的历史文件")
+    parser.add_argument("--no-history", action="store_true", help="不写历史文件")
+    parser.add_argument("--fail-on-regression", action="store_true", help="发现回归时以非零状态退出")
+    args = parser.parse_args()
+
+    if args.sizes:
+        sizes = [int(s) for s in args.sizes.split(",") if s]
+    else:
+        sizes = list(SUITE_SIZES_FULL if args.full else SUITE_SIZES)
+    options = {"scorer": {"sizes": sizes}}
+    results = {}
+    for name in args.names:
+        results[name] = BENCHMARKS[name](**options.get(name, {}))
+
+    if not args.no_history:
+        regressions = record_history(results, args.history)
+        print(f"\n结果已追加到 {args.history}")
+        for name, old, new in regressions:
+            print(f"[REGRESSION] {name}: {old:.4g} -> {new:.4g} (+{(new / old - 1) * 100:.0f}%)")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
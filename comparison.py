@@ -0,0 +1,229 @@
+"""
+多时间点对比视图
+
+    view = ComparisonViewer()
+    view.show_cases(scorer, index.timepoints(path), current=path, side='L')
+
+- 同一病人的各次随访并排显示（最多 MAX_PANES 个，取当前这次及之前最近的几次）
+- 各窗格的相机联动：任一窗格平移 / 缩放，其余窗格跟着移动
+- 所有窗格与主视图共用 image_io.DECODE_CACHE，整个会话里每张图只解码一次
+- 每个窗格左上角叠加该次随访在 Scorer 中的评分（只读）
+- 图像增强与主视图一致（set_enhancement），增强结果同样共用 enhance.ENHANCE_CACHE
+"""
+import os
+
+from PyQt5 import QtCore, QtWidgets
+
+from navigation import split_case_id
+from scorer import SVDH_SCHEMA
+
+MAX_PANES = 3
+
+
+def visit_label(path):
+    case_id = os.path.splitext(os.path.basename(path))[0]
+    patient, date = split_case_id(case_id)
+    if not date:
+        return case_id
+    return f"{patient}  {date[:4]}-{date[4:6]}-{date[6:]}"
+
+
+def select_panes(paths, current, max_panes=MAX_PANES):
+    """
+    paths 为按日期排序的随访；取 current 及其之前最近的 max_panes - 1 次，
+    current 之前不够时用之后的补足
+    """
+    paths = list(paths)
+    if current not in paths:
+        return paths[-max_panes:]
+    i = paths.index(current)
+    start = max(0, min(i - max_panes + 1, len(paths) - max_panes))
+    return paths[start:start + max_panes]
+
+
+def score_overlay(scorer, path, side):
+    """
+    往次评分的只读文字：总分、已打分关节数、各关节分数（未打分的不列出）
+    """
+    idx = scorer.index_map.get((path, side), -1) if scorer is not None else -1
+    lines = [f"{visit_label(path)}  [{side}]"]
+    if idx < 0:
+        lines.append("not scored")
+        return "\n".join(lines)
+    record = scorer.score_repo[idx]
+    for mode, keys, values in (('JSN', SVDH_SCHEMA.jsn_keys, record.jsn), ('BE', SVDH_SCHEMA.be_keys, record.be)):
+        scored = [(k, v) for k, v in zip(keys, values) if v is not None]
+        total = 0
+        for _, v in scored:
+            try:
+                total += int(v)
+            except (TypeError, ValueError):
+                pass
+        lines.append(f"{mode} {total}  ({len(scored)}/{len(keys)})")
+        # 每行 5 个关节
+        items = [f"{k}:{v}" for k, v in scored]
+        for i in range(0, len(items), 5):
+            lines.append("  " + " ".join(items[i:i + 5]))
+    if record.reviewed:
+        lines.append("reviewed")
+    return "\n".join(lines)
+
+
+class ComparisonViewer(QtWidgets.QWidget):
+    def __init__(self, parent=None, max_panes=MAX_PANES):
+        super().__init__(parent, QtCore.Qt.Window)
+        self.setWindowTitle("Compare visits")
+        self.resize(1200, 700)
+        self.max_panes = max_panes
+        self.layout_ = QtWidgets.QHBoxLayout(self)
+        self.layout_.setContentsMargins(0, 0, 0, 0)
+        self.panes = []          # [(container, header QLabel, XRayVTKViewer)]
+        self.pane_paths = []     # 各窗格当前显示的图像路径（与 panes 一一对应）
+        self.paths = []
+        self.enhancement = None
+        self._syncing = False
+
+    def _pane(self, i):
+        from viewer import XRayVTKViewer
+
+        while len(self.panes) <= i:
+            container = QtWidgets.QWidget(self)
+            box = QtWidgets.QVBoxLayout(container)
+            box.setContentsMargins(2, 2, 2, 2)
+            header = QtWidgets.QLabel(container)
+            header.setAlignment(QtCore.Qt.AlignCenter)
+            viewer = XRayVTKViewer(container)
+            viewer.set_enhancement(self.enhancement)
+            box.addWidget(header)
+            box.addWidget(viewer, 1)
+            self.layout_.addWidget(container)
+            camera = viewer.renderer.GetActiveCamera()
+            camera.AddObserver("ModifiedEvent", lambda obj, event, n=len(self.panes): self._sync_cameras(n))
+            self.panes.append((container, header, viewer))
+            self.pane_paths.append(None)
+        return self.panes[i]
+
+    def show_cases(self, scorer, paths, current=None, side='L'):
+        """
+        显示 paths 中（按日期排序）与 current 相邻的几次随访；返回实际显示的路径
+        """
+        shown = select_panes(paths, current, self.max_panes)
+        self._syncing = True
+        try:
+            for i, path in enumerate(shown):
+                container, header, viewer = self._pane(i)
+                container.show()
+                header.setText(visit_label(path) + ("  (current)" if path == current else ""))
+                font = header.font()
+                font.setBold(path == current)
+                header.setFont(font)
+                # 窗口平移（当前随访变了）时同一路径会换到别的窗格：按窗格比较，不是按整组
+                if self.pane_paths[i] != path or viewer.geometry is None:
+                    self.pane_paths[i] = path if viewer.update_image(path) else None
+                viewer.set_overlay_text(score_overlay(scorer, path, side))
+            for container, _, _ in self.panes[len(shown):]:
+                container.hide()
+        finally:
+            self._syncing = False
+        self.paths = shown
+        return shown
+
+    def refresh_scores(self, scorer, side):
+        for path, (_, _, viewer) in zip(self.paths, self.panes):
+            viewer.set_overlay_text(score_overlay(scorer, path, side))
+
+    def set_enhancement(self, params):
+        self.enhancement = params
+        for _, _, viewer in self.panes:
+            viewer.set_enhancement(params)
+
+    def _sync_cameras(self, source):
+        """
+        把第 source 个窗格的相机（焦点、位置、缩放）复制到其余窗格
+        """
+        if self._syncing or source >= len(self.paths):
+            return
+        self._syncing = True
+        try:
+            camera = self.panes[source][2].renderer.GetActiveCamera()
+            focal, position, scale = camera.GetFocalPoint(), camera.GetPosition(), camera.GetParallelScale()
+            for i in range(len(self.paths)):
+                if i == source:
+                    continue
+                viewer = self.panes[i][2]
+                other = viewer.renderer.GetActiveCamera()
+                other.SetFocalPoint(*focal)
+                other.SetPosition(*position)
+                other.SetParallelScale(scale)
+                viewer.renderer.ResetCameraClippingRange()
+                viewer.vtkWidget.GetRenderWindow().Render()
+        finally:
+            self._syncing = False
+
+    def closeEvent(self, event):
+        for _, _, viewer in self.panes:
+            viewer.vtkWidget.Finalize()
+        super().closeEvent(event)
+
+
+if __name__ == "__main__":
+    from scorer import Scorer
+
+    visits = [f"/data/IMAGE007_{d}.bmp" for d in ("20110111", "20120221", "20120534", "20130301")]
+    assert select_panes(visits, visits[2]) == visits[:3]
+    assert select_panes(visits, visits[0]) == visits[:3]
+    assert select_panes(visits, visits[3]) == visits[1:]
+    assert select_panes(visits[:2], visits[1]) == visits[:2]
+    assert visit_label(visits[1]) == "IMAGE007  2012-02-21"
+
+    scorer = Scorer()
+    for LorR in ('L', 'R'):
+        scorer.new_info(visits[0], "IMAGE007", "IMAGE007", LorR)
+    scorer.update_info(visits[0], 'L', {'MCP-T': 2, 'MCP-I': '1'}, {'IP': 3})
+    scorer.set_reviewed(visits[0], True)
+    text = score_overlay(scorer, visits[0], 'L')
+    assert "JSN 3  (2/15)" in text and "MCP-T:2 MCP-I:1" in text and "BE 3  (1/16)" in text
+    assert text.endswith("reviewed")
+    assert score_overlay(scorer, visits[1], 'L').endswith("not scored")
+    print(text)
+
+    # 窗口平移时各窗格的图像跟着标题走（不渲染：用只记录路径的替身 viewer）
+    import sys
+    import types
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    class _Camera:
+        def AddObserver(self, *args):
+            pass
+
+    class _Renderer:
+        def GetActiveCamera(self):
+            return _Camera()
+
+    class _StubViewer(QtWidgets.QWidget):
+        def __init__(self, parent=None):
+            super().__init__(parent)
+            self.renderer = _Renderer()
+            self.geometry = None
+            self.shown = None
+
+        def update_image(self, path):
+            self.shown, self.geometry = path, (1, (1.0, 1.0), False)
+            return True
+
+        def set_overlay_text(self, text):
+            pass
+
+        def set_enhancement(self, params):
+            pass
+
+    sys.modules["viewer"] = types.SimpleNamespace(XRayVTKViewer=_StubViewer)
+    view = ComparisonViewer()
+    for current in (visits[2], visits[3], visits[0]):
+        shown = view.show_cases(scorer, visits, current)
+        assert [viewer.shown for _, _, viewer in view.panes[:len(shown)]] == shown, current
+        assert [header.text().split("  (")[0] for _, header, _ in view.panes[:len(shown)]] == \
+            [visit_label(p) for p in shown]
+    del sys.modules["viewer"]
+    print("[OK] comparison")
@@ -0,0 +1,323 @@
+"""
+导出训练数据：每个关节的裁剪图 + 阅片者给出的 JSN / BE 分数
+
+    python dataset.py <session>.json <out_dir> [--cases-per-shard 16] [--workers 4] [--reviewed-only]
+    python dataset.py                       # 不带参数时运行自检
+
+    export_dataset(scorer, out_dir, JSN_POINT, BE_POINT, schematic_size=(266, 575))
+
+输出目录：
+    shard-00000.npz ...    images (N, S, S) uint8、label (N,) int8（-1 为未打分 / 非法）、
+                           joint (N,) int16（manifest["joints"] 的下标）、side (N,) 'L' / 'R'、case (N,) int32
+    manifest.json          {"joints": [[mode, name], ...], "cases": [path, ...],
+                            "shards": [{"file", "count", "cases": [case 下标], "sha1"}],
+                            "labels": {case 下标: 分数摘要}, ...}
+
+- 裁剪与关节放大视图相同（joint_focus.register / joint_crops），手动标点（landmarks.json）同样生效
+- 每个分片由一个工作进程读图、裁剪、压缩写出；主进程只汇总 manifest
+- 分片写完（原子替换）后才记入 manifest；中断后重新运行时跳过 manifest 里已有且分数摘要未变的 case，
+  分片编号接着往后排，已写出的分片不重写；读不出的 case 下次重试
+- 分数改过的 case 重新导出到新分片，并从旧分片的 "cases" 中移除（iter_shards 只读出 "cases" 中的行）
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from scorer import SCORE_SCALES, SVDH_SCHEMA
+
+CASES_PER_SHARD = 16
+# zlib 1 级：裁剪图只比默认的 6 级大约 1.5%，压缩快 3 倍以上
+COMPRESS_LEVEL = 1
+MANIFEST = "manifest.json"
+JOINTS = [('JSN', k) for k in SVDH_SCHEMA.jsn_keys] + [('BE', k) for k in SVDH_SCHEMA.be_keys]
+
+
+def _label(mode, value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return -1
+    return value if value in SCORE_SCALES[mode] else -1
+
+
+def case_labels(scorer, path):
+    """
+    {side: [label] * len(JOINTS)}，只包含 scorer 中有记录的一侧
+    """
+    labels = {}
+    for side in ('L', 'R'):
+        idx = scorer.index_map.get((path, side), -1)
+        if idx < 0:
+            continue
+        record = scorer.score_repo[idx]
+        labels[side] = ([_label('JSN', v) for v in record.jsn] + [_label('BE', v) for v in record.be])
+    return labels
+
+
+def labels_digest(labels):
+    """
+    case_labels 结果的摘要，记在 manifest["labels"] 中，续传时据此发现改过分数的 case
+    """
+    return hashlib.sha1(json.dumps(labels, sort_keys=True).encode("ascii")).hexdigest()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+
+def save_npz(path, **arrays):
+    """
+    与 np.savez_compressed 相同的格式（np.load 直接读取），压缩级别为 COMPRESS_LEVEL
+    """
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as zf:
+        for name, array in arrays.items():
+            with zf.open(name + ".npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+
+# ================================
+#        进程池中执行的任务
+# ================================
+def _export_shard(out_dir, number, cases, points, schematic_size, landmarks, radius, size):
+    """
+    cases: [(case 下标, path, {side: labels})]；返回分片信息，读不出的 case 记入 "failed"
+    """
+    from image_io import REGISTRY, UnsupportedImage
+    from joint_focus import joint_crops, register
+
+    schematic = [points[joint] for joint in JOINTS]
+    images, label, joint, side_col, case_col, done, failed = [], [], [], [], [], [], []
+    for case, path, labels in cases:
+        try:
+            array = REGISTRY.load(path).array
+        except (UnsupportedImage, OSError):
+            failed.append(case)
+            continue
+        for side, side_labels in labels.items():
+            A = register(points, schematic_size, array, side, landmarks.get((os.path.abspath(path), side)))
+            _, _, crops = joint_crops(array, A, schematic, radius, size)
+            images.append(crops)
+            label.extend(side_labels)
+            joint.extend(range(len(JOINTS)))
+            side_col.extend([side] * len(JOINTS))
+            case_col.extend([case] * len(JOINTS))
+        done.append(case)
+
+    name = f"shard-{number:05d}.npz"
+    path = os.path.join(out_dir, name)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    save_npz(
+        tmp,
+        images=np.concatenate(images) if images else np.zeros((0, size, size), dtype=np.uint8),
+        label=np.array(label, dtype=np.int8),
+        joint=np.array(joint, dtype=np.int16),
+        side=np.array(side_col, dtype="<U1"),
+        case=np.array(case_col, dtype=np.int32),
+    )
+    h = hashlib.sha1()
+    with open(tmp, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    os.replace(tmp, path)
+    return {"file": name, "count": len(label), "cases": done, "failed": failed, "sha1": h.hexdigest()}
+
+
+# ================================
+#        导出
+# ================================
+def export_dataset(scorer, out_dir, jsn_points, be_points, schematic_size, cases_per_shard=CASES_PER_SHARD,
+                   workers=None, reviewed_only=False, landmarks_file=None, progress=None):
+    """
+    返回 {'crops', 'shards', 'skipped', 'relabeled', 'failed', 'seconds'}；
+    skipped 为之前已导出且分数未变（续传跳过）的 case 数，relabeled 为分数改过、重新导出的 case 数
+    """
+    from joint_focus import CROP_RADIUS, CROP_SIZE, default_cache_dir, load_landmarks
+
+    os.makedirs(out_dir, exist_ok=True)
+    points = {('JSN', k): v for k, v in jsn_points.items()}
+    points.update({('BE', k): v for k, v in be_points.items()})
+    landmarks = load_landmarks(landmarks_file or os.path.join(default_cache_dir(), "landmarks.json"))
+
+    manifest = load_manifest(out_dir)
+    settings = {"crop_size": CROP_SIZE, "crop_radius": CROP_RADIUS}
+    if manifest is None or manifest.get("settings") != settings:
+        manifest = {"joints": JOINTS, "settings": settings, "cases": [], "shards": []}
+    # 没有 "labels" 的旧 manifest：无法确认分数未变，全部重新导出
+    digests = manifest.setdefault("labels", {})
+    case_index = {path: i for i, path in enumerate(manifest["cases"])}
+    owner = {case: shard for shard in manifest["shards"] for case in shard["cases"]}
+
+    todo = []
+    pending = {}
+    skipped = relabeled = 0
+    for path in scorer.get_file_list() or ():
+        if reviewed_only and not scorer.get_reviewed(path):
+            continue
+        if path not in case_index:
+            case_index[path] = len(manifest["cases"])
+            manifest["cases"].append(path)
+        case = case_index[path]
+        labels = case_labels(scorer, path)
+        pending[case] = labels_digest(labels)
+        if case in owner:
+            if digests.get(str(case)) == pending[case]:
+                skipped += 1
+                continue
+            relabeled += 1
+        todo.append((case, path, labels))
+
+    t0 = time.perf_counter()
+    first = 1 + max((int(s["file"][6:11]) for s in manifest["shards"]), default=-1)
+    batches = [todo[i:i + cases_per_shard] for i in range(0, len(todo), cases_per_shard)]
+    crops = failed = 0
+    if batches:
+        workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        # spawn：与缩略图、预评分一致，GUI 进程里调用也安全
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches)), mp_context=ctx) as pool:
+            futures = [pool.submit(_export_shard, out_dir, first + i, batch, points, schematic_size, landmarks,
+                                   CROP_RADIUS, CROP_SIZE) for i, batch in enumerate(batches)]
+            for future in as_completed(futures):
+                shard = future.result()
+                # 重新导出的 case 从旧分片中移除；读不出的也移除，旧裁剪图的分数已经过时
+                for case in shard["cases"] + shard["failed"]:
+                    old = owner.pop(case, None)
+                    if old is not None:
+                        old["cases"].remove(case)
+                        digests.pop(str(case), None)
+                for case in shard["cases"]:
+                    owner[case] = shard
+                    digests[str(case)] = pending[case]
+                manifest["shards"].append(shard)
+                manifest["shards"].sort(key=lambda s: s["file"])
+                _write_manifest(out_dir, manifest)
+                crops += shard["count"]
+                failed += len(shard["failed"])
+                if progress is not None:
+                    progress(len(manifest["shards"]), len(batches) + first)
+    elif manifest["shards"] or manifest["cases"]:
+        _write_manifest(out_dir, manifest)
+    return {"crops": crops, "shards": len(batches), "skipped": skipped, "relabeled": relabeled,
+            "failed": failed, "seconds": time.perf_counter() - t0}
+
+
+def iter_shards(out_dir):
+    """
+    依次读出 (images, label, joint, side, case)，便于训练代码直接使用；
+    已在后面的分片中重新导出的 case 不读出
+    """
+    manifest = load_manifest(out_dir) or {"shards": []}
+    for shard in manifest["shards"]:
+        if not shard["cases"]:
+            continue
+        with np.load(os.path.join(out_dir, shard["file"])) as data:
+            arrays = [data[name] for name in ("images", "label", "joint", "side", "case")]
+        keep = np.isin(arrays[4], shard["cases"])
+        if not keep.all():
+            arrays = [array[keep] for array in arrays]
+        yield tuple(arrays)
+
+
+def _self_check():
+    import shutil
+    import tempfile
+    from scorer import Scorer
+    from main import JSN_POINT, BE_POINT
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+    originals = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir))
+    with tempfile.TemporaryDirectory() as tmp:
+        scorer = Scorer()
+        paths = []
+        for i in range(6):
+            path = os.path.join(tmp, f"case_{i}.bmp")
+            shutil.copyfile(originals[i % len(originals)], path)
+            paths.append(path)
+            for side in ('L', 'R'):
+                scorer.new_info(path, f"case_{i}", f"case_{i}", side)
+        paths.append(os.path.join(tmp, "missing.bmp"))
+        scorer.new_info(paths[-1], "missing", "missing", 'L')
+        scorer.update_info(paths[0], 'L', {'MCP-T': 3, 'MCP-I': 'x'}, {'IP': 5})
+        out = os.path.join(tmp, "out")
+        kwargs = dict(schematic_size=(266, 575), cases_per_shard=2, workers=2,
+                      landmarks_file=os.path.join(tmp, "none.json"))
+
+        # 先导出前 3 个 case，模拟中断；再导出全部，只补剩下的
+        partial = Scorer()
+        partial.score_repo = [r for r in scorer.score_repo if r.case_path in paths[:3]]
+        partial.rebuild_index()
+        first = export_dataset(partial, out, JSN_POINT, BE_POINT, **kwargs)
+        assert first["shards"] == 2 and first["crops"] == 3 * 2 * len(JOINTS)
+        result = export_dataset(scorer, out, JSN_POINT, BE_POINT, **kwargs)
+        assert result["skipped"] == 3 and result["failed"] == 1
+        assert result["crops"] == 3 * 2 * len(JOINTS)
+
+        manifest = load_manifest(out)
+        assert [s["file"] for s in manifest["shards"]] == [f"shard-{i:05d}.npz" for i in range(4)]
+        assert sorted(c for s in manifest["shards"] for c in s["cases"]) == list(range(6))
+        images, label, joint, side, case = map(np.concatenate, zip(*iter_shards(out)))
+        assert images.shape[0] == 6 * 2 * len(JOINTS) and images.dtype == np.uint8
+        first_case = (case == manifest["cases"].index(paths[0])) & (side == 'L')
+        labels = dict(zip((JOINTS[j] for j in joint[first_case]), label[first_case]))
+        assert labels[('JSN', 'MCP-T')] == 3 and labels[('JSN', 'MCP-I')] == -1 and labels[('BE', 'IP')] == 5
+        assert export_dataset(scorer, out, JSN_POINT, BE_POINT, **kwargs)["shards"] == 1   # 只重试读不出的
+
+        # 改过分数的 case 重新导出，旧分片中的行不再读出
+        scorer.update_info(paths[1], 'R', {'SC': 2}, {})
+        again = export_dataset(scorer, out, JSN_POINT, BE_POINT, **kwargs)
+        assert again["relabeled"] == 1 and again["skipped"] == 5 and again["crops"] == 2 * len(JOINTS)
+        manifest = load_manifest(out)
+        images, label, joint, side, case = map(np.concatenate, zip(*iter_shards(out)))
+        assert images.shape[0] == 6 * 2 * len(JOINTS)
+        second = (case == manifest["cases"].index(paths[1])) & (side == 'R')
+        assert dict(zip((JOINTS[j] for j in joint[second]), label[second]))[('JSN', 'SC')] == 2
+        assert export_dataset(scorer, out, JSN_POINT, BE_POINT, **kwargs)["relabeled"] == 0
+    print("[OK] dataset")
+
+
+if __name__ == "__main__":
+    import sys
+    from scorer import Scorer
+    from main import JSN_POINT, BE_POINT
+
+    if len(sys.argv) == 1:
+        _self_check()
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Export per-joint crops and labels for model training")
+    parser.add_argument("session", help="Scorer JSON")
+    parser.add_argument("out_dir")
+    parser.add_argument("--cases-per-shard", type=int, default=CASES_PER_SHARD)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--reviewed-only", action="store_true")
+    args = parser.parse_args()
+
+    scorer = Scorer()
+    scorer.load_from_json(args.session)
+    result = export_dataset(scorer, args.out_dir, JSN_POINT, BE_POINT, (266, 575),
+                            cases_per_shard=args.cases_per_shard, workers=args.workers,
+                            reviewed_only=args.reviewed_only,
+                            progress=lambda done, total: print(f"\r{done}/{total} shards", end="", flush=True))
+    print(f"\n{result['crops']} crops in {result['shards']} shards, {result['seconds']:.1f} s "
+          f"({result['crops'] / max(result['seconds'], 1e-9):.0f} crops/s), "
+          f"{result['skipped']} cases already exported, {result['relabeled']} re-exported with new scores, "
+          f"{result['failed']} unreadable")
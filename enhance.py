@@ -0,0 +1,354 @@
+"""
+阅片用的图像增强：CLAHE、反锐化掩模、gamma、反相
+
+    params = EnhanceParams(clahe=True, unsharp=1.0)     # 默认全部关闭；namedtuple，直接作缓存键
+    image = ENHANCE_CACHE.cached(path, params)          # 已算好的 MappedImage（uint8），没有返回 None
+    future = ENHANCE_CACHE.submit(path, params)         # 后台线程计算，同一任务不重复提交
+    image = ENHANCE_CACHE.get(path, params)             # 同步：等后台结果或直接计算
+
+- 全部用 NumPy 向量化：CLAHE 的分块直方图一次 bincount 求出，各块查找表双线性插值；
+  模糊用三次盒式滤波（累加和）近似高斯，耗时与半径无关
+- 处理顺序：按 1% / 99.5% 分位数归一化 → CLAHE → 反锐化 → gamma → 反相，输出 uint8
+- 输出保持原图的尺寸与行序（bottom_up），查看器切换增强时相机与坐标映射都不变
+- 结果按 (路径, size / mtime, 参数) 缓存在内存里，按字节数 LRU 淘汰；解码结果取自 image_io.DECODE_CACHE
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+MAX_BYTES = 256 * 1024 * 1024
+BINS = 256
+
+EnhanceParams = namedtuple(
+    'EnhanceParams',
+    ['clahe', 'clahe_clip', 'clahe_tiles', 'unsharp', 'unsharp_sigma', 'gamma', 'invert'],
+    defaults=(False, 2.0, 8, 0.0, 3.0, 1.0, False),
+)
+
+
+def is_active(params):
+    return params is not None and bool(params.clahe or params.unsharp > 0 or params.gamma != 1.0 or params.invert)
+
+
+def describe(params):
+    if not is_active(params):
+        return "none"
+    parts = []
+    if params.clahe:
+        parts.append(f"CLAHE {params.clahe_clip:g}")
+    if params.unsharp > 0:
+        parts.append(f"unsharp {params.unsharp:g}")
+    if params.gamma != 1.0:
+        parts.append(f"gamma {params.gamma:g}")
+    if params.invert:
+        parts.append("inverted")
+    return ", ".join(parts)
+
+
+# ================================
+#        滤波
+# ================================
+def normalize(array, low=1.0, high=99.5):
+    """
+    灰度（彩色取各通道均值）按分位数拉伸到 float32 0-1；分位数在 1/4 降采样上估计
+    """
+    if array.ndim == 3:
+        array = array.mean(axis=2, dtype=np.float32)
+    lo, hi = np.percentile(array[::4, ::4], (low, high))
+    if hi <= lo:
+        lo, hi = float(array.min()), float(array.max())
+    scale = 1.0 / (hi - lo) if hi > lo else 0.0
+    x = array.astype(np.float32)
+    x -= lo
+    x *= scale
+    return np.clip(x, 0.0, 1.0, out=x)
+
+
+def clahe(x, clip=2.0, tiles=8):
+    """
+    对比度受限的自适应直方图均衡；x 为 float32 0-1，返回同形状 float32
+    """
+    h, w = x.shape
+    ty, tx = min(tiles, h), min(tiles, w)
+    th, tw = -(-h // ty), -(-w // tx)
+    q = np.minimum((x * BINS).astype(np.intp), BINS - 1)
+
+    # 各块直方图：补齐到整块（镜像填充），块号 * BINS + 灰度级 一次 bincount
+    padded = np.pad(q, ((0, th * ty - h), (0, tw * tx - w)), mode='symmetric')
+    offsets = (np.arange(ty * tx, dtype=np.intp) * BINS).reshape(ty, 1, tx, 1)
+    hist = np.bincount((padded.reshape(ty, th, tx, tw) + offsets).ravel(), minlength=ty * tx * BINS)
+    hist = hist.reshape(ty * tx, BINS).astype(np.float32)
+
+    # 超出上限的部分平均分回各灰度级
+    limit = max(clip * th * tw / BINS, 1.0)
+    excess = np.maximum(hist - limit, 0.0).sum(axis=1, keepdims=True)
+    hist = np.minimum(hist, limit) + excess / BINS
+    cdf = np.cumsum(hist, axis=1)
+    lut = (cdf / cdf[:, -1:]).ravel()
+
+    # 相邻四块查找表的双线性插值（块中心为插值节点）
+    def axis_weights(n, size, count):
+        g = (np.arange(n, dtype=np.float32) + 0.5) / size - 0.5
+        i0 = np.clip(np.floor(g).astype(np.intp), 0, count - 1)
+        i1 = np.minimum(i0 + 1, count - 1)
+        return i0, i1, np.clip(g - i0, 0.0, 1.0)
+
+    y0, y1, wy = axis_weights(h, th, ty)
+    x0, x1, wx = axis_weights(w, tw, tx)
+    row0, row1 = (y0 * tx)[:, None], (y1 * tx)[:, None]
+    col0, col1 = x0[None, :], x1[None, :]
+    wx = wx[None, :]
+    top = lut[(row0 + col0) * BINS + q]
+    top += (lut[(row0 + col1) * BINS + q] - top) * wx
+    bottom = lut[(row1 + col0) * BINS + q]
+    bottom += (lut[(row1 + col1) * BINS + q] - bottom) * wx
+    top += (bottom - top) * wy[:, None]
+    return top
+
+
+def _box(a, r, axis):
+    """
+    沿 axis 的半径 r 均值滤波（边缘复制），用累加和实现
+    """
+    n = a.shape[axis]
+    pad = [(0, 0)] * a.ndim
+    pad[axis] = (r + 1, r)
+    c = np.cumsum(np.pad(a, pad, mode='edge'), axis=axis, dtype=np.float32)
+    upper = [slice(None)] * a.ndim
+    lower = [slice(None)] * a.ndim
+    upper[axis] = slice(2 * r + 1, 2 * r + 1 + n)
+    lower[axis] = slice(0, n)
+    upper = c[tuple(upper)] - c[tuple(lower)]
+    upper *= 1.0 / (2 * r + 1)
+    return upper
+
+
+def gaussian_blur(x, sigma):
+    """
+    三次盒式滤波近似高斯
+    """
+    r = max(1, int(round((np.sqrt(4.0 * sigma * sigma + 1.0) - 1.0) / 2.0)))
+    for axis in (0, 1):
+        for _ in range(3):
+            x = _box(x, r, axis)
+    return x
+
+
+def unsharp(x, amount=1.0, sigma=3.0):
+    blurred = gaussian_blur(x, sigma)
+    out = x - blurred
+    out *= amount
+    out += x
+    return np.clip(out, 0.0, 1.0, out=out)
+
+
+def enhance_array(array, params):
+    """
+    (H, W[, C]) 原图（第 0 行在最上面）→ (H, W) uint8
+    """
+    x = normalize(array)
+    if params.clahe:
+        x = clahe(x, params.clahe_clip, params.clahe_tiles)
+    if params.unsharp > 0:
+        x = unsharp(x, params.unsharp, params.unsharp_sigma)
+    if params.gamma != 1.0:
+        x = np.power(x, params.gamma, out=x)
+    if params.invert:
+        x = np.subtract(1.0, x, out=x)
+    x *= 255.0
+    x += 0.5
+    return x.astype(np.uint8)
+
+
+def enhance_image(image, params):
+    """
+    MappedImage → 增强后的 MappedImage，行序、尺寸与 spacing 与原图相同
+    """
+    from image_io import MappedImage
+
+    out = enhance_array(image.array, params)
+    buffer = np.ascontiguousarray(out[::-1]) if image.bottom_up else out
+    return MappedImage(image.path, buffer, out.shape[1], image.bottom_up, image.spacing,
+                       source=f"{image.source}+enhanced")
+
+
+# ================================
+#        缓存与后台计算
+# ================================
+class EnhanceCache:
+    def __init__(self, decode_cache=None, max_bytes=MAX_BYTES):
+        self.decode_cache = decode_cache
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.computed = 0
+        self._entries = OrderedDict()   # (path, size, mtime_ns, params) → MappedImage
+        self._pending = {}              # 同上 → Future
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @staticmethod
+    def _key(path, params):
+        st = os.stat(path)
+        return path, st.st_size, st.st_mtime_ns, params
+
+    def _compute(self, key):
+        decode = self.decode_cache
+        if decode is None:
+            from image_io import DECODE_CACHE as decode
+
+        try:
+            image = enhance_image(decode.load(key[0]), key[3])
+        except Exception:
+            with self._lock:
+                self._pending.pop(key, None)
+            raise
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.buffer.nbytes
+            self._entries[key] = image
+            self.bytes += image.buffer.nbytes
+            self.computed += 1
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.buffer.nbytes
+            self._pending.pop(key, None)
+        return image
+
+    def cached(self, path, params):
+        try:
+            key = self._key(path, params)
+        except OSError:
+            return None
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return image
+
+    def submit(self, path, params):
+        """
+        后台计算；已缓存时返回 None，否则返回 Future（结果为 MappedImage）
+        """
+        try:
+            key = self._key(path, params)
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._entries:
+                return None
+            future = self._pending.get(key)
+            if future is None:
+                if self._pool is None:
+                    from concurrent.futures import ThreadPoolExecutor   # 延迟导入，不进入启动路径
+
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enhance")
+                future = self._pending[key] = self._pool.submit(self._compute, key)
+        return future
+
+    def get(self, path, params):
+        """
+        同步取结果；读不出图像时抛出 UnsupportedImage
+        """
+        image = self.cached(path, params)
+        if image is not None:
+            return image
+        key = self._key(path, params)
+        with self._lock:
+            future = self._pending.get(key)
+        return future.result() if future is not None else self._compute(key)
+
+    def cancel(self, keep=None):
+        """
+        取消还没开始的任务（参数为 keep 的保留），切换增强参数后不再计算旧参数
+        """
+        with self._lock:
+            for key, future in list(self._pending.items()):
+                if key[3] != keep and future.cancel():
+                    del self._pending[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        with self._lock:
+            self._pending.clear()
+
+
+ENHANCE_CACHE = EnhanceCache()
+
+
+if __name__ == "__main__":
+    import time
+
+    from image_io import DecodeCache
+
+    # CLAHE：全局均匀的图不变形，低对比度的一半被拉开
+    rng = np.random.default_rng(0)
+    flat = np.full((64, 64), 0.5, dtype=np.float32)
+    assert np.ptp(clahe(flat)) < 1e-6
+    x = np.concatenate([rng.uniform(0.40, 0.45, (128, 64)), rng.uniform(0.0, 1.0, (128, 64))], axis=1).astype(np.float32)
+    y = clahe(x, clip=4.0)
+    assert y.shape == x.shape and y.dtype == np.float32 and 0.0 <= y.min() and y.max() <= 1.0
+    assert np.std(y[:, :48]) > 3 * np.std(x[:, :48])
+
+    # 盒式滤波近似高斯：保持均值，阶跃两侧的过渡宽度随 sigma 增大
+    step = np.zeros((8, 200), dtype=np.float32)
+    step[:, 100:] = 1.0
+    for sigma in (1.0, 3.0, 8.0):
+        b = gaussian_blur(step, sigma)
+        width = int(((b[0] > 0.05) & (b[0] < 0.95)).sum())
+        assert abs(b.mean() - step.mean()) < 0.02 and 2 * sigma <= width <= 5 * sigma + 2, (sigma, width)
+    sharp = unsharp(np.clip(gaussian_blur(step, 2.0), 0, 1), amount=1.5)
+    assert sharp[0, 95:105].std() > gaussian_blur(step, 2.0)[0, 95:105].std()
+
+    # 反相、gamma 与行序
+    a = np.arange(12, dtype=np.uint8).reshape(3, 4) * 20
+    inv = enhance_array(a, EnhanceParams(invert=True))
+    assert inv[0, 0] == 255 and inv[-1, -1] == 0
+    assert enhance_array(a, EnhanceParams(gamma=0.5))[1, 1] > enhance_array(a, EnhanceParams())[1, 1]
+    assert not is_active(EnhanceParams()) and is_active(EnhanceParams(invert=True))
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+    path = os.path.join(test_dir, sorted(os.listdir(test_dir))[0])
+    decode = DecodeCache()
+    image = decode.load(path)
+    params = EnhanceParams(clahe=True, unsharp=1.0)
+    enhanced = enhance_image(image, params)
+    assert enhanced.array.shape == image.array.shape and enhanced.bottom_up == image.bottom_up
+    assert enhanced.height == image.height and enhanced.width == image.width
+
+    cache = EnhanceCache(decode)
+    future = cache.submit(path, params)
+    assert cache.submit(path, params) is future
+    queued = cache.submit(path, params._replace(gamma=0.5))
+    cache.cancel(keep=params)
+    assert queued.cancelled() and not future.cancelled()
+    future.result()
+    t0 = time.perf_counter()
+    assert cache.cached(path, params) is not None and cache.submit(path, params) is None
+    hit = time.perf_counter() - t0
+    assert cache.computed == 1
+    cache.max_bytes = enhanced.buffer.nbytes
+    cache.get(path, params._replace(invert=True))
+    assert cache.cached(path, params) is None and cache.bytes <= cache.max_bytes
+    cache.shutdown()
+
+    for label, p in (("normalize", EnhanceParams()), ("CLAHE", EnhanceParams(clahe=True)),
+                     ("unsharp", EnhanceParams(unsharp=1.0)), ("CLAHE + unsharp + gamma + invert",
+                                                              EnhanceParams(True, unsharp=1.0, gamma=0.8, invert=True))):
+        t0 = time.perf_counter()
+        for _ in range(5):
+            enhance_image(image, p)
+        print(f"{label:>33}: {(time.perf_counter() - t0) / 5 * 1000:6.1f} ms  {image.array.shape}")
+    print(f"cache hit {hit * 1e6:.0f} us")
+    print("[OK] enhance")
@@ -0,0 +1,302 @@
+"""
+评分撤销 / 重做
+
+    history = UndoHistory(scorer)          # 订阅 scorer 的变更事件
+    with history.action("All negative"):   # 一次界面操作里的所有变更合成一步
+        scorer.update_many(...)
+    history.undo(case_path)                # 按 case 撤销 / 重做，切换 case 后仍然可用
+    history.redo(case_path)
+    history.save(path) / history.load(path)  # 与会话 JSON 放在一起：<session>.history.json
+
+每一步只记录发生变化的关节：(LorR, mode, joint 下标, old, new)，不保存整份 get_score_state。
+每个 case 最多保留 MAX_STEPS_PER_CASE 步；所有 case 的 delta 总数超过 MAX_DELTAS 时，
+从最久没有编辑的 case 开始丢弃最早的步骤。
+"""
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from scorer import REVIEWED, SVDH_SCHEMA
+
+MAX_STEPS_PER_CASE = 100
+MAX_DELTAS = 200_000
+
+_MODES = ('JSN', 'BE', REVIEWED)
+_MODE_CODE = {mode: code for code, mode in enumerate(_MODES)}
+_JOINTS = (SVDH_SCHEMA.jsn_keys, SVDH_SCHEMA.be_keys, ('',))
+_JOINT_INDEX = tuple({joint: i for i, joint in enumerate(keys)} for keys in _JOINTS)
+
+
+class Step:
+    __slots__ = ('label', 'ts', 'deltas')
+
+    def __init__(self, label, ts, deltas):
+        self.label = label
+        self.ts = ts
+        # ((LorR, mode_code, joint_index, old, new), ...)
+        self.deltas = deltas
+
+    def to_list(self):
+        return [self.label, self.ts, [list(d) for d in self.deltas]]
+
+    @classmethod
+    def from_list(cls, item):
+        label, ts, deltas = item
+        return cls(label, ts, tuple(tuple(d) for d in deltas))
+
+
+class _CaseHistory:
+    __slots__ = ('undo', 'redo')
+
+    def __init__(self):
+        self.undo = deque(maxlen=MAX_STEPS_PER_CASE)
+        self.redo = []
+
+
+class UndoHistory:
+    def __init__(self, scorer=None, max_deltas=MAX_DELTAS):
+        self.max_deltas = max_deltas
+        self.cases = OrderedDict()     # case_path → _CaseHistory，按最近编辑排序
+        self.delta_count = 0
+        self.scorer = None
+        self._group = None             # action() 中累积的 {case_path: [delta, ...]}
+        self._muted = 0
+        if scorer is not None:
+            self.attach(scorer)
+
+    def attach(self, scorer):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+        self.scorer = scorer
+        scorer.subscribe(self._on_score_event)
+
+    def clear(self):
+        self.cases.clear()
+        self.delta_count = 0
+
+    # ====================================================
+    #  记录
+    # ====================================================
+    @contextmanager
+    def action(self, label):
+        """
+        with 块内的所有变更按 case 合成一步；嵌套时并入最外层
+        """
+        if self._group is not None:
+            yield
+            return
+        self._group = {}
+        try:
+            yield
+        finally:
+            group, self._group = self._group, None
+            for case_path, deltas in group.items():
+                self._push(case_path, Step(label, time.time(), tuple(deltas)))
+
+    @contextmanager
+    def muted(self):
+        """
+        with 块内的变更不记录（例如合并其他阅片者的变更）
+        """
+        self._muted += 1
+        try:
+            yield
+        finally:
+            self._muted -= 1
+
+    def _on_score_event(self, event):
+        if event.kind == 'reload':
+            if event.changes:
+                # Scorer.relocate：按新路径保留撤销历史
+                self.relocate(event.changes)
+            else:
+                self.clear()
+            return
+        if event.kind == 'new' or self._muted:
+            return
+        deltas = [(event.LorR, _MODE_CODE[mode], _JOINT_INDEX[_MODE_CODE[mode]][joint], old, new)
+                  for (mode, joint), (old, new) in event.changes.items()]
+        if not deltas:
+            return
+        if self._group is not None:
+            self._group.setdefault(event.case_path, []).extend(deltas)
+        else:
+            self._push(event.case_path, Step("Edit", time.time(), tuple(deltas)))
+
+    def relocate(self, mapping):
+        """
+        mapping: {旧路径: 新路径}，各 case 的撤销 / 重做步骤跟着改名，顺序不变
+        """
+        self.cases = OrderedDict((mapping.get(path, path), history) for path, history in self.cases.items())
+
+    def _case(self, case_path):
+        history = self.cases.get(case_path)
+        if history is None:
+            history = self.cases[case_path] = _CaseHistory()
+        self.cases.move_to_end(case_path)
+        return history
+
+    def _push(self, case_path, step):
+        history = self._case(case_path)
+        if len(history.undo) == history.undo.maxlen:
+            self.delta_count -= len(history.undo[0].deltas)
+        history.undo.append(step)
+        self.delta_count += len(step.deltas)
+        self.delta_count -= sum(len(s.deltas) for s in history.redo)
+        history.redo.clear()
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        while self.delta_count > self.max_deltas and self.cases:
+            case_path, history = next(iter(self.cases.items()))
+            if history.redo:
+                self.delta_count -= len(history.redo.pop(0).deltas)
+            elif history.undo:
+                self.delta_count -= len(history.undo.popleft().deltas)
+            else:
+                del self.cases[case_path]
+
+    # ====================================================
+    #  撤销 / 重做
+    # ====================================================
+    def can_undo(self, case_path):
+        history = self.cases.get(case_path)
+        return bool(history and history.undo)
+
+    def can_redo(self, case_path):
+        history = self.cases.get(case_path)
+        return bool(history and history.redo)
+
+    def undo(self, case_path):
+        """
+        撤销该 case 最近的一步，返回 Step；没有可撤销的返回 None
+        """
+        history = self.cases.get(case_path)
+        if not history or not history.undo:
+            return None
+        step = history.undo.pop()
+        self._apply(case_path, step, reverse=True)
+        history.redo.append(step)
+        return step
+
+    def redo(self, case_path):
+        history = self.cases.get(case_path)
+        if not history or not history.redo:
+            return None
+        step = history.redo.pop()
+        self._apply(case_path, step, reverse=False)
+        history.undo.append(step)
+        return step
+
+    def _apply(self, case_path, step, reverse):
+        # 撤销时倒序应用 old 值，重做时顺序应用 new 值
+        deltas = reversed(step.deltas) if reverse else step.deltas
+        scores = {}
+        reviewed = None
+        for LorR, mode, joint, old, new in deltas:
+            value = old if reverse else new
+            if _MODES[mode] == REVIEWED:
+                reviewed = value
+                continue
+            if LorR not in scores:
+                JSN, BE = self.scorer.get_info(case_path, LorR)
+                scores[LorR] = {'JSN': JSN, 'BE': BE}
+            scores[LorR][_MODES[mode]][_JOINTS[mode][joint]] = value
+
+        with self.muted():
+            if scores:
+                self.scorer.update_many(
+                    (case_path, LorR, s['JSN'], s['BE']) for LorR, s in scores.items()
+                )
+            if reviewed is not None:
+                self.scorer.set_reviewed(case_path, reviewed)
+
+    # ====================================================
+    #  持久化
+    # ====================================================
+    def save(self, path):
+        data = {
+            "version": 1,
+            "cases": {
+                case_path: {
+                    "undo": [step.to_list() for step in history.undo],
+                    "redo": [step.to_list() for step in history.redo],
+                }
+                for case_path, history in self.cases.items()
+                if history.undo or history.redo
+            },
+        }
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        self.clear()
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for case_path, item in data.get("cases", {}).items():
+            history = self._case(case_path)
+            history.undo.extend(Step.from_list(s) for s in item.get("undo", []))
+            history.redo = [Step.from_list(s) for s in item.get("redo", [])]
+            self.delta_count += sum(len(s.deltas) for s in history.undo)
+            self.delta_count += sum(len(s.deltas) for s in history.redo)
+        self._enforce_cap()
+
+
+def history_path(session_path):
+    return f"{session_path}.history.json"
+
+
+if __name__ == "__main__":
+    import tempfile
+    from scorer import Scorer
+
+    scorer = Scorer()
+    for LorR in ('L', 'R'):
+        scorer.new_info("a.bmp", "a", "a", LorR)
+        scorer.new_info("b.bmp", "b", "b", LorR)
+    history = UndoHistory(scorer)
+
+    all_neg = dict.fromkeys(SVDH_SCHEMA.jsn_keys, 4)
+    with history.action("All negative"):
+        scorer.update_many([("a.bmp", "L", all_neg, None), ("a.bmp", "R", all_neg, None)])
+    scorer.update_info("b.bmp", "L", {"MCP-T": 1}, None)
+    with history.action("Reviewed"):
+        # set_reviewed 对 L / R 各发一个事件
+        scorer.set_reviewed("a.bmp", True)
+    assert len(history.cases["a.bmp"].undo) == 2
+
+    # 切换到别的 case 之后仍然可以撤销 a.bmp
+    assert history.undo("a.bmp").label == "Reviewed" and not scorer.get_reviewed("a.bmp")
+    assert history.undo("a.bmp").label == "All negative"
+    assert scorer.get_info("a.bmp", "R")[0]["MCP-T"] is None
+    assert history.redo("a.bmp").label == "All negative"
+    assert scorer.get_info("a.bmp", "L")[0]["MCP-T"] == 4
+    assert history.undo("a.bmp") and history.undo("a.bmp") is None
+    assert scorer.get_info("b.bmp", "L")[0]["MCP-T"] == 1
+
+    # 新的编辑清空 redo；持久化后仍可撤销
+    scorer.update_info("a.bmp", "L", {"MCP-I": 2}, None)
+    assert not history.can_redo("a.bmp")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = history_path(os.path.join(tmp, "s.json"))
+        history.save(path)
+        restored = UndoHistory(scorer)
+        history.scorer.unsubscribe(history._on_score_event)
+        restored.load(path)
+        assert restored.delta_count == history.delta_count
+        assert restored.undo("a.bmp") and scorer.get_info("a.bmp", "L")[0]["MCP-I"] is None
+
+    # 上限：每个 case 最多 MAX_STEPS_PER_CASE 步，总 delta 数受 max_deltas 限制
+    capped = UndoHistory(scorer, max_deltas=50)
+    restored.scorer.unsubscribe(restored._on_score_event)
+    for i in range(300):
+        scorer.update_info("b.bmp", "R", {"MCP-T": i % 5, "MCP-I": (i + 1) % 5}, None)
+    assert capped.delta_count <= 50
+    assert capped.delta_count == sum(len(s.deltas) for h in capped.cases.values() for s in h.undo)
+    print(f"[OK] history ({capped.delta_count} deltas kept)")
@@ -0,0 +1,390 @@
+"""
+基于像素内容的 case 身份：移动过的文件可以重新绑定到会话，重复的片子在阅片之前就能发现
+
+    index = ContentIndex()                          # 默认 ~/.cache/ra-scorer/content.sqlite
+    digests = index.digests(paths)                  # {path: digest}；size / mtime 没变的直接取库里的
+    duplicate_groups(digests)                       # [[path, ...]]：像素完全相同的几张片子
+    moved = rebind(scorer, candidates, index)       # 文件不存在的 case 按内容对应到 candidates 里的新路径
+
+    scanner = IdentityScanner()                     # GUI 用：后台线程计算，定时器里 poll()
+    scanner.start(paths)
+    found = scanner.poll()                          # 新算完的 {path: digest}
+
+- 摘要是解码后像素（连同形状、类型）的 sha1，与路径、文件名、文件格式都无关：
+  同一张片子另存为 PNG、DICOM 头信息被改过，都还是同一个摘要
+- 库里按 (path, size, mtime_ns) 缓存摘要，10 万个文件的档案再次打开只需 stat 一遍
+- 未命中的用线程池并行计算（文件读取与 hashlib 都会释放 GIL），每 CHUNK 个写一次库，中断后已算的不丢
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+CHUNK = 256
+ROWS_PER_BLOCK = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest   TEXT NOT NULL          -- 读不出像素的文件为 ''，文件没变就不再重试
+);
+CREATE INDEX IF NOT EXISTS files_digest ON files (digest);
+"""
+
+
+def default_index_path():
+    root = os.environ.get("RASCORER_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "ra-scorer")
+    return os.path.join(root, "content.sqlite")
+
+
+def pixel_digest(path, registry=None):
+    """
+    解码后像素的摘要（40 位十六进制）；读不出时抛出 UnsupportedImage / OSError
+    """
+    import numpy as np
+
+    if registry is None:
+        from image_io import REGISTRY as registry
+
+    array = registry.load(path).array
+    if array.dtype.byteorder == '>':
+        array = array.astype(array.dtype.newbyteorder('<'))
+    h = hashlib.sha1()
+    h.update(f"{array.shape}|{array.dtype.str}".encode())
+    if array.flags.c_contiguous:
+        h.update(array)
+    else:
+        # BMP 从下到上存放、每行有填充：按从上到下的顺序分块拷贝，内存占用不超过 ROWS_PER_BLOCK 行
+        for start in range(0, array.shape[0], ROWS_PER_BLOCK):
+            h.update(np.ascontiguousarray(array[start:start + ROWS_PER_BLOCK]))
+    return h.hexdigest()
+
+
+def duplicate_groups(digests):
+    """
+    {path: digest} → 摘要相同的路径组（每组至少两个，组内保持输入顺序）
+    """
+    groups = {}
+    for path, digest in digests.items():
+        if digest:
+            groups.setdefault(digest, []).append(path)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+# ================================
+#        持久化索引
+# ================================
+class ContentIndex:
+    def __init__(self, path=None, registry=None, workers=None):
+        self.path = path or default_index_path()
+        self.registry = registry
+        self.workers = workers or min(8, (os.cpu_count() or 1) + 2)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=10.0)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.executescript(_SCHEMA)
+        self.stats = {"reused": 0, "hashed": 0, "failed": 0}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _rows(self, paths):
+        rows = {}
+        paths = list(paths)
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            query = f"SELECT path, size, mtime_ns, digest FROM files WHERE path IN ({','.join('?' * len(chunk))})"
+            for path, size, mtime_ns, digest in self.db.execute(query, chunk):
+                rows[path] = (size, mtime_ns, digest)
+        return rows
+
+    def _hash(self, path):
+        from image_io import UnsupportedImage
+
+        try:
+            return pixel_digest(path, self.registry)
+        except (UnsupportedImage, OSError, ValueError):
+            return ''
+
+    def digests(self, paths, progress=None, stop=None):
+        """
+        返回 {path: digest}，不存在或读不出像素的为 None。
+        progress(done, total) 在每批算完后调用；stop() 为真时在批之间提前返回（已算的照常入库）
+        """
+        paths = list(dict.fromkeys(paths))
+        stamps = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = (st.st_size, st.st_mtime_ns)
+
+        known = self._rows(stamps)
+        result = dict.fromkeys(paths)
+        todo = []
+        for path, stamp in stamps.items():
+            row = known.get(path)
+            if row is not None and row[:2] == stamp:
+                result[path] = row[2] or None
+                self.stats["reused"] += 1
+            else:
+                todo.append(path)
+        if not todo:
+            return result
+
+        from concurrent.futures import ThreadPoolExecutor   # 延迟导入，不进入启动路径
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="identity") as pool:
+            for i in range(0, len(todo), CHUNK):
+                if stop is not None and stop():
+                    break
+                chunk = todo[i:i + CHUNK]
+                rows = []
+                for path, digest in zip(chunk, pool.map(self._hash, chunk)):
+                    # 记录的是计算之前的 stamp：计算期间文件被改写，下次 stat 对不上就会重算
+                    rows.append((path, *stamps[path], digest))
+                    result[path] = digest or None
+                    self.stats["hashed" if digest else "failed"] += 1
+                with self.db:
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)", rows)
+                if progress is not None:
+                    progress(min(i + CHUNK, len(todo)), len(todo))
+        return result
+
+    def digest_of(self, path):
+        """
+        库里记录的 path 最后一次的摘要（文件已不存在时也能查到）
+        """
+        row = self.db.execute("SELECT digest FROM files WHERE path = ?", (path,)).fetchone()
+        return (row[0] or None) if row else None
+
+    def paths_for(self, digest):
+        return [path for path, in self.db.execute("SELECT path FROM files WHERE digest = ?", (digest,))]
+
+
+def rebind(scorer, candidates, index, progress=None):
+    """
+    scorer 里文件已不存在的 case，按内容摘要对应到 candidates 中尚未使用的路径并改写；
+    摘要优先取会话里保存的（scorer.content），其次取索引里该路径最后一次的记录。
+    同一摘要有多个候选时优先文件名相同的。返回 {旧路径: 新路径}
+    """
+    case_paths = scorer.get_file_list() or []
+    wanted = {}
+    for path in case_paths:
+        if os.path.exists(path):
+            continue
+        digest = scorer.content.get(path) or index.digest_of(path)
+        if digest:
+            wanted.setdefault(digest, []).append(path)
+    if not wanted:
+        return {}
+
+    taken = set(case_paths)
+    found = {}
+    for path, digest in index.digests(candidates, progress).items():
+        if digest in wanted and path not in taken:
+            found.setdefault(digest, []).append(path)
+
+    mapping = {}
+    for digest, olds in wanted.items():
+        news = found.get(digest, [])
+        for old in olds:
+            if not news:
+                break
+            name = os.path.basename(old)
+            new = next((p for p in news if os.path.basename(p) == name), news[0])
+            news.remove(new)
+            mapping[old] = new
+    scorer.relocate(mapping)
+    return mapping
+
+
+# ================================
+#        GUI 后台计算
+# ================================
+class IdentityScanner:
+    """
+    单个后台线程依次处理提交的路径列表（内部再用线程池并行），GUI 定时器里 poll() 取回结果；
+    索引库在后台线程里打开，不与 GUI 线程共用连接
+    """
+    def __init__(self, index_path=None, registry=None, workers=None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.index_path = index_path
+        self.registry = registry
+        self.workers = workers
+        self.digests = {}
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="identity-scan")
+        self._jobs = []
+        self._stop = threading.Event()
+
+    def _run(self, paths, stop):
+        index = ContentIndex(self.index_path, self.registry, self.workers)
+        try:
+            return index.digests(paths, stop=stop.is_set)
+        finally:
+            index.close()
+
+    def start(self, paths):
+        """
+        替换工作列表：还没完成的任务作废
+        """
+        self.cancel()
+        self.extend(paths)
+
+    def extend(self, paths):
+        paths = list(paths)
+        if paths:
+            self._jobs.append(self._pool.submit(self._run, paths, self._stop))
+
+    def cancel(self):
+        self._stop.set()
+        for job in self._jobs:
+            job.cancel()
+        self._jobs = []
+        self.digests = {}
+        self._stop = threading.Event()
+
+    @property
+    def done(self):
+        return not self._jobs
+
+    def poll(self):
+        """
+        已完成任务的 {path: digest}（并入 self.digests）
+        """
+        found = {}
+        for job in [job for job in self._jobs if job.done()]:
+            self._jobs.remove(job)
+            if not job.cancelled() and job.exception() is None:
+                found.update(job.result())
+        self.digests.update(found)
+        return found
+
+    def shutdown(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import time
+
+    import numpy as np
+
+    from image_io import REGISTRY
+    from scorer import Scorer
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+    originals = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir))
+    with tempfile.TemporaryDirectory() as tmp:
+        index = ContentIndex(os.path.join(tmp, "content.sqlite"))
+
+        # 与路径、格式无关：改名、另存为 PNG 摘要不变；同一病人不同随访的摘要不同
+        a = os.path.join(tmp, "a", "IMAGE007_20110111.bmp")
+        os.makedirs(os.path.dirname(a))
+        shutil.copyfile(originals[0], a)
+        renamed = os.path.join(tmp, "renamed.bmp")
+        shutil.copyfile(originals[0], renamed)
+        png = os.path.join(tmp, "converted.png")
+        from vtkmodules.vtkIOImage import vtkBMPReader, vtkPNGWriter
+
+        reader = vtkBMPReader()
+        reader.SetFileName(originals[0])
+        reader.Allow8BitBMPOn()         # 保持 8 位灰度，不展开调色板
+        writer = vtkPNGWriter()
+        writer.SetInputConnection(reader.GetOutputPort())
+        writer.SetFileName(png)
+        writer.Write()
+        other = os.path.join(tmp, "other.bmp")
+        shutil.copyfile(originals[1], other)
+        junk = os.path.join(tmp, "junk.bmp")
+        with open(junk, "wb") as f:
+            f.write(b"BM not really")
+
+        digests = index.digests([a, renamed, png, other, junk, os.path.join(tmp, "gone.bmp")])
+        assert digests[a] == digests[renamed] == digests[png] != digests[other]
+        assert digests[junk] is None and digests[os.path.join(tmp, "gone.bmp")] is None
+        assert duplicate_groups(digests) == [[a, renamed, png]]
+        assert index.stats == {"reused": 0, "hashed": 4, "failed": 1}
+        index.digests([a, renamed, png, other, junk])
+        assert index.stats["reused"] == 5 and index.stats["hashed"] == 4
+
+        # 会话重新绑定：整个目录被移走，按内容找回；另一个 case 的文件仍在原处
+        scorer = Scorer()
+        for LorR in ('L', 'R'):
+            scorer.new_info(a, "IMAGE007_20110111", "IMAGE007_20110111", LorR)
+            scorer.new_info(other, "other", "other", LorR)
+        scorer.update_info(a, 'L', {"MCP-T": 2}, None)
+        scorer.content.update({p: digests[p] for p in (a, other)})
+        session = os.path.join(tmp, "session.json")
+        scorer.save_to_json(session)
+        moved_dir = os.path.join(tmp, "moved")
+        shutil.move(os.path.dirname(a), moved_dir)
+        moved = os.path.join(moved_dir, "IMAGE007_20110111.bmp")
+
+        reopened = Scorer()
+        reopened.load_from_json(session)
+        mapping = rebind(reopened, [renamed, moved, other], ContentIndex(os.path.join(tmp, "fresh.sqlite")))
+        assert mapping == {a: moved}, mapping
+        assert reopened.get_info(moved, 'L')[0]["MCP-T"] == 2 and not reopened.has_case(a)
+        assert reopened.content[moved] == digests[a]
+
+        # 后台扫描
+        scanner = IdentityScanner(os.path.join(tmp, "content.sqlite"))
+        scanner.start([renamed, png])
+        scanner.extend([other])
+        deadline = time.monotonic() + 30
+        while not scanner.done and time.monotonic() < deadline:
+            scanner.poll()
+            time.sleep(0.01)
+        assert scanner.digests == {renamed: digests[a], png: digests[a], other: digests[other]}
+        scanner.shutdown()
+
+        # 规模：10 万个小文件，第一次全部计算，第二次只 stat
+        class RawRegistry:
+            def load(self, path):
+                from image_io import MappedImage
+
+                data = np.fromfile(path, dtype=np.uint8).reshape(16, 16)
+                return MappedImage(path, data, 16, bottom_up=False)
+
+        archive = os.path.join(tmp, "archive")
+        os.makedirs(archive)
+        n = 100_000
+        paths = []
+        for i in range(n):
+            path = os.path.join(archive, f"C{i:06d}.raw")
+            with open(path, "wb") as f:
+                f.write(i.to_bytes(4, "little") * 64)
+            paths.append(path)
+        big = ContentIndex(os.path.join(tmp, "big.sqlite"), RawRegistry())
+        t0 = time.perf_counter()
+        first = big.digests(paths)
+        cold = time.perf_counter() - t0
+        os.replace(paths[7], paths[7] + ".x")
+        with open(paths[7], "wb") as f:
+            f.write((3).to_bytes(4, "little") * 64)
+        t0 = time.perf_counter()
+        second = big.digests(paths)
+        warm = time.perf_counter() - t0
+        assert big.stats["hashed"] == n + 1 and second[paths[7]] == first[paths[3]]
+        assert duplicate_groups(second) == [[paths[3], paths[7]]]
+        print(f"{n} files: first pass {cold:.1f} s, incremental pass {warm:.2f} s")
+
+        # 真实图像的计算吞吐
+        t0 = time.perf_counter()
+        for _ in range(5):
+            for path in originals:
+                pixel_digest(path, REGISTRY)
+        print(f"pixel digest: {(time.perf_counter() - t0) / (5 * len(originals)) * 1000:.1f} ms per image")
+    print("[OK] identity")
@@ -0,0 +1,559 @@
+"""
+图像读取
+
+    image = REGISTRY.load(path)   # 按 magic bytes / 扩展名选择 reader，返回 MappedImage
+    image = DECODE_CACHE.load(path)   # 同上，但同一进程内每个文件只解码一次（多个视图共用）
+    image.array                   # (H, W) 或 (H, W, C)，行从上到下
+    image.to_vtk()                # 零拷贝包装成 vtkImageData（见 MappedImage.to_vtk）
+
+内存映射方式只处理最常见的无压缩情形（load_mapped）：
+- BMP：BI_RGB，8 位灰度调色板（零拷贝）/ 8 位彩色调色板 / 24 位（需要拷贝）
+- DICOM：Implicit / Explicit VR Little Endian，非封装的 Pixel Data，8 / 16 位
+其余格式由 VTK 自带的原生解码器（libpng / libtiff / libjpeg）或 pydicom（可选，
+负责压缩传输语法与多帧 DICOM）处理。
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MappedImage:
+    """
+    buffer:   底层 numpy 数组（通常是 np.memmap 的视图），形状 (rows, stride_cols[, C])
+    width:    有效列数（BMP 每行有 4 字节对齐的填充）
+    bottom_up: buffer 的第 0 行是否为图像最下面一行（BMP 默认如此，与 VTK 一致）
+    """
+    __slots__ = ('path', 'buffer', 'width', 'bottom_up', 'spacing', 'source')
+
+    def __init__(self, path, buffer, width, bottom_up, spacing=(1.0, 1.0), source='mmap'):
+        self.path = path
+        self.buffer = buffer
+        self.width = width
+        self.bottom_up = bottom_up
+        self.spacing = spacing
+        self.source = source
+
+    @property
+    def height(self):
+        return self.buffer.shape[0]
+
+    @property
+    def components(self):
+        return 1 if self.buffer.ndim == 2 else self.buffer.shape[2]
+
+    @property
+    def array(self):
+        """
+        (H, W[, C]) 视图，第 0 行为图像最上面一行
+        """
+        view = self.buffer[:, :self.width]
+        return view[::-1] if self.bottom_up else view
+
+    def scalar_range(self):
+        view = self.buffer[:, :self.width]
+        return float(view.min()), float(view.max())
+
+    def to_vtk(self):
+        """
+        返回 (vtkImageData, display_extent, flip_y)
+
+        - 缓冲区连续时不拷贝：vtkImageData 直接引用 mmap 内存（包括每行的填充列），
+          display_extent 只覆盖有效列，交给 vtkImageActor.SetDisplayExtent 裁掉填充
+        - flip_y 为 True 表示数据从上到下存放，显示时需要沿 y 翻转
+        """
+        from vtkmodules.util.numpy_support import numpy_to_vtk
+        from vtkmodules.vtkCommonDataModel import vtkImageData
+
+        buffer = self.buffer
+        if not buffer.flags.c_contiguous:
+            buffer = np.ascontiguousarray(buffer)
+        rows, cols = buffer.shape[:2]
+        comps = self.components
+
+        scalars = numpy_to_vtk(buffer.reshape(rows * cols, comps) if comps > 1 else buffer.reshape(-1),
+                               deep=False)
+        image = vtkImageData()
+        image.SetDimensions(cols, rows, 1)
+        image.SetSpacing(self.spacing[0], self.spacing[1], 1.0)
+        image.GetPointData().SetScalars(scalars)
+
+        display_extent = (0, self.width - 1, 0, rows - 1, 0, 0)
+        return image, display_extent, not self.bottom_up
+
+
+# ================================
+#        BMP
+# ================================
+def _map_file(path):
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def read_bmp(path):
+    with open(path, "rb") as f:
+        head = f.read(54)
+    if len(head) < 54 or head[:2] != b'BM':
+        return None
+
+    offset, = struct.unpack_from('<I', head, 10)
+    dib_size, width, height, _, bpp, compression = struct.unpack_from('<IiiHHI', head, 14)
+    colors_used, = struct.unpack_from('<I', head, 46)
+    if compression != 0 or bpp not in (8, 24) or width <= 0 or height == 0:
+        return None   # RLE / bitfields / 1、4、16、32 位交给 VTK
+
+    bottom_up = height > 0
+    rows = abs(height)
+    stride = ((width * bpp + 31) // 32) * 4
+
+    data = _map_file(path)
+    if data.size < offset + stride * rows:
+        return None
+    pixels = data[offset:offset + stride * rows].reshape(rows, stride)
+
+    if bpp == 24:
+        # BGR → RGB 需要拷贝一次
+        rgb = pixels[:, :width * 3].reshape(rows, width, 3)[:, :, ::-1]
+        return MappedImage(path, np.ascontiguousarray(rgb), width, bottom_up, source='copy')
+
+    n_colors = colors_used or 256
+    palette = np.asarray(data[14 + dib_size:14 + dib_size + n_colors * 4]).reshape(-1, 4)[:, 2::-1]
+    if np.array_equal(palette, np.repeat(np.arange(n_colors, dtype=np.uint8)[:, None], 3, axis=1)):
+        # 灰度恒等调色板：像素值就是灰度，直接引用 mmap
+        return MappedImage(path, pixels, width, bottom_up)
+
+    lut = np.zeros((256, 3), dtype=np.uint8)
+    lut[:n_colors] = palette
+    if (palette[:, 0] == palette[:, 1]).all() and (palette[:, 1] == palette[:, 2]).all():
+        return MappedImage(path, lut[:, 0][pixels[:, :width]], width, bottom_up, source='copy')
+    return MappedImage(path, lut[pixels[:, :width]], width, bottom_up, source='copy')
+
+
+# ================================
+#        DICOM
+# ================================
+UNCOMPRESSED_SYNTAXES = {
+    '1.2.840.10008.1.2': False,      # Implicit VR Little Endian
+    '1.2.840.10008.1.2.1': True,     # Explicit VR Little Endian
+}
+_LONG_VRS = {b'OB', b'OD', b'OF', b'OL', b'OW', b'SQ', b'UC', b'UN', b'UR', b'UT', b'OV'}
+_UNDEFINED = 0xFFFFFFFF
+
+_TAGS = {
+    (0x0028, 0x0002): 'samples',
+    (0x0028, 0x0004): 'photometric',
+    (0x0028, 0x0008): 'frames',
+    (0x0028, 0x0010): 'rows',
+    (0x0028, 0x0011): 'columns',
+    (0x0028, 0x0030): 'pixel_spacing',
+    (0x0028, 0x0100): 'bits_allocated',
+    (0x0028, 0x0103): 'pixel_representation',
+}
+
+
+class _DicomUnsupported(Exception):
+    pass
+
+
+def _read_element_header(buf, pos, explicit):
+    group, element = struct.unpack_from('<HH', buf, pos)
+    if group == 0xFFFE or not explicit:
+        # item / 分隔符，以及隐式 VR 没有 VR 字段
+        length, = struct.unpack_from('<I', buf, pos + 4)
+        return group, element, None, length, pos + 8
+    vr = bytes(buf[pos + 4:pos + 6])
+    if vr in _LONG_VRS:
+        length, = struct.unpack_from('<I', buf, pos + 8)
+        return group, element, vr, length, pos + 12
+    length, = struct.unpack_from('<H', buf, pos + 6)
+    return group, element, vr, length, pos + 8
+
+
+def _skip_undefined(buf, pos, explicit):
+    """
+    跳过未定义长度的序列，返回序列结束之后的位置
+    """
+    while pos + 8 <= len(buf):
+        group, element, _, length, pos = _read_element_header(buf, pos, False)
+        if (group, element) == (0xFFFE, 0xE0DD):     # Sequence Delimitation
+            return pos
+        if (group, element) != (0xFFFE, 0xE000):
+            raise _DicomUnsupported("Bad sequence item")
+        if length != _UNDEFINED:
+            pos += length
+            continue
+        # 未定义长度的 item：逐个元素跳过直到 Item Delimitation
+        while True:
+            group, element, vr, length, pos = _read_element_header(buf, pos, explicit)
+            if (group, element) == (0xFFFE, 0xE00D):
+                break
+            pos = _skip_undefined(buf, pos, explicit) if length == _UNDEFINED else pos + length
+    raise _DicomUnsupported("Truncated sequence")
+
+
+def _parse_dicom(buf):
+    if len(buf) < 132 or bytes(buf[128:132]) != b'DICM':
+        raise _DicomUnsupported("No DICM preamble")
+
+    # 文件头（group 0002）总是 Explicit VR Little Endian
+    pos = 132
+    syntax = None
+    while pos + 8 <= len(buf):
+        group, element, vr, length, value_pos = _read_element_header(buf, pos, True)
+        if group != 0x0002:
+            break
+        if element == 0x0010:
+            syntax = bytes(buf[value_pos:value_pos + length]).rstrip(b'\0 ').decode('ascii')
+        pos = value_pos + length
+
+    if syntax not in UNCOMPRESSED_SYNTAXES:
+        raise _DicomUnsupported(f"Transfer syntax {syntax}")
+    explicit = UNCOMPRESSED_SYNTAXES[syntax]
+
+    info = {'syntax': syntax}
+    while pos + 8 <= len(buf):
+        group, element, vr, length, value_pos = _read_element_header(buf, pos, explicit)
+        if (group, element) == (0x7FE0, 0x0010):
+            if length == _UNDEFINED:
+                raise _DicomUnsupported("Encapsulated pixel data")
+            info['pixel_offset'] = value_pos
+            info['pixel_length'] = length
+            return info
+
+        name = _TAGS.get((group, element))
+        if name is not None:
+            raw = bytes(buf[value_pos:value_pos + length])
+            if name in ('frames', 'pixel_spacing', 'photometric'):
+                info[name] = raw.rstrip(b'\0 ').decode('ascii')
+            else:
+                info[name], = struct.unpack_from('<H', raw)
+
+        pos = _skip_undefined(buf, value_pos, explicit) if length == _UNDEFINED else value_pos + length
+
+    raise _DicomUnsupported("No pixel data")
+
+
+def read_dicom(path):
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:      # 空文件
+            return None
+    try:
+        info = _parse_dicom(memoryview(buf))
+    except (_DicomUnsupported, struct.error, UnicodeDecodeError):
+        return None
+    finally:
+        buf.close()
+
+    rows, cols = info.get('rows'), info.get('columns')
+    bits = info.get('bits_allocated', 16)
+    if not rows or not cols or info.get('samples', 1) != 1 or bits not in (8, 16):
+        return None
+    if int(info.get('frames', '1') or 1) != 1:
+        return None     # 多帧交给 VTK / 其他 reader
+
+    signed = info.get('pixel_representation', 0) == 1
+    dtype = {(8, False): np.uint8, (8, True): np.int8,
+             (16, False): '<u2', (16, True): '<i2'}[(bits, signed)]
+    itemsize = bits // 8
+    if info['pixel_length'] < rows * cols * itemsize:
+        return None
+
+    pixels = np.memmap(path, dtype=dtype, mode='r', offset=info['pixel_offset'], shape=(rows, cols))
+    if info.get('photometric') == 'MONOCHROME1':
+        # 0 为白色：与 pydicom 路径一样反相（需要复制一份，不再是零拷贝）
+        pixels = pixels.max() - np.asarray(pixels)
+
+    spacing = (1.0, 1.0)
+    if info.get('pixel_spacing'):
+        try:
+            row_spacing, col_spacing = (float(v) for v in info['pixel_spacing'].split('\\')[:2])
+            spacing = (col_spacing, row_spacing)
+        except ValueError:
+            pass
+    # DICOM 行从上到下存放
+    return MappedImage(path, pixels, cols, bottom_up=False, spacing=spacing)
+
+
+MAPPED_READERS = {
+    '.bmp': read_bmp,
+    '.dcm': read_dicom,
+}
+
+
+def load_mapped(path):
+    """
+    以 mmap 方式读取，格式或编码不支持时返回 None
+    """
+    reader = MAPPED_READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        return None
+    try:
+        return reader(path)
+    except (OSError, ValueError):
+        return None
+
+
+# ================================
+#        Reader 注册表
+# ================================
+class UnsupportedImage(Exception):
+    pass
+
+
+class ImageReader:
+    """
+    load(path) 返回 MappedImage，不能处理时返回 None（注册表会继续尝试下一个 reader）
+    magic: [(offset, bytes), ...]，任一匹配即认为文件属于该 reader
+    """
+    __slots__ = ('name', 'load', 'extensions', 'magic', 'priority')
+
+    def __init__(self, name, load, extensions=(), magic=(), priority=0):
+        self.name = name
+        self.load = load
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.magic = tuple(magic)
+        self.priority = priority
+
+    def sniff(self, head):
+        return any(head[offset:offset + len(sig)] == sig for offset, sig in self.magic)
+
+
+class ReaderRegistry:
+    SNIFF_SIZE = 132    # DICOM 的 'DICM' 在 128 字节之后
+
+    def __init__(self):
+        self.readers = []
+        self._stats = {}
+
+    def register(self, name, load, extensions=(), magic=(), priority=0):
+        self.readers.append(ImageReader(name, load, extensions, magic, priority))
+        self.readers.sort(key=lambda r: -r.priority)
+        self._stats.setdefault(name, {"count": 0, "failures": 0, "total": 0.0, "max": 0.0})
+
+    def extensions(self):
+        return tuple(sorted({ext for r in self.readers for ext in r.extensions}))
+
+    def sniff(self, path):
+        try:
+            with open(path, "rb") as f:
+                head = f.read(self.SNIFF_SIZE)
+        except OSError:
+            return []
+        return [r for r in self.readers if r.sniff(head)]
+
+    def candidates(self, path):
+        """
+        magic bytes 匹配的 reader 优先，其次是扩展名匹配的 reader
+        """
+        ext = os.path.splitext(path)[1].lower()
+        ordered = self.sniff(path)
+        ordered += [r for r in self.readers if ext in r.extensions and r not in ordered]
+        return ordered
+
+    def is_supported(self, path):
+        """
+        文件夹扫描用：已知扩展名直接接受，无扩展名的文件（常见于 DICOM 归档）读 magic 判断
+        """
+        ext = os.path.splitext(path)[1].lower()
+        if ext:
+            return ext in self.extensions()
+        return bool(self.sniff(path))
+
+    def load(self, path):
+        """
+        依次尝试各 reader；reader 抛出的任何异常（例如 pydicom 的 InvalidDicomError）都记为失败，
+        继续下一个。全部失败时只抛出 UnsupportedImage，调用方不必认识各解码库的异常类型
+        """
+        errors = []
+        for reader in self.candidates(path):
+            stats = self._stats[reader.name]
+            t0 = time.perf_counter()
+            try:
+                image = reader.load(path)
+            except Exception as e:
+                errors.append(f"{reader.name}: {type(e).__name__}: {e}")
+                image = None
+            elapsed = time.perf_counter() - t0
+            if image is None:
+                stats["failures"] += 1
+                continue
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            image.source = reader.name
+            return image
+        raise UnsupportedImage(f"No reader for {path}" + (" (" + "; ".join(errors) + ")" if errors else ""))
+
+    def stats(self):
+        """
+        {reader: {'count', 'failures', 'mean_ms', 'max_ms'}}，只包含用过的 reader
+        """
+        result = {}
+        for name, s in self._stats.items():
+            if s["count"] or s["failures"]:
+                result[name] = {
+                    "count": s["count"],
+                    "failures": s["failures"],
+                    "mean_ms": s["total"] / s["count"] * 1000 if s["count"] else 0.0,
+                    "max_ms": s["max"] * 1000,
+                }
+        return result
+
+
+def _vtk_reader(class_name, bottom_up=True):
+    """
+    用 VTK 自带的原生解码器读取；大多数 reader 按 VTK 习惯从下到上输出，
+    vtkTIFFReader 保持文件里从上到下的行序
+    """
+    def load(path):
+        from vtkmodules import vtkIOImage
+        from vtkmodules.util.numpy_support import vtk_to_numpy
+
+        reader = getattr(vtkIOImage, class_name)()
+        if hasattr(reader, "CanReadFile") and not reader.CanReadFile(path):
+            return None
+        reader.SetFileName(path)
+        reader.Update()
+        image = reader.GetOutput()
+        scalars = image.GetPointData().GetScalars()
+        if scalars is None:
+            return None
+
+        cols, rows, depth = image.GetDimensions()
+        comps = scalars.GetNumberOfComponents()
+        array = vtk_to_numpy(scalars)
+        # 多层（多页 TIFF 等）只取第一层
+        array = array[:rows * cols].reshape((rows, cols) if comps == 1 else (rows, cols, comps))
+        spacing = image.GetSpacing()
+        return MappedImage(path, array, cols, bottom_up=bottom_up, spacing=(spacing[0], spacing[1]))
+    return load
+
+
+def _read_dicom_pydicom(path):
+    """
+    压缩传输语法（JPEG / JPEG-LS / JPEG 2000 / RLE）和多帧 DICOM，
+    依赖 pydicom（以及对应的 pixel handler，如 pylibjpeg / gdcm）；多帧只显示第一帧
+    """
+    try:
+        import pydicom
+    except ImportError:
+        return None
+
+    ds = pydicom.dcmread(path)
+    if 'PixelData' not in ds:
+        return None
+    frames = int(getattr(ds, 'NumberOfFrames', 1) or 1)
+    array = ds.pixel_array
+    if frames > 1:
+        array = array[0]
+    if getattr(ds, 'PhotometricInterpretation', '') == 'MONOCHROME1':
+        array = array.max() - array
+    spacing = (1.0, 1.0)
+    if 'PixelSpacing' in ds:
+        spacing = (float(ds.PixelSpacing[1]), float(ds.PixelSpacing[0]))
+    return MappedImage(path, np.ascontiguousarray(array), array.shape[1], bottom_up=False, spacing=spacing)
+
+
+REGISTRY = ReaderRegistry()
+REGISTRY.register('bmp-mmap', read_bmp, ('.bmp',), [(0, b'BM')], priority=100)
+REGISTRY.register('dicom-mmap', read_dicom, ('.dcm', '.dicom'), [(128, b'DICM')], priority=100)
+REGISTRY.register('dicom-pydicom', _read_dicom_pydicom, ('.dcm', '.dicom'), [(128, b'DICM')], priority=50)
+REGISTRY.register('dicom-vtk', _vtk_reader('vtkDICOMImageReader'), ('.dcm', '.dicom'), [(128, b'DICM')])
+REGISTRY.register('bmp-vtk', _vtk_reader('vtkBMPReader'), ('.bmp',), [(0, b'BM')])
+REGISTRY.register('png', _vtk_reader('vtkPNGReader'), ('.png',), [(0, b'\x89PNG\r\n\x1a\n')])
+REGISTRY.register('tiff', _vtk_reader('vtkTIFFReader', bottom_up=False), ('.tif', '.tiff'), [(0, b'II*\x00'), (0, b'MM\x00*')])
+REGISTRY.register('jpeg', _vtk_reader('vtkJPEGReader'), ('.jpg', '.jpeg'), [(0, b'\xff\xd8\xff')])
+
+
+# ================================
+#        解码缓存
+# ================================
+class DecodeCache:
+    """
+    进程内共享的解码结果缓存：主视图、多时间点对比视图、关节裁剪共用，
+    每个文件（按 size / mtime 判断是否被修改）只解码一次。
+    按解码后的字节数做 LRU 淘汰；内存映射的图像只占页缓存，不计入字节数，
+    但每个都占一个文件描述符，所以另有条目数上限 max_entries（淘汰后没有其他引用时 mmap 随即关闭）。
+    """
+    def __init__(self, registry=REGISTRY, max_bytes=512 * 1024 * 1024, max_entries=64):
+        self.registry = registry
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.bytes = 0
+        self.hits = 0
+        self.decodes = 0
+        self._entries = OrderedDict()   # path → [stamp, image, nbytes, scalar_range]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    @staticmethod
+    def _nbytes(image):
+        base = image.buffer
+        while isinstance(base, np.ndarray) and base.base is not None:
+            base = base.base
+        return 0 if isinstance(base, mmap.mmap) else image.buffer.nbytes
+
+    def _entry(self, path):
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+
+        image = self.registry.load(path)
+        entry = [stamp, image, self._nbytes(image), None]
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[path] = entry
+            self.bytes += entry[2]
+            self.decodes += 1
+            while ((self.bytes > self.max_bytes or len(self._entries) > self.max_entries)
+                   and len(self._entries) > 1):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted[2]
+        return entry
+
+    def contains(self, path):
+        """
+        path 已解码且文件没有变化（不计入命中次数）
+        """
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            return False
+        with self._lock:
+            entry = self._entries.get(path)
+            return entry is not None and entry[0] == stamp
+
+    def load(self, path):
+        """
+        与 REGISTRY.load 相同，命中时不再解码；读不出时抛出 UnsupportedImage
+        """
+        return self._entry(path)[1]
+
+    def scalar_range(self, path):
+        entry = self._entry(path)
+        if entry[3] is None:
+            entry[3] = entry[1].scalar_range()
+        return entry[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+DECODE_CACHE = DecodeCache()
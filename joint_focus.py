@@ -0,0 +1,380 @@
+"""
+关节放大视图
+
+    focus = JointFocus(JSN_POINT, BE_POINT, schematic_size=(266, 575))
+    crops = focus.crops(path, 'L')          # {(mode, joint): JointCrop}，内存 / 磁盘缓存命中时直接返回
+    focus.prefetch(next_paths, 'L')         # 后台线程为接下来的 case 准备裁剪图
+    focus.set_landmarks(path, 'L', {('JSN', 'MCP-I'): (row, col), ...})   # 手动标点（至少 3 个）
+
+配准：示意图（hand.svg 坐标）→ 原图像素的仿射变换
+- 手动：阅片者给出若干关节在原图上的位置，最小二乘求仿射
+- 自动：缩略图上 Otsu 阈值分出手部前景，把示意图的边界框对齐到前景的边界框；
+  R 侧示意图先水平翻转（与评分控件一致）
+每个关节按仿射变换后的位置裁一块（半径 CROP_RADIUS 个示意图单位），缩放到 CROP_SIZE 并拉伸灰度。
+一张图一侧的所有裁剪图存成一个 .npz，键包含原图 size / mtime 与仿射参数，手动标点后自然失效。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from thumbnails import make_thumbnail
+
+CROP_RADIUS = 26        # 示意图单位
+CROP_SIZE = 192         # 输出像素
+MEMORY_ENTRIES = 8
+
+# center: 原图 (row, col)；radius: 原图像素；image: (CROP_SIZE, CROP_SIZE) uint8
+JointCrop = namedtuple('JointCrop', ['center', 'radius', 'image'])
+
+
+def default_cache_dir():
+    root = os.environ.get("RASCORER_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "ra-scorer")
+    return os.path.join(root, "crops")
+
+
+# ================================
+#        配准
+# ================================
+def estimate_affine(src, dst):
+    """
+    最小二乘仿射 A (2x3)，使 dst ≈ A @ [x, y, 1]；src / dst 为 (N, 2)，N >= 3
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    if len(src) < 3:
+        raise ValueError("At least 3 landmarks are needed for an affine registration")
+    X = np.hstack([src, np.ones((len(src), 1))])
+    A, *_ = np.linalg.lstsq(X, dst, rcond=None)
+    return A.T
+
+
+def apply_affine(A, points):
+    points = np.asarray(points, dtype=np.float64)
+    return points @ A[:, :2].T + A[:, 2]
+
+
+def otsu_threshold(values):
+    hist = np.bincount(values.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * np.arange(256))
+    between = (mean[-1] * weight - mean * total) ** 2 / np.maximum(weight * (total - weight), 1e-9)
+    return int(np.argmax(between))
+
+
+def auto_register(array, schematic_size, mirror=False, min_fraction=0.02):
+    """
+    示意图 (x, y) → 原图 (row, col) 的仿射；前景为空时退化为整幅图
+    """
+    rows, cols = array.shape[:2]
+    small = make_thumbnail(array, 256)
+    if small.ndim == 3:
+        small = small.mean(axis=2).astype(np.uint8)
+    step_r, step_c = rows / small.shape[0], cols / small.shape[1]
+
+    mask = small > otsu_threshold(small)
+    row_hits = np.flatnonzero(mask.mean(axis=1) > min_fraction)
+    col_hits = np.flatnonzero(mask.mean(axis=0) > min_fraction)
+    if len(row_hits) and len(col_hits):
+        r0, r1 = row_hits[0] * step_r, (row_hits[-1] + 1) * step_r
+        c0, c1 = col_hits[0] * step_c, (col_hits[-1] + 1) * step_c
+    else:
+        r0, r1, c0, c1 = 0.0, float(rows), 0.0, float(cols)
+
+    w, h = schematic_size
+    sx = (c1 - c0) / w
+    sy = (r1 - r0) / h
+    if mirror:
+        # col = c1 - x * sx
+        return np.array([[0.0, sy, r0], [-sx, 0.0, c1]])
+    return np.array([[0.0, sy, r0], [sx, 0.0, c0]])
+
+
+def _affine_scale(A):
+    return float(np.sqrt(abs(np.linalg.det(A[:, :2]))))
+
+
+def _percentiles_uint8(values, qs):
+    """
+    与 np.percentile（线性插值）结果相同，uint8 用直方图代替排序
+    """
+    cdf = np.cumsum(np.bincount(values.ravel(), minlength=256))
+    n = int(cdf[-1])
+    out = []
+    for q in qs:
+        pos = q / 100 * (n - 1)
+        k = int(pos)
+        lo = int(np.searchsorted(cdf, k + 1))
+        hi = int(np.searchsorted(cdf, min(k + 2, n)))
+        out.append(lo + (pos - k) * (hi - lo))
+    return out
+
+
+def extract_crop(array, center, radius, size=CROP_SIZE):
+    """
+    以 center (row, col) 为中心取边长 2 * radius 的方块（越界部分补 0），最近邻缩放到 size
+    """
+    rows, cols = array.shape[:2]
+    idx = (np.arange(size) + 0.5) * (2 * radius / size) - radius
+    r = np.rint(center[0] + idx).astype(np.intp)
+    c = np.rint(center[1] + idx).astype(np.intp)
+    valid_r = (r >= 0) & (r < rows)
+    valid_c = (c >= 0) & (c < cols)
+    patch = array[np.clip(r, 0, rows - 1)[:, None], np.clip(c, 0, cols - 1)[None, :]]
+    if patch.ndim == 3:
+        patch = patch.mean(axis=2)
+    if not (valid_r.any() and valid_c.any()):
+        lo, hi = 0, 0
+    elif patch.dtype == np.uint8:
+        lo, hi = _percentiles_uint8(patch[valid_r][:, valid_c], (1, 99))
+    else:
+        lo, hi = np.percentile(patch[valid_r][:, valid_c], (1, 99))
+    patch = patch.astype(np.float32)
+    patch[~valid_r, :] = 0
+    patch[:, ~valid_c] = 0
+
+    if hi <= lo:
+        return np.zeros((size, size), dtype=np.uint8)
+    return np.clip((patch - lo) * (255.0 / (hi - lo)), 0, 255).astype(np.uint8)
+
+
+def load_landmarks(path):
+    """
+    landmarks.json → {(abspath, side): {(mode, joint): (row, col)}}
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {(item["path"], item["side"]): {(m, j): tuple(p) for m, j, p in item["points"]}
+            for item in data}
+
+
+def register(points, schematic_size, array, side, landmarks=None):
+    """
+    有手动标点时按标点求仿射，否则自动配准；points 为 {(mode, joint): 示意图 (x, y)}
+    """
+    if landmarks:
+        names = list(landmarks)
+        return estimate_affine([points[n] for n in names], [landmarks[n] for n in names])
+    return auto_register(array, schematic_size, mirror=(side == 'R'))
+
+
+def joint_crops(array, A, schematic_points, radius=CROP_RADIUS, size=CROP_SIZE):
+    """
+    按仿射 A 裁出每个关节：返回 centers (N, 2)、radii (N,)、images (N, size, size) uint8
+    """
+    centers = apply_affine(A, schematic_points)
+    r = radius * _affine_scale(A)
+    images = np.stack([extract_crop(array, center, r, size) for center in centers])
+    return centers, np.full(len(centers), r), images
+
+
+# ================================
+#        裁剪缓存
+# ================================
+class JointFocus:
+    def __init__(self, jsn_points, be_points, schematic_size, cache_dir=None,
+                 radius=CROP_RADIUS, size=CROP_SIZE):
+        self.points = {('JSN', k): v for k, v in jsn_points.items()}
+        self.points.update({('BE', k): v for k, v in be_points.items()})
+        self.schematic_size = schematic_size
+        self.root = cache_dir or default_cache_dir()
+        self.radius = radius
+        self.size = size
+        os.makedirs(self.root, exist_ok=True)
+
+        self._memory = OrderedDict()       # (path, side) → {(mode, joint): JointCrop}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="joint-focus")
+        self._pending = {}
+        self._epoch = {}                   # (path, side) → 标点修改次数，旧仿射算出的结果不再入缓存
+        self.landmarks = self._load_landmarks()
+
+    # ---------- 手动标点 ----------
+    def _landmark_file(self):
+        return os.path.join(self.root, "landmarks.json")
+
+    def _load_landmarks(self):
+        return load_landmarks(self._landmark_file())
+
+    def set_landmarks(self, path, side, points):
+        """
+        points: {(mode, joint): (row, col)}，至少 3 个；传空 dict 时回到自动配准
+        """
+        if points and len(points) < 3:
+            raise ValueError("At least 3 landmarks are needed for an affine registration")
+        key = (os.path.abspath(path), side)
+        if points:
+            self.landmarks[key] = dict(points)
+        else:
+            self.landmarks.pop(key, None)
+        data = [{"path": p, "side": s, "points": [[m, j, list(rc)] for (m, j), rc in pts.items()]}
+                for (p, s), pts in self.landmarks.items()]
+        tmp = f"{self._landmark_file()}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._landmark_file())
+        with self._lock:
+            self._memory.pop((path, side), None)
+            self._epoch[(path, side)] = self._epoch.get((path, side), 0) + 1
+            future = self._pending.pop((path, side), None)
+        if future is not None:
+            future.cancel()
+
+    def affine(self, path, side, array):
+        return register(self.points, self.schematic_size, array, side,
+                        self.landmarks.get((os.path.abspath(path), side)))
+
+    # ---------- 计算与缓存 ----------
+    def _cache_file(self, path, side, A):
+        st = os.stat(path)
+        key = (f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{side}|{self.radius}|{self.size}|"
+               + ",".join(f"{v:.3f}" for v in A.ravel()))
+        return os.path.join(self.root, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npz")
+
+    def _compute(self, path, side):
+        from image_io import DECODE_CACHE
+
+        array = DECODE_CACHE.load(path).array
+        A = self.affine(path, side, array)
+        cache_file = self._cache_file(path, side, A)
+        names = list(self.points)
+        try:
+            with np.load(cache_file) as data:
+                centers, radii, images = data["centers"], data["radii"], data["images"]
+        except (OSError, ValueError, KeyError):
+            centers, radii, images = joint_crops(array, A, [self.points[n] for n in names],
+                                                 self.radius, self.size)
+            tmp = f"{cache_file}.{os.getpid()}.tmp.npz"
+            np.savez(tmp, centers=centers, radii=radii, images=images)
+            os.replace(tmp, cache_file)
+        return {name: JointCrop(tuple(centers[i]), float(radii[i]), images[i]) for i, name in enumerate(names)}
+
+    def _remember(self, key, crops, epoch=None):
+        with self._lock:
+            if epoch is not None and self._epoch.get(key, 0) != epoch:
+                return
+            self._memory[key] = crops
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def cached(self, path, side):
+        with self._lock:
+            crops = self._memory.get((path, side))
+            if crops is not None:
+                self._memory.move_to_end((path, side))
+            return crops
+
+    def crops(self, path, side):
+        """
+        {(mode, joint): JointCrop}；预取中的直接等待结果，读不出图像时返回 {}
+        """
+        crops = self.cached(path, side)
+        if crops is not None:
+            return crops
+        future = self._pending.get((path, side))
+        epoch = self._epoch.get((path, side), 0)
+        try:
+            crops = future.result() if future is not None else self._compute(path, side)
+        except Exception:
+            return {}
+        self._remember((path, side), crops, epoch)
+        return crops
+
+    def prefetch(self, paths, side):
+        """
+        后台线程依次准备 paths 的裁剪图（已在内存里的跳过）
+        """
+        self._pending = {key: f for key, f in self._pending.items() if not f.done()}
+        for path in paths:
+            key = (path, side)
+            if key in self._pending or self.cached(path, side) is not None:
+                continue
+            self._pending[key] = self._pool.submit(self._prefetch_one, key, self._epoch.get(key, 0))
+
+    def _prefetch_one(self, key, epoch):
+        crops = self._compute(*key)
+        self._remember(key, crops, epoch)
+        return crops
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from main import JSN_POINT, BE_POINT
+
+    rng = np.random.default_rng(0)
+    for n in (1, 2, 37, 36864):
+        values = rng.integers(0, 256, size=n).astype(np.uint8)
+        assert np.allclose(_percentiles_uint8(values, (1, 99)), np.percentile(values, (1, 99)))
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+    paths = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir))
+
+    # 仿射估计：3 个以上点时精确还原
+    A = np.array([[0.1, 2.9, 40.0], [3.1, -0.2, 15.0]])
+    src = np.array([[0, 0], [100, 20], [30, 200], [250, 500]], dtype=float)
+    assert np.allclose(estimate_affine(src, apply_affine(A, src)), A)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        focus = JointFocus(JSN_POINT, BE_POINT, schematic_size=(266, 575), cache_dir=tmp)
+        for label in ("cold", "disk", "memory"):
+            if label == "disk":
+                focus._memory.clear()
+            t0 = time.perf_counter()
+            crops = focus.crops(paths[0], 'L')
+            print(f"{label}: {len(crops)} crops in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        crop = crops[('JSN', 'MCP-I')]
+        assert crop.image.shape == (CROP_SIZE, CROP_SIZE) and crop.image.std() > 10
+
+        # R 侧镜像：同一关节落在水平对称的位置
+        image = __import__("image_io").REGISTRY.load(paths[0]).array
+        left = focus.affine(paths[0], 'L', image)
+        right = focus.affine(paths[0], 'R', image)
+        l_col = apply_affine(left, [JSN_POINT['MCP-T']])[0, 1]
+        r_col = apply_affine(right, [JSN_POINT['MCP-T']])[0, 1]
+        c0, c1 = apply_affine(left, [[0, 0], [266, 0]])[:, 1]
+        assert abs((l_col - c0) - (c1 - r_col)) < 1e-6
+
+        # 手动标点覆盖自动配准
+        manual = {n: tuple(c.center) for n, c in list(crops.items())[:3]}
+        manual = {n: (r + 10, c) for n, (r, c) in manual.items()}
+        focus.set_landmarks(paths[0], 'L', manual)
+        moved = focus.crops(paths[0], 'L')
+        assert abs(moved[('JSN', 'MCP-T')].center[0] - crops[('JSN', 'MCP-T')].center[0] - 10) < 1e-6
+
+        # 预取：下一个 case 在后台准备好后直接从内存返回
+        focus.prefetch(paths[1:], 'L')
+        for future in list(focus._pending.values()):
+            future.result()
+        t0 = time.perf_counter()
+        assert focus.crops(paths[2], 'L')
+        print(f"prefetched: {(time.perf_counter() - t0) * 1e6:.0f} us")
+
+        # 预取途中改了标点：旧仿射算出的结果既不返回也不进内存
+        focus._memory.clear()
+        focus.set_landmarks(paths[1], 'L', {})
+        focus.prefetch([paths[1]], 'L')
+        stale = focus._pending[(paths[1], 'L')]
+        focus.set_landmarks(paths[1], 'L', manual)
+        try:
+            stale.result()
+        except Exception:
+            pass
+        assert (paths[1], 'L') not in focus._memory
+        shifted = focus.crops(paths[1], 'L')
+        assert np.allclose(shifted[('JSN', 'MCP-T')].center, moved[('JSN', 'MCP-T')].center)
+        focus.shutdown()
+    print("[OK] joint focus")
@@ -1,5 +1,6 @@
 import os
 import sys
+from contextlib import contextmanager
 
 from PyQt5 import QtWidgets, QtCore, QtGui, QtSvg
 from PyQt5.QtCore import Qt, QRectF, QPointF
@@ -8,11 +9,19 @@ from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QFont
 from ui_GUI import Ui_RAScorer
 from functools import partial
 
-import vtkmodules.all as vtk
-from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
-from scorer import Scorer
+# VTK 相关模块较重，由 _init_viewer 在窗口显示后再导入（见 viewer.py）
+from scorer import Scorer, SCORE_SCALES
+from profiling import PROFILER, profiled
+from session import ReaderSession, ConsolidatedView
+from navigation import CaseIndex, REVIEWED_BIT, COMPLETE_BIT, HAS_BE_BIT
+from history import UndoHistory, history_path
+from audit import AuditLog, audit_path
+from telemetry import Telemetry
+from scheduler import STRATEGIES
 import random
 import datetime
+import getpass
+import zlib
 
 JSN_POINT = {
     'MCP-T': (237, 344),
@@ -57,112 +66,6 @@ BE_POINT = {
 }
 
 
-# ================== 独立 VTK 交互类 ==================
-class XRayVTKViewer(QtWidgets.QWidget):
-    """
-    单独封装 VTK 显示逻辑的类：
-    - 负责创建 QVTKRenderWindowInteractor
-    - 设置 renderer / interactor style
-    - 提供 show_xray(filepath) 接口
-    """
-    def __init__(self, parent=None):
-        super().__init__(parent)
-
-        # QVTK 组件
-        self.vtkWidget = QVTKRenderWindowInteractor(self)
-        layout = QtWidgets.QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.addWidget(self.vtkWidget)
-
-        # renderer / interactor
-        self.renderer = vtk.vtkRenderer()
-        self.vtkWidget.GetRenderWindow().AddRenderer(self.renderer)
-
-        self.interactor = self.vtkWidget.GetRenderWindow().GetInteractor()
-        style = vtk.vtkInteractorStyleImage()
-        self.interactor.SetInteractorStyle(style)
-        self.interactor.Initialize()
-
-    def update_image(self, filepath: str) -> bool:
-        """
-        显示 X-ray 图像（DICOM 或 BMP）。
-        只负责图像显示和相机设置，不处理 scorer 逻辑。
-        返回：
-            True  - 显示成功
-            False - 文件不存在或格式不支持
-        """
-        if not os.path.exists(filepath):
-            QtWidgets.QMessageBox.warning(self, "Error", f"File not found:\n{filepath}")
-            return False
-
-        ext = os.path.splitext(filepath)[1].lower()
-
-        if ext == ".dcm":
-            reader = vtk.vtkDICOMImageReader()
-            reader.SetFileName(filepath)
-        elif ext == ".bmp":
-            reader = vtk.vtkBMPReader()
-            reader.SetFileName(filepath)
-        else:
-            QtWidgets.QMessageBox.warning(
-                self,
-                "Unsupported",
-                "当前示例只支持 .dcm（DICOM） 和 .bmp 文件。",
-            )
-            return False
-
-        reader.Update()
-        image_data = reader.GetOutput()
-        min_val, max_val = image_data.GetScalarRange()
-
-        window = max_val - min_val
-        if window <= 0:
-            window = 1.0
-        level = (max_val + min_val) / 2.0
-
-        window_level = vtk.vtkImageMapToWindowLevelColors()
-        window_level.SetInputData(image_data)
-        window_level.SetWindow(window)
-        window_level.SetLevel(level)
-        window_level.Update()
-
-        image_actor = vtk.vtkImageActor()
-        image_actor.GetMapper().SetInputConnection(window_level.GetOutputPort())
-
-        # 清空并添加新 actor
-        self.renderer.RemoveAllViewProps()
-        self.renderer.AddActor(image_actor)
-
-        # 相机设置
-        camera = self.renderer.GetActiveCamera()
-        camera.ParallelProjectionOn()
-        self.renderer.ResetCamera()
-
-        extent = image_data.GetExtent()
-        spacing = image_data.GetSpacing()
-        img_w = (extent[1] - extent[0] + 1) * spacing[0]
-        img_h = (extent[3] - extent[2] + 1) * spacing[1]
-
-        if img_w > 0 and img_h > 0:
-            rw = max(self.vtkWidget.width(), 1)
-            rh = max(self.vtkWidget.height(), 1)
-
-            view_aspect = rw / rh
-            img_aspect = img_w / img_h
-
-            if view_aspect > img_aspect:
-                scale = img_h / 2.0
-            else:
-                scale = img_w / (2.0 * view_aspect)
-
-            camera.SetParallelScale(scale)
-
-        self.renderer.ResetCameraClippingRange()
-        self.vtkWidget.GetRenderWindow().Render()
-
-        return True
-
-
 class SvgScoreWidget(QtWidgets.QWidget):
     """
     在本控件中绘制 SVG，并在 SVG 上叠加若干个 QComboBox。
@@ -171,7 +74,11 @@ class SvgScoreWidget(QtWidgets.QWidget):
     - 根据 jsn_points / be_points 自动生成 combobox
     - 根据 score_mode 切换显示 JSN / BE
     - 根据 LorR_mode 实现左右水平翻转（SVG + combobox 一起翻）
+    - combobox 获得焦点时发出 jointSelected(mode, name)
+    - 分数改变时发出 scoresChanged([(mode, side, name), ...])；批量更新（batch()）结束时只发一次
     """
+    jointSelected = QtCore.pyqtSignal(str, str)
+    scoresChanged = QtCore.pyqtSignal(list)
 
     def __init__(self, svg_path: str,
                  jsn_points: dict,
@@ -202,6 +109,9 @@ class SvgScoreWidget(QtWidgets.QWidget):
         # combobox 字典：{'JSN': {name: {'rel_position': QPointF, 'CB': QComboBox, 'tmp_score': {'L':..,'R':..}}}}
         self.combos = {"JSN": {}, "BE": {}}
 
+        # 批量更新中累积的改动 {(mode, side, name)}，None 表示不在批量更新中
+        self._batch_changes = None
+
         # 计算相对坐标并创建所有 combobox
         self._init_combos()
 
@@ -216,16 +126,19 @@ class SvgScoreWidget(QtWidgets.QWidget):
             self.combos["JSN"][name]["rel_position"] = QtCore.QPointF(rx, ry)
 
             cb = QtWidgets.QComboBox(self)
-            cb.addItems(["0", "1", "2", "3", "4"])
+            cb.addItems([str(v) for v in SCORE_SCALES["JSN"]])
             cb.setCurrentIndex(-1)  # 初始为空
             self.combos["JSN"][name]["CB"] = cb
             # 为左右两侧分别保存一个临时分数
             self.combos["JSN"][name]["tmp_score"] = {"L": None, "R": None}
+            # 模型建议分数，未打分时作为灰色占位文字显示
+            self.combos["JSN"][name]["proposed"] = {"L": None, "R": None}
 
             # combobox 改变时更新 tmp_score
             cb.currentIndexChanged.connect(
                 lambda idx, m="JSN", k=name: self._on_cb_changed(m, k, idx)
             )
+            cb.installEventFilter(self)
 
         # BE combobox
         for name, (x, y) in self.point_dicts["BE"].items():
@@ -236,18 +149,30 @@ class SvgScoreWidget(QtWidgets.QWidget):
             self.combos["BE"][name]["rel_position"] = QtCore.QPointF(rx, ry)
 
             cb = QtWidgets.QComboBox(self)
-            cb.addItems(["0", "1", "2", "3", "5"])
+            cb.addItems([str(v) for v in SCORE_SCALES["BE"]])
             cb.setCurrentIndex(-1)
             self.combos["BE"][name]["CB"] = cb
             self.combos["BE"][name]["tmp_score"] = {"L": None, "R": None}
+            self.combos["BE"][name]["proposed"] = {"L": None, "R": None}
 
             cb.currentIndexChanged.connect(
                 lambda idx, m="BE", k=name: self._on_cb_changed(m, k, idx)
             )
+            cb.installEventFilter(self)
 
         # 初始布局一次
         self.update_combo_positions()
 
+    # ---------- combobox 获得焦点：通知外部放大对应关节 ----------
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.FocusIn:
+            for mode, m_dict in self.combos.items():
+                for name, info in m_dict.items():
+                    if info.get("CB") is obj:
+                        self.jointSelected.emit(mode, name)
+                        break
+        return super().eventFilter(obj, event)
+
     # ---------- combobox 改变时，写回 tmp_score ----------
     def _on_cb_changed(self, mode: str, name: str, index: int):
         """
@@ -264,7 +189,44 @@ class SvgScoreWidget(QtWidgets.QWidget):
         side = self.LorR_mode  # 当前是 L 还是 R
         tmp = info.get("tmp_score", None)
         if isinstance(tmp, dict) and side in tmp:
-            tmp[side] = text if text != "" else None
+            self._set_tmp(mode, name, side, text if text != "" else None)
+
+    # ====================================================
+    #  批量更新：屏蔽 combobox 信号，只改有差异的控件，结束时发一次 scoresChanged
+    # ====================================================
+    @contextmanager
+    def batch(self):
+        """
+        with widget.batch():
+            widget.set_score_state(...)
+            widget.set_side_scores(...)
+
+        嵌套时并入最外层
+        """
+        if self._batch_changes is not None:
+            yield
+            return
+        self._batch_changes = set()
+        try:
+            yield
+        finally:
+            changes, self._batch_changes = self._batch_changes, None
+            if changes:
+                self.scoresChanged.emit(sorted(changes))
+
+    def _set_tmp(self, mode, name, side, value):
+        """
+        写入 tmp_score[side]，值有变化时记录改动；返回是否有变化
+        """
+        tmp = self.combos[mode][name]["tmp_score"]
+        if tmp[side] == value:
+            return False
+        tmp[side] = value
+        if self._batch_changes is not None:
+            self._batch_changes.add((mode, side, name))
+        else:
+            self.scoresChanged.emit([(mode, side, name)])
+        return True
 
     # ---------- 将当前 combobox 的值保存到 tmp_score[side] ----------
     def _save_current_scores_to_tmp(self, side: str):
@@ -278,30 +240,37 @@ class SvgScoreWidget(QtWidgets.QWidget):
                 if cb is None or not isinstance(tmp, dict) or side not in tmp:
                     continue
                 text = cb.currentText()
-                tmp[side] = text if text != "" else None
+                if text == "" and tmp[side] is not None and cb.findText(str(tmp[side])) < 0:
+                    # 量表外的值下拉框显示为空，保留原值，交给 validation.Validator 报告
+                    continue
+                self._set_tmp(mode, name, side, text if text != "" else None)
 
     # ---------- 从 tmp_score[side] 恢复 combobox ----------
     def _restore_scores_from_tmp(self, side: str):
         """
-        在切换到新的 L/R 后调用，从 tmp_score[side] 恢复 combobox 的选择
+        在切换到新的 L/R 后调用，从 tmp_score[side] 恢复 combobox 的选择。
+        只改动显示值不同的 combobox，且不触发 currentIndexChanged
         """
-        for mode, m_dict in self.combos.items():
-            for name, info in m_dict.items():
-                cb = info.get("CB", None)
-                tmp = info.get("tmp_score", None)
-                if cb is None or not isinstance(tmp, dict) or side not in tmp:
-                    continue
+        with self.batch():
+            for mode, m_dict in self.combos.items():
+                for name, info in m_dict.items():
+                    cb = info.get("CB", None)
+                    tmp = info.get("tmp_score", None)
+                    if cb is None or not isinstance(tmp, dict) or side not in tmp:
+                        continue
 
-                text = tmp[side]
-                if text is None:
-                    cb.setCurrentIndex(-1)
-                else:
-                    idx = cb.findText(str(text))
-                    if idx >= 0:
+                    proposed = info.get("proposed", {}).get(side)
+                    placeholder = "" if proposed is None else f"({proposed})"
+                    if cb.placeholderText() != placeholder:
+                        cb.setPlaceholderText(placeholder)
+
+                    text = tmp[side]
+                    # 量表外的值找不到：只把下拉框设为空，tmp_score 保留原值
+                    idx = -1 if text is None else cb.findText(str(text))
+                    if cb.currentIndex() != idx:
+                        cb.blockSignals(True)
                         cb.setCurrentIndex(idx)
-                    else:
-                        # 找不到就设为空
-                        cb.setCurrentIndex(-1)
+                        cb.blockSignals(False)
 
     # ---------- 对外接口：切换 JSN / BE ----------
     def set_score_mode(self, mode: str):
@@ -436,6 +405,7 @@ class SvgScoreWidget(QtWidgets.QWidget):
         self.update_combo_positions()
 
     # ---------- 导出当前所有分数状态（JSN+BE，L+R） ----------
+    @profiled("widget.get_score_state")
     def get_score_state(self):
         """
         返回所有关节、所有模式(JSN/BE)、左右(L/R)的分数状态。
@@ -451,7 +421,7 @@ class SvgScoreWidget(QtWidgets.QWidget):
                 'R': {...},
             }
         }
-        分数为 int 或 None（未选择）
+        分数为 int 或 None（未选择）；从 Scorer 载入的非数字值原样返回
         """
         # 先把当前侧正在显示的 combobox 写回 tmp_score
         self._save_current_scores_to_tmp(self.LorR_mode)
@@ -474,12 +444,14 @@ class SvgScoreWidget(QtWidgets.QWidget):
                         try:
                             value = int(text)
                         except ValueError:
-                            value = None
+                            # 非数字原样返回，写回 Scorer 后仍由 Validator 标记为非法
+                            value = text
                     state[mode][side][name] = value
 
         return state
 
     # ---------- 从 state 中恢复所有分数状态 ----------
+    @profiled("widget.set_score_state")
     def set_score_state(self, state: dict):
         """
         从 state 中恢复所有关节的分数状态。
@@ -490,31 +462,50 @@ class SvgScoreWidget(QtWidgets.QWidget):
         if not isinstance(state, dict):
             return
 
-        for mode, m_dict in self.combos.items():
-            mode_state = state.get(mode, {})
-            if not isinstance(mode_state, dict):
-                continue
-            for name, info in m_dict.items():
-                tmp = info.get("tmp_score", None)
-                if not isinstance(tmp, dict):
+        with self.batch():
+            for mode, m_dict in self.combos.items():
+                mode_state = state.get(mode, {})
+                if not isinstance(mode_state, dict):
                     continue
-
-                for side in ("L", "R"):
-                    side_dict = mode_state.get(side, {})
-                    if not isinstance(side_dict, dict):
+                for name, info in m_dict.items():
+                    tmp = info.get("tmp_score", None)
+                    if not isinstance(tmp, dict):
                         continue
 
-                    val = side_dict.get(name, None)
-                    if val is None:
-                        tmp[side] = None
-                    else:
-                        tmp[side] = str(val)
+                    for side in ("L", "R"):
+                        side_dict = mode_state.get(side, {})
+                        if not isinstance(side_dict, dict):
+                            continue
 
-        # 更新当前侧的 combobox 显示
-        self._restore_scores_from_tmp(self.LorR_mode)
-        self.update_combo_positions()
+                        val = side_dict.get(name, None)
+                        self._set_tmp(mode, name, side, None if val is None else str(val))
+
+            # 更新当前侧的 combobox 显示
+            self._restore_scores_from_tmp(self.LorR_mode)
         self.update()
 
+    def set_side_scores(self, mode: str, side: str, value):
+        """
+        把某一模式、某一侧的所有关节设为同一个值（全阴 / 全阳）
+        """
+        with self.batch():
+            for name in self.combos[mode]:
+                self._set_tmp(mode, name, side, None if value is None else str(value))
+            if side == self.LorR_mode:
+                self._restore_scores_from_tmp(side)
+
+    # ---------- 模型建议分数 ----------
+    def set_proposed_state(self, state):
+        """
+        state 结构与 get_score_state() 相同，None 表示清空建议
+        """
+        for mode, m_dict in self.combos.items():
+            mode_state = (state or {}).get(mode, {})
+            for name, info in m_dict.items():
+                for side in ("L", "R"):
+                    info["proposed"][side] = mode_state.get(side, {}).get(name)
+        self._restore_scores_from_tmp(self.LorR_mode)
+
 class MyListWidget(QtWidgets.QListWidget):
     orderChanged = QtCore.pyqtSignal(list)  # 信号：顺序变化时发出 list
 
@@ -533,14 +524,138 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
 
         self.scorer = Scorer()
         self.file_paths = []
-        self.current_case = 0
+        # 当前 case 以路径记录（见 current_case 属性），导航索引负责 路径 → 行号
+        self.navigation = CaseIndex((), self.scorer)
+        # 评分校验（validation.Validator，依赖 numpy，第一次设置文件列表时再创建）
+        self.validator = None
+        self.current_path = None
         self.save_path = ''
 
+        # ================== 撤销 / 重做 ==================
+        # 按 case 记录每次操作改动的关节（见 history.py），随会话 JSON 一起保存
+        self.history = UndoHistory(self.scorer)
+        self.action_Undo = QtWidgets.QAction("Undo", self)
+        self.action_Undo.setShortcut(QtGui.QKeySequence.Undo)
+        self.action_Redo = QtWidgets.QAction("Redo", self)
+        self.action_Redo.setShortcut(QtGui.QKeySequence.Redo)
+        self.toolBar.addSeparator()
+        self.toolBar.addAction(self.action_Undo)
+        self.toolBar.addAction(self.action_Redo)
+        self.action_Undo.triggered.connect(self._undo)
+        self.action_Redo.triggered.connect(self._redo)
+
+        # ================== 多阅片者会话 ==================
+        # 阅片者身份：区分共享会话中各自的变更集（见 session.py）
+        self.reader = os.environ.get("RASCORER_READER") or getpass.getuser()
+        self.reader_session = None
+        self.session_view = None
+        # 合并时跳过的当前 case 的单元格，离开该 case 后再应用
+        self.session_deferred = set()
+        # 审计日志：谁在什么时候改了哪个关节，保存会话时写入 <session>.audit.sqlite（见 audit.py）
+        self.audit = AuditLog(reader=self.reader, scorer=self.scorer)
+        # 阅片耗时：每个 case 的停留 / 有效操作时长、修改数、到标记 reviewed 的时间（见 telemetry.py）
+        self.telemetry = Telemetry(self.audit, self.scorer)
+        self.action_Throughput = QtWidgets.QAction("Throughput", self)
+        self.toolBar.addAction(self.action_Throughput)
+        self.action_Throughput.triggered.connect(self._show_throughput)
+        QtWidgets.QApplication.instance().installEventFilter(self)
+        self.session_timer = QtCore.QTimer(self)
+        self.session_timer.setInterval(5000)
+        self.session_timer.timeout.connect(self._refresh_session)
+
         # ================== VTK 交互类 GL_Xray ==================
-        self.xray_viewer = XRayVTKViewer(self.GL_Xray)
-        layout = QtWidgets.QVBoxLayout(self.GL_Xray)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.addWidget(self.xray_viewer)
+        # VTK 初始化较慢，先显示窗口，首次 showEvent 之后再创建 viewer
+        self.xray_viewer = None
+        self.xray_layout = QtWidgets.QVBoxLayout(self.GL_Xray)
+        self.xray_layout.setContentsMargins(0, 0, 0, 0)
+
+        # ================== 缩略图面板 ==================
+        # 缩略图在进程池里生成（见 thumbnails.py），定时器按时间预算逐步填入图标
+        self.thumbnails = None
+        self.thumb_rows = {}
+        self.LW_Thumbs = QtWidgets.QListWidget(self.centralwidget)
+        self.LW_Thumbs.setViewMode(QtWidgets.QListView.IconMode)
+        self.LW_Thumbs.setIconSize(QtCore.QSize(96, 96))
+        self.LW_Thumbs.setGridSize(QtCore.QSize(112, 124))
+        self.LW_Thumbs.setResizeMode(QtWidgets.QListView.Adjust)
+        self.LW_Thumbs.setMovement(QtWidgets.QListView.Static)
+        self.LW_Thumbs.setUniformItemSizes(True)
+        self.verticalLayout.insertWidget(1, self.LW_Thumbs)
+        self.LW_Thumbs.currentRowChanged.connect(self.LW_Files.setCurrentRow)
+        self.thumb_timer = QtCore.QTimer(self)
+        self.thumb_timer.setInterval(50)
+        self.thumb_timer.timeout.connect(self._poll_thumbnails)
+
+        # ================== 模型预评分 ==================
+        # 设置 RASCORER_PREDICTOR（"dummy" 或 "package.module:Class"）时，
+        # 在进程池里对工作列表推理，结果作为建议分数显示（见 prediction.py）
+        self.predictions = None
+        self.predict_timer = QtCore.QTimer(self)
+        self.predict_timer.setInterval(200)
+        self.predict_timer.timeout.connect(self._poll_predictions)
+        self.action_Accept_Proposed = QtWidgets.QAction("Accept proposed", self)
+        self.action_Accept_Proposed.setShortcut(QtGui.QKeySequence("Ctrl+Shift+A"))
+        self.action_Accept_Proposed.setEnabled(bool(os.environ.get("RASCORER_PREDICTOR")))
+        self.toolBar.addAction(self.action_Accept_Proposed)
+        self.action_Accept_Proposed.triggered.connect(self._accept_proposed)
+
+        # ================== 监视文件夹 ==================
+        # 打开的文件夹里新写完的片子自动追加到工作列表末尾，当前 case 不变（见 watcher.py）
+        self.current_dir = None
+        self.watcher = None
+        self.watch_timer = QtCore.QTimer(self)
+        self.watch_timer.setInterval(1000)
+        self.watch_timer.timeout.connect(self._poll_watch)
+        self.action_Watch_Folder = QtWidgets.QAction("Watch folder", self)
+        self.action_Watch_Folder.setCheckable(True)
+        self.toolBar.addAction(self.action_Watch_Folder)
+        self.action_Watch_Folder.toggled.connect(self._toggle_watch)
+
+        # ================== 内容身份 ==================
+        # 后台按像素内容计算摘要（见 identity.py）：重复的片子在列表里标出，文件移动后按内容重新绑定会话
+        self.identity = None
+        self.duplicate_of = {}
+        self.identity_timer = QtCore.QTimer(self)
+        self.identity_timer.setInterval(500)
+        self.identity_timer.timeout.connect(self._poll_identity)
+        self.action_Relocate = QtWidgets.QAction("Relocate cases", self)
+        self.action_Relocate.setToolTip("Find moved case files by image content")
+        self.toolBar.addAction(self.action_Relocate)
+        self.action_Relocate.triggered.connect(self._relocate_cases)
+
+        # ================== 检索与跳转 ==================
+        self.LE_Search = QtWidgets.QLineEdit(self.centralwidget)
+        self.LE_Search.setPlaceholderText("Search ID / date / path, Enter = next match")
+        self.PB_Next_Unreviewed = QtWidgets.QPushButton("Next unreviewed", self.centralwidget)
+        self.PB_Next_Incomplete = QtWidgets.QPushButton("Next incomplete", self.centralwidget)
+        self.PB_Next_BE = QtWidgets.QPushButton("Next with BE", self.centralwidget)
+        # 工作列表顺序与预取（见 scheduler.py）：打开 case 之后在后台解码接下来的几个
+        self.CB_Order = QtWidgets.QComboBox(self.centralwidget)
+        self.CB_Order.addItems(STRATEGIES)
+        self.CB_Order.setToolTip("Worklist order")
+        self.prefetcher = None
+        nav_buttons = QtWidgets.QHBoxLayout()
+        for button in (self.PB_Next_Unreviewed, self.PB_Next_Incomplete, self.PB_Next_BE, self.CB_Order):
+            nav_buttons.addWidget(button)
+        self.verticalLayout.insertLayout(0, nav_buttons)
+        self.verticalLayout.insertWidget(0, self.LE_Search)
+
+        self.LE_Search.returnPressed.connect(self._search_case)
+        self.PB_Next_Unreviewed.clicked.connect(lambda: self._jump_next(REVIEWED_BIT, False, "unreviewed"))
+        self.PB_Next_Incomplete.clicked.connect(lambda: self._jump_next(COMPLETE_BIT, False, "incomplete"))
+        self.PB_Next_BE.clicked.connect(lambda: self._jump_next(HAS_BE_BIT, True, "with BE"))
+        self.CB_Order.currentTextChanged.connect(self._reorder_cases)
+
+        # ================== 性能埋点读数 ==================
+        # RASCORER_PROFILE=1 / RASCORER_TRACE=trace.json 时在状态栏右侧显示最慢操作的 p50 / p95
+        self.profile_label = None
+        if PROFILER.enabled:
+            self.profile_label = QtWidgets.QLabel(self)
+            self.statusbar.addPermanentWidget(self.profile_label)
+            self.profile_timer = QtCore.QTimer(self)
+            self.profile_timer.setInterval(1000)
+            self.profile_timer.timeout.connect(self._update_profile_label)
+            self.profile_timer.start()
 
         # ================== Score_Model 相关 ==================
         # 假设 SVG 文件叫 hand.svg，和 main.py 在同一目录
@@ -556,6 +671,60 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
         score_layout.setContentsMargins(0, 0, 0, 0)
         score_layout.addWidget(self.svg_widget)
 
+        # ================== 关节放大视图 ==================
+        # 下拉框获得焦点时显示该关节的放大裁剪图，并把 X-ray 视图移过去（见 joint_focus.py）；
+        # 自动配准不准时，选中关节后在 X-ray 上 Ctrl + 点击标出位置，标满 3 个关节后按手动标点配准
+        self.joint_focus = None
+        self.focused_joint = None
+        self.landmark_points = {}
+        self.LB_Focus = QtWidgets.QLabel(self.centralwidget)
+        self.LB_Focus.setFixedSize(192, 192)
+        self.LB_Focus.setAlignment(Qt.AlignCenter)
+        self.LB_Focus.setToolTip("Selected joint. Ctrl+click on the X-ray to place it (3 joints fix the registration)")
+        self.verticalLayout_3.addWidget(self.LB_Focus, 0, Qt.AlignHCenter)
+        self.svg_widget.jointSelected.connect(self._focus_joint)
+        self.action_Whole_Image = QtWidgets.QAction("Whole image", self)
+        self.action_Whole_Image.setShortcut(QtGui.QKeySequence("Ctrl+0"))
+        self.toolBar.addAction(self.action_Whole_Image)
+        self.action_Whole_Image.triggered.connect(self._reset_focus)
+
+        # ================== 图像增强 ==================
+        # CLAHE / 反锐化 / gamma / 反相（见 enhance.py）：后台计算并按 (文件, 参数) 缓存，再次切换立即生效
+        self.enhancement = None
+        self.menu_Enhance = QtWidgets.QMenu("Enhance", self)
+        self.action_CLAHE = self.menu_Enhance.addAction("CLAHE")
+        self.action_CLAHE.setShortcut(QtGui.QKeySequence("Ctrl+E"))
+        self.action_Unsharp = self.menu_Enhance.addAction("Unsharp mask")
+        self.action_Unsharp.setShortcut(QtGui.QKeySequence("Ctrl+U"))
+        self.action_Invert = self.menu_Enhance.addAction("Invert")
+        self.action_Invert.setShortcut(QtGui.QKeySequence("Ctrl+I"))
+        for action in (self.action_CLAHE, self.action_Unsharp, self.action_Invert):
+            action.setCheckable(True)
+        menu_gamma = self.menu_Enhance.addMenu("Gamma")
+        self.group_gamma = QtWidgets.QActionGroup(self)
+        for gamma in (0.5, 0.7, 1.0, 1.5, 2.0):
+            action = menu_gamma.addAction(f"{gamma:g}")
+            action.setCheckable(True)
+            action.setChecked(gamma == 1.0)
+            action.setData(gamma)
+            self.group_gamma.addAction(action)
+        self.action_Enhance = self.menu_Enhance.menuAction()
+        self.toolBar.addAction(self.action_Enhance)
+        # 工具栏上的菜单按钮：点击即弹出
+        self.toolBar.widgetForAction(self.action_Enhance).setPopupMode(QtWidgets.QToolButton.InstantPopup)
+        self.addActions(self.menu_Enhance.actions())
+        for action in (self.action_CLAHE, self.action_Unsharp, self.action_Invert):
+            action.toggled.connect(self._set_enhancement)
+        self.group_gamma.triggered.connect(self._set_enhancement)
+
+        # ================== 多次随访对比 ==================
+        # 同一病人各次随访并排显示，相机联动，叠加往次评分（见 comparison.py）
+        self.comparison = None
+        self.action_Compare_Visits = QtWidgets.QAction("Compare visits", self)
+        self.action_Compare_Visits.setShortcut(QtGui.QKeySequence("Ctrl+T"))
+        self.toolBar.addAction(self.action_Compare_Visits)
+        self.action_Compare_Visits.triggered.connect(self._compare_visits)
+
         for rb in (self.RB_JSN, self.RB_BE, self.RB_L, self.RB_R):
             rb.setAutoExclusive(False)
 
@@ -587,9 +756,13 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
         self.RB_L.toggled.connect(
             lambda checked: checked and self.svg_widget.set_LorR_mode("L")
         )
+        self.RB_L.toggled.connect(lambda checked: checked and self._refocus())
+        self.RB_L.toggled.connect(lambda checked: checked and self._refresh_comparison())
         self.RB_R.toggled.connect(
             lambda checked: checked and self.svg_widget.set_LorR_mode("R")
         )
+        self.RB_R.toggled.connect(lambda checked: checked and self._refocus())
+        self.RB_R.toggled.connect(lambda checked: checked and self._refresh_comparison())
 
         # ================== 菜单槽函数 ==================
         self.action_Input.triggered.connect(self._action_input)
@@ -604,6 +777,9 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
         self.PB_All_Pos.clicked.connect(self._set_all_pos)
         self.PB_Set.clicked.connect(self._set_score_from_order)
 
+        self.LB_Validation = QtWidgets.QLabel(self.centralwidget)
+        self.horizontalLayout.insertWidget(self.horizontalLayout.indexOf(self.PB_Reviewed), self.LB_Validation)
+
         self.PB_Reviewed.clicked.connect(self.set_reviewed)
         self.LB_Reviewed.setStyleSheet("color: gray; font-weight: normal;")
         self.current_reviewed = False
@@ -628,6 +804,434 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
 
         self.set_enable(False)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.xray_viewer is None:
+            # 让窗口先完成绘制，再在事件循环里初始化 VTK
+            QtCore.QTimer.singleShot(0, self._init_viewer)
+
+    def _init_viewer(self):
+        """
+        延迟创建 VTK viewer（重复调用无副作用）
+        """
+        if self.xray_viewer is not None:
+            return self.xray_viewer
+
+        from viewer import XRayVTKViewer
+
+        self.xray_viewer = XRayVTKViewer(self.GL_Xray)
+        self.xray_layout.addWidget(self.xray_viewer)
+        self.xray_viewer.imageClicked.connect(self._place_landmark)
+        self.xray_viewer.set_enhancement(self.enhancement)
+        return self.xray_viewer
+
+    # ====================================================
+    #  关节放大视图
+    # ====================================================
+    def _get_joint_focus(self):
+        if self.joint_focus is None:
+            from joint_focus import JointFocus
+
+            self.joint_focus = JointFocus(JSN_POINT, BE_POINT,
+                                          (self.svg_widget.svg_w, self.svg_widget.svg_h))
+        return self.joint_focus
+
+    def _focus_joint(self, mode, name):
+        if not self.file_paths or self.current_path is None:
+            return
+        crops = self._get_joint_focus().crops(self.current_path, self.svg_widget.LorR_mode)
+        crop = crops.get((mode, name))
+        if crop is None:
+            return
+        self.focused_joint = (mode, name)
+        image = crop.image
+        qimage = QtGui.QImage(image.data, image.shape[1], image.shape[0], image.strides[0],
+                              QtGui.QImage.Format_Grayscale8)
+        self.LB_Focus.setPixmap(QPixmap.fromImage(qimage.copy()))
+        if self.xray_viewer is not None:
+            self.xray_viewer.focus_on(crop.center[0], crop.center[1], crop.radius)
+
+    def _refocus(self):
+        if self.focused_joint is not None:
+            self._focus_joint(*self.focused_joint)
+
+    def _reset_focus(self):
+        self.focused_joint = None
+        self.LB_Focus.clear()
+        if self.xray_viewer is not None:
+            self.xray_viewer.reset_view()
+
+    def _prefetch_focus(self):
+        """
+        用过关节放大视图之后，后台为接下来几个 case 准备裁剪图
+        """
+        if self.joint_focus is None or self.current_path is None:
+            return
+        # current_case 走导航索引，O(1)
+        row = self.current_case
+        self.joint_focus.prefetch(self.file_paths[row + 1:row + 4], self.svg_widget.LorR_mode)
+
+    def _place_landmark(self, row, col):
+        """
+        Ctrl + 点击：把当前选中的关节标在原图 (row, col)
+        """
+        if self.focused_joint is None or self.current_path is None:
+            self.statusbar.showMessage("Select a joint first, then Ctrl+click its position on the X-ray")
+            return
+        focus = self._get_joint_focus()
+        side = self.svg_widget.LorR_mode
+        key = (self.current_path, side)
+        points = self.landmark_points.setdefault(
+            key, dict(focus.landmarks.get((os.path.abspath(self.current_path), side), {})))
+        points[self.focused_joint] = (row, col)
+        if len(points) < 3:
+            self.statusbar.showMessage(f"Landmark {len(points)}/3 placed: {' '.join(self.focused_joint)}")
+            return
+        focus.set_landmarks(self.current_path, side, points)
+        self.statusbar.showMessage(f"Registration updated from {len(points)} landmarks")
+        self._refocus()
+
+    # ====================================================
+    #  多次随访对比
+    # ====================================================
+    def _compare_visits(self):
+        if self.current_path is None:
+            return
+        paths = self.navigation.timepoints(self.current_path)
+        if len(paths) < 2:
+            self.statusbar.showMessage("No other visits for this patient")
+            return
+        self._write_scorer()
+        if self.comparison is None:
+            from comparison import ComparisonViewer
+
+            self.comparison = ComparisonViewer(self)
+            self.comparison.set_enhancement(self.enhancement)
+        shown = self.comparison.show_cases(self.scorer, paths, self.current_path, self.svg_widget.LorR_mode)
+        self.comparison.show()
+        self.comparison.raise_()
+        self.statusbar.showMessage(f"Comparing {len(shown)} of {len(paths)} visits")
+
+    def _set_enhancement(self, *_):
+        from enhance import ENHANCE_CACHE, EnhanceParams, describe, is_active
+
+        params = EnhanceParams(
+            clahe=self.action_CLAHE.isChecked(),
+            unsharp=1.0 if self.action_Unsharp.isChecked() else 0.0,
+            gamma=self.group_gamma.checkedAction().data(),
+            invert=self.action_Invert.isChecked(),
+        )
+        self.enhancement = params if is_active(params) else None
+        ENHANCE_CACHE.cancel(keep=self.enhancement)
+        if self.xray_viewer is not None:
+            self.xray_viewer.set_enhancement(self.enhancement)
+        if self.comparison is not None:
+            self.comparison.set_enhancement(self.enhancement)
+        self._prefetch_enhancement()
+        self.statusbar.showMessage(f"Enhancement: {describe(self.enhancement)}")
+
+    def _prefetch_enhancement(self):
+        """
+        增强打开时，后台依次准备接下来几个 case 的增强结果
+        """
+        if self.enhancement is None or self.current_path is None:
+            return
+        from enhance import ENHANCE_CACHE
+
+        row = self.current_case
+        for path in self.file_paths[row + 1:row + 3]:
+            ENHANCE_CACHE.submit(path, self.enhancement)
+
+    def _refresh_comparison(self):
+        """
+        对比窗口打开时跟随当前 case / 左右手
+        """
+        if self.comparison is None or not self.comparison.isVisible() or self.current_path is None:
+            return
+        paths = self.navigation.timepoints(self.current_path)
+        if len(paths) < 2:
+            self.comparison.hide()
+            return
+        self.comparison.show_cases(self.scorer, paths, self.current_path, self.svg_widget.LorR_mode)
+
+    # ====================================================
+    #  当前 case：以路径为准，file_paths 重排后行号跟着变
+    # ====================================================
+    @property
+    def current_case(self):
+        row = self.navigation.row_of(self.current_path)
+        if row is None or row >= len(self.file_paths) or self.file_paths[row] != self.current_path:
+            # file_paths 被直接替换、索引还没有重建
+            try:
+                row = self.file_paths.index(self.current_path)
+            except ValueError:
+                row = 0
+        return row
+
+    @current_case.setter
+    def current_case(self, row):
+        self.current_path = self.file_paths[row] if 0 <= row < len(self.file_paths) else None
+
+    def _set_file_list(self, paths, labels=None):
+        """
+        替换工作列表：文件列表、缩略图与导航索引一起更新
+        """
+        self.action_Watch_Folder.setChecked(False)
+        self.file_paths = list(paths)
+        self.navigation.detach()
+        self.navigation = CaseIndex(self.file_paths, self.scorer)
+        if self.validator is None:
+            from validation import Validator
+
+            self.validator = Validator()
+            self.validator.subscribe(self._on_case_status)
+        self.validator.attach(self.scorer)
+
+        self.LW_Files.clear()
+        self.LW_Thumbs.clear()
+        labels = list(labels) if labels is not None else self.file_paths
+        self.LW_Files.addItems(labels)
+        self.LW_Thumbs.addItems(labels)
+        for path, flags in self.validator.case_flags.items():
+            self._on_case_status(path, flags)
+        self.duplicate_of = {}
+        if self.file_paths:
+            self._start_thumbnails()
+            self._start_predictions()
+            self._start_identity()
+
+    def _append_files(self, paths):
+        """
+        在工作列表末尾追加 case：已有行号、当前 case 与已提交的后台任务都不变
+        """
+        first = not self.file_paths
+        rows = self.navigation.append(paths)
+        paths = [self.navigation.paths[row] for row in rows]
+        if not paths:
+            return
+        self.file_paths.extend(paths)
+        labels = [os.path.basename(path) for path in paths]
+        self.LW_Files.addItems(labels)
+        self.LW_Thumbs.addItems(labels)
+        for path in paths:
+            flags = self.validator.case_flags.get(path) if self.validator is not None else None
+            if flags is not None:
+                self._on_case_status(path, flags)
+
+        if self.thumbnails is None:
+            self._start_thumbnails()
+        else:
+            self.thumb_rows.update(zip(paths, rows))
+            self.thumbnails.extend(paths)
+            self.thumb_timer.start()
+        if self.predictions is None:
+            self._start_predictions()
+        else:
+            self.predictions.extend(paths)
+            self.predict_timer.start()
+        if self.identity is None:
+            self._start_identity()
+        else:
+            self.identity.extend(paths)
+            self.identity_timer.start()
+
+        if first:
+            self.current_case = 0
+            self.LW_Files.setCurrentRow(0)
+            self.set_enable(True)
+
+    def _on_case_status(self, path, flags):
+        """
+        校验状态变化：文件列表里非法分数标红、已审阅但不完整标橙，当前 case 同步刷新提示
+        """
+        from validation import INVALID, REVIEWED_INCOMPLETE
+
+        row = self.navigation.row_of(path)
+        if row is not None and row < self.LW_Files.count():
+            if flags & INVALID:
+                color = QColor("red")
+            elif flags & REVIEWED_INCOMPLETE:
+                color = QColor("darkorange")
+            else:
+                color = self.LW_Files.palette().color(QtGui.QPalette.Text)
+            self.LW_Files.item(row).setForeground(color)
+        if path == self.current_path:
+            self._update_validation_label()
+
+    def _update_validation_label(self):
+        if self.validator is None or self.current_path is None:
+            self.LB_Validation.clear()
+            return
+        text = self.validator.describe(self.current_path)
+        self.LB_Validation.setText(text)
+        self.LB_Validation.setToolTip(text)
+        color = "green" if text == "Complete" else "darkorange"
+        self.LB_Validation.setStyleSheet(f"color: {color};")
+
+    def _search_case(self):
+        text = self.LE_Search.text()
+        rows = self.navigation.search(text)
+        if not rows:
+            self.statusbar.showMessage(f"Search '{text}': no match")
+            return
+        # 反复回车依次跳到下一个匹配
+        current = self.current_case
+        target = next((row for row in rows if row > current), rows[0])
+        self.LW_Files.setCurrentRow(target)
+        self.statusbar.showMessage(
+            f"Search '{text}': match {rows.index(target) + 1}/{len(rows)}"
+            + ("+" if len(rows) >= 100 else "")
+        )
+
+    def _jump_next(self, status, value, label):
+        if not self.file_paths:
+            return
+        # 界面上的评分在切换 case 时才写回 scorer，先写回再查询
+        self._write_scorer()
+        row = self.navigation.next_row(status, self.current_case, value)
+        if row < 0:
+            self.statusbar.showMessage(f"No case {label}")
+            return
+        self.LW_Files.setCurrentRow(row)
+        self.statusbar.showMessage(
+            f"Next {label}: {self.LW_Files.item(row).text()}  "
+            f"(reviewed {self.navigation.count(REVIEWED_BIT)}, complete {self.navigation.count(COMPLETE_BIT)}"
+            f" / {len(self.file_paths)})"
+        )
+
+    def _ordered(self, paths):
+        from scheduler import order_cases
+
+        reviewed = {path for path in paths if self.scorer.has_case(path) and self.scorer.get_reviewed(path)}
+        # random：每个阅片者一个固定的顺序
+        seed = zlib.crc32(self.reader.encode("utf-8"))
+        return order_cases(paths, self.CB_Order.currentText(), reviewed, seed)
+
+    def _reorder_cases(self, strategy):
+        """
+        按 strategy 重排工作列表，当前 case 不变
+        """
+        if not self.file_paths:
+            return
+        self._write_scorer()
+        self._permute_file_list(self._ordered(self.file_paths))
+        self.statusbar.showMessage(f"Worklist ordered by {strategy}")
+
+    def _permute_file_list(self, ordered):
+        """
+        只调整工作列表的顺序：列表项（图标、字体、提示）整体搬动，缩略图行号与导航索引跟着更新；
+        缩略图 / 预评分 / 内容摘要等后台任务与文件夹监视都不重启，当前 case 不变
+        """
+        old_row = {path: row for row, path in enumerate(self.file_paths)}
+        for widget in (self.LW_Files, self.LW_Thumbs):
+            widget.blockSignals(True)
+            # 从末尾取出，避免每次 takeItem 都移动后面的行
+            items = [widget.takeItem(row) for row in range(widget.count() - 1, -1, -1)][::-1]
+            for path in ordered:
+                widget.addItem(items[old_row[path]])
+        self.file_paths = list(ordered)
+        self.thumb_rows = {path: row for row, path in enumerate(self.file_paths) if path in self.thumb_rows}
+        self.navigation.detach()
+        self.navigation = CaseIndex(self.file_paths, self.scorer)
+        row = self.current_case
+        self.LW_Files.setCurrentRow(row)
+        self.LW_Thumbs.setCurrentRow(row)
+        for widget in (self.LW_Files, self.LW_Thumbs):
+            widget.blockSignals(False)
+
+    def _undo(self):
+        self._step_history(self.history.undo, "Undo")
+
+    def _redo(self):
+        self._step_history(self.history.redo, "Redo")
+
+    def _step_history(self, apply, label):
+        if not self.file_paths:
+            return
+        # 界面上未写回的修改先记成一步
+        self._write_scorer()
+        step = apply(self.current_path)
+        if step is None:
+            self.statusbar.showMessage(f"Nothing to {label.lower()}")
+            return
+        self._load_scorer()
+        self.update_reviewed()
+        self.statusbar.showMessage(f"{label}: {step.label} ({len(step.deltas)} joints)")
+
+    def closeEvent(self, event):
+        if self.thumbnails is not None:
+            self.thumbnails.shutdown()
+        if self.predictions is not None:
+            self.predictions.shutdown()
+        if self.joint_focus is not None:
+            self.joint_focus.shutdown()
+        if self.comparison is not None:
+            self.comparison.close()
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        if self.identity is not None:
+            self.identity.shutdown()
+        if self.enhancement is not None:
+            from enhance import ENHANCE_CACHE
+
+            ENHANCE_CACHE.shutdown()
+        self.telemetry.leave()
+        self.audit.close()
+        super().closeEvent(event)
+
+    _ACTIVITY_EVENTS = (QtCore.QEvent.KeyPress, QtCore.QEvent.MouseButtonPress, QtCore.QEvent.Wheel)
+
+    def eventFilter(self, obj, event):
+        # 键盘 / 鼠标操作用于判断阅片者是否离开（空闲时间不计入有效时长）
+        if event.type() in self._ACTIVITY_EVENTS:
+            self.telemetry.touch()
+        return super().eventFilter(obj, event)
+
+    def _show_throughput(self):
+        if self.audit.db is None:
+            self.statusbar.showMessage("Save the session first to collect throughput statistics")
+            return
+        lines = self.telemetry.format_report(limit=5)
+        if self.prefetcher is not None:
+            lines.append(self.prefetcher.format_report())
+        QtWidgets.QMessageBox.information(self, "Throughput", "\n".join(lines) or "No data yet")
+
+    def _update_profile_label(self):
+        lines = PROFILER.format_summary()
+        self.profile_label.setText("  |  ".join(lines[:2]))
+        self.profile_label.setToolTip("\n".join(lines))
+
+    def _start_thumbnails(self):
+        from thumbnails import ThumbnailGenerator
+
+        if self.thumbnails is None:
+            self.thumbnails = ThumbnailGenerator()
+        self.thumb_rows = {path: row for row, path in enumerate(self.file_paths)}
+        self.thumbnails.start(self.file_paths)
+        self.thumb_timer.start()
+
+    def _poll_thumbnails(self):
+        """
+        每次最多占用 15 ms 把已生成的缩略图转成图标
+        """
+        for path, thumb in self.thumbnails.poll(budget=0.015):
+            row = self.thumb_rows.get(path)
+            if row is None or thumb is None:
+                continue
+            rows, cols = thumb.shape[:2]
+            fmt = {2: QtGui.QImage.Format_Grayscale8, 3: QtGui.QImage.Format_RGB888}.get(
+                thumb.ndim if thumb.ndim == 2 else thumb.shape[2], QtGui.QImage.Format_RGBA8888)
+            image = QtGui.QImage(thumb.data, cols, rows, thumb.strides[0], fmt)
+            # QImage 不持有 numpy 内存，copy() 之后再交给 QPixmap
+            self.LW_Thumbs.item(row).setIcon(QtGui.QIcon(QtGui.QPixmap.fromImage(image.copy())))
+
+        if self.thumbnails.done:
+            self.thumb_timer.stop()
+            stats = self.thumbnails.stats
+            self.statusbar.showMessage(
+                f"Thumbnails: {stats['loaded']}/{stats['requested']} ready, {stats['failed']} failed"
+            )
+
     def set_enable(self, state=False):
         self.LW_Score_Order_new.setEnabled(state)
         self.PB_All_Pos.setEnabled(state)
@@ -646,7 +1250,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
 
     def update_reviewed(self):
         current_path = self.file_paths[self.current_case]
-        reviewed_state = self.scorer.get_reviewed(current_path)
+        # 刚切换到、还没写回过的 case 在 Scorer 里没有记录
+        reviewed_state = self.scorer.has_case(current_path) and self.scorer.get_reviewed(current_path)
 
         if reviewed_state:
             # 红色 + 加粗
@@ -655,11 +1260,16 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
             # 灰色 + 不加粗
             self.LB_Reviewed.setStyleSheet("color: gray; font-weight: normal;")
 
+        self._update_validation_label()
+
 
     def set_reviewed(self):
         current_path = self.file_paths[self.current_case]
+        if not self.scorer.has_case(current_path):
+            self._write_scorer()
         reviewed_state = self.scorer.get_reviewed(current_path)
-        self.scorer.set_reviewed(current_path, state=not reviewed_state)
+        with self.history.action("Reviewed"):
+            self.scorer.set_reviewed(current_path, state=not reviewed_state)
 
         self.update_reviewed()
 
@@ -667,6 +1277,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
 
     def _set_score_from_order(self):
         current_path = self.file_paths[self.current_case]
+        # 先把界面上未写回的修改记成单独一步，撤销时不会连带丢失
+        self._write_scorer()
         content = self.PTE_Load.toPlainText()
         score_mode = self._current_score_mode()
         LorR_mode = self._current_LorR_mode()
@@ -676,11 +1288,20 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
         content = list(content)
         for idx, key in enumerate(self.order_list[score_mode]):
             if (idx + 1) <= len(content):
-                tmp_dict[key] = content[idx]
+                # isdecimal：'²' 之类的 Unicode 数字 isdigit() 为真但 int() 会失败，留给下面的量表检查拒绝
+                tmp_dict[key] = int(content[idx]) if content[idx].isdecimal() else content[idx]
             else:
-                tmp_dict[key] = '0'
+                tmp_dict[key] = 0
 
-        print(tmp_dict)
+        # 超出量表的值在下拉框里无法显示，写回时会变成空值：整体拒绝，保留输入以便修改
+        scale = SCORE_SCALES[score_mode]
+        invalid = [f"{key}={value}" for key, value in tmp_dict.items() if value not in scale]
+        if invalid:
+            self.statusbar.showMessage(
+                f"Not applied: {score_mode} scores must be one of {', '.join(map(str, scale))} "
+                f"({', '.join(invalid)})"
+            )
+            return
 
         JSN_L, BE_L = self.scorer.get_info(case_path=current_path, LorR='L')
         JSN_R, BE_R = self.scorer.get_info(case_path=current_path, LorR='R')
@@ -692,10 +1313,11 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
         dict_tmp = {'JSN': {'L': mapping['JSN_L'], 'R': mapping['JSN_R']},
                     'BE': {'L': mapping['BE_L'], 'R': mapping['BE_R']}}
 
-        self.scorer.update_info(case_path=current_path, LorR='L', JSN_dict=dict_tmp['JSN']['L'],
-                                BE_dict=dict_tmp['BE']['L'])
-        self.scorer.update_info(case_path=current_path, LorR='R', JSN_dict=dict_tmp['JSN']['R'],
-                                BE_dict=dict_tmp['BE']['R'])
+        with self.history.action("Set from order"):
+            self.scorer.update_many(
+                (current_path, LorR, dict_tmp['JSN'][LorR], dict_tmp['BE'][LorR])
+                for LorR in ('L', 'R')
+            )
 
         self._load_scorer()
 
@@ -743,8 +1365,14 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
 
         try:
             self.scorer.save_to_json(path)
+            self.history.save(history_path(path))
+            self.audit.open(audit_path(path))
+            self.audit.flush()
+            self.telemetry.flush()
+            self.save_path = path
+            count = self._sync_session(path)
             self.statusbar.showMessage(
-                f"JSON file saved to {path}"
+                f"JSON file saved to {path} ({count} changes by {self.reader})"
             )
         except Exception as e:
             QtWidgets.QMessageBox.warning(
@@ -768,50 +1396,47 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
         return None
 
     def _set_all_pos(self):
+        self._write_scorer()
         score_type = self._current_score_mode()
         side = self._current_LorR_mode()
-        state_tmp = self.svg_widget.get_score_state()
-        for key in state_tmp[score_type][side]:
-            state_tmp[score_type][side][key] = 0
-
-        self.svg_widget.set_score_state(state_tmp)
+        self.svg_widget.set_side_scores(score_type, side, 0)
+        # 立即写回 scorer，作为可撤销的一步
+        with self.history.action("All positive"):
+            self._write_scorer()
 
     def _set_all_neg(self):
+        self._write_scorer()
         score_type = self._current_score_mode()
         if score_type == 'JSN':
             value = 4
         else:
             value = 5
         side = self._current_LorR_mode()
-        state_tmp = self.svg_widget.get_score_state()
-        for key in state_tmp[score_type][side]:
-            state_tmp[score_type][side][key] = value
-
-        self.svg_widget.set_score_state(state_tmp)
+        self.svg_widget.set_side_scores(score_type, side, value)
+        # 立即写回 scorer，作为可撤销的一步
+        with self.history.action("All negative"):
+            self._write_scorer()
 
+    @profiled("main.write_scorer")
     def _write_scorer(self):
         current_path = self.file_paths[self.current_case]
-        repo_file_list = self.scorer.get_file_list()
-        if (repo_file_list == None) or (current_path not in repo_file_list):
-            self.scorer.new_info(case_path=current_path,
-                                 case_id=f'{os.path.basename(current_path)[:-4]}',
-                                 case_name=f'{os.path.basename(current_path)[:-4]}',
-                                 LorR='L'
-                                 )
-            self.scorer.new_info(case_path=current_path,
-                                 case_id=f'{os.path.basename(current_path)[:-4]}',
-                                 case_name=f'{os.path.basename(current_path)[:-4]}',
-                                 LorR='R'
-                                 )
+        if not self.scorer.has_case(current_path):
+            case_id = os.path.splitext(os.path.basename(current_path))[0]
+            self.scorer.new_cases(
+                (current_path, case_id, case_id, LorR) for LorR in ('L', 'R')
+            )
         else:
             state_tmp = self.svg_widget.get_score_state()
 
-            self.scorer.update_info(case_path=current_path, LorR='L', JSN_dict=state_tmp['JSN']['L'],
-                               BE_dict=state_tmp['BE']['L'])
-            self.scorer.update_info(case_path=current_path, LorR='R', JSN_dict=state_tmp['JSN']['R'],
-                               BE_dict=state_tmp['BE']['R'])
+            # 在外层 action 里时并入外层那一步
+            with self.history.action("Edit"):
+                self.scorer.update_many(
+                    (current_path, LorR, state_tmp['JSN'][LorR], state_tmp['BE'][LorR])
+                    for LorR in ('L', 'R')
+                )
 
 
+    @profiled("main.load_scorer")
     def _load_scorer(self):
         current_path = self.file_paths[self.current_case]
 
@@ -822,12 +1447,64 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
                     'BE': {'L': BE_L, 'R': BE_R}}
 
         self.svg_widget.set_score_state(dict_tmp)
+        self._show_proposed()
+
+    def _show_proposed(self):
+        current_path = self.file_paths[self.current_case]
+        state = {'JSN': {}, 'BE': {}}
+        for LorR in ('L', 'R'):
+            proposal = self.scorer.get_proposed(current_path, LorR)
+            if proposal is not None:
+                state['JSN'][LorR], state['BE'][LorR], _ = proposal
+        self.svg_widget.set_proposed_state(state)
+
+    # ====================================================
+    #  模型预评分
+    # ====================================================
+    def _start_predictions(self):
+        if not os.environ.get("RASCORER_PREDICTOR"):
+            return
+        from prediction import PredictionRunner
+
+        if self.predictions is None:
+            self.predictions = PredictionRunner()
+        # 已有建议的 case（例如从会话 JSON 恢复的）不再推理
+        done = {path for path, _ in self.scorer.proposed}
+        self.predictions.start(self.file_paths, first=max(self.current_case, 0), skip=done)
+        self.predict_timer.start()
+
+    def _poll_predictions(self):
+        from prediction import apply_predictions
+
+        results = self.predictions.poll()
+        apply_predictions(self.scorer, results, self.predictions.model)
+        if self.file_paths and any(path == self.current_path for path, _ in results):
+            self._show_proposed()
+        if self.predictions.done:
+            self.predict_timer.stop()
+            stats = self.predictions.stats
+            self.statusbar.showMessage(
+                f"Proposed scores ready: {stats['predicted']} predicted, {stats['cached']} cached, "
+                f"{stats['failed']} failed ({self.predictions.model})"
+            )
+
+    def _accept_proposed(self):
+        """
+        把当前 case 的建议分数填入还没打分的关节
+        """
+        if not self.file_paths:
+            return
+        self._write_scorer()
+        with self.history.action("Accept proposed"):
+            filled = self.scorer.accept_proposed(self.current_path)
+        self._load_scorer()
+        self.statusbar.showMessage(f"Accepted {filled} proposed scores" if filled else "No proposed scores to accept")
 
     def _action_input(self):
         """
         修改版：
         - 打开文件夹对话框
-        - 扫描文件夹中的 .dcm / .bmp
+        - 扫描文件夹中 image_io.REGISTRY 支持的图像（无扩展名的文件按 magic bytes 判断）
         - 文件名显示到 LW_Files
         - 默认显示第一个文件
         """
@@ -838,29 +1515,30 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
         )
         if not dir_path:
             return
+        watching = self.action_Watch_Folder.isChecked()
 
         # 扫描文件夹
-        exts = (".dcm", ".bmp")
+        from image_io import REGISTRY   # 延迟导入，numpy 不进入启动路径
+
         files = [
             f for f in sorted(os.listdir(dir_path))
-            if f.lower().endswith(exts)
+            if os.path.isfile(os.path.join(dir_path, f))
+            and REGISTRY.is_supported(os.path.join(dir_path, f))
         ]
 
-        self.LW_Files.clear()
-        self.file_paths = []
-
         if not files:
-            self.statusbar.showMessage("Not found .dcm or .bmp files")
+            self._set_file_list([])
+            self.statusbar.showMessage("No supported image files (" + " ".join(REGISTRY.extensions()) + ")")
             return
 
-        for fname in files:
-            self.LW_Files.addItem(fname)
-            self.file_paths.append(os.path.join(dir_path, fname))
+        paths = self._ordered([os.path.join(dir_path, fname) for fname in files])
+        self._set_file_list(paths, [os.path.basename(path) for path in paths])
 
         self.current_dir = dir_path
         self.statusbar.showMessage(
             f"Loaded folder: {dir_path}  ({len(self.file_paths)} files)"
         )
+        self.action_Watch_Folder.setChecked(watching)
 
         # 选中第一个文件（会自动触发 on_file_changed）
         self.current_case = 0
@@ -870,6 +1548,121 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
 
 
 
+    # ====================================================
+    #  监视文件夹
+    # ====================================================
+    def _toggle_watch(self, checked):
+        if not checked:
+            self.watch_timer.stop()
+            self.watcher = None
+            return
+        if not self.current_dir:
+            self.statusbar.showMessage("Open a folder first, then turn on Watch folder")
+            self.action_Watch_Folder.setChecked(False)
+            return
+        from watcher import FolderWatcher
+
+        self.watcher = FolderWatcher(self.current_dir, known=self.file_paths)
+        self.watcher.poll()
+        self.watch_timer.start()
+        self.statusbar.showMessage(f"Watching {self.current_dir} for new images")
+
+    def _poll_watch(self):
+        paths = self.watcher.poll()
+        if not paths:
+            return
+        self._append_files(paths)
+        self.statusbar.showMessage(f"{len(paths)} new case(s) from {self.current_dir}  ({len(self.file_paths)} total)")
+
+    # ====================================================
+    #  内容身份：重复检测与重新绑定
+    # ====================================================
+    def _start_identity(self):
+        from identity import IdentityScanner
+
+        if self.identity is None:
+            self.identity = IdentityScanner()
+        self.identity.start(self.file_paths)
+        self.identity_timer.start()
+
+    def _poll_identity(self):
+        found = self.identity.poll()
+        if found:
+            self.scorer.content.update((path, digest) for path, digest in found.items() if digest)
+            self._mark_duplicates()
+        if self.identity.done:
+            self.identity_timer.stop()
+
+    def _mark_duplicates(self):
+        """
+        像素相同的片子：除第一张外在文件列表里以斜体显示，提示与哪一张相同
+        """
+        from identity import duplicate_groups
+
+        digests = self.identity.digests
+        groups = duplicate_groups({path: digests.get(path) for path in self.file_paths})
+        duplicate_of = {path: group[0] for group in groups for path in group[1:]}
+        for path in set(self.duplicate_of) | set(duplicate_of):
+            row = self.navigation.row_of(path)
+            if row is None or row >= self.LW_Files.count():
+                continue
+            item = self.LW_Files.item(row)
+            font = item.font()
+            font.setItalic(path in duplicate_of)
+            item.setFont(font)
+            item.setToolTip(f"Same image as {duplicate_of[path]}" if path in duplicate_of else "")
+        if len(duplicate_of) > len(self.duplicate_of):
+            self.statusbar.showMessage(f"{len(duplicate_of)} duplicate image(s) in the worklist (shown in italics)")
+        self.duplicate_of = duplicate_of
+
+    def _relocate_cases(self):
+        """
+        会话里找不到文件的 case：在选定的文件夹（含子文件夹）里按像素内容找到新位置并改写路径
+        """
+        case_paths = self.scorer.get_file_list() or []
+        missing = [path for path in case_paths if not os.path.exists(path)]
+        if not missing:
+            self.statusbar.showMessage("All case files found")
+            return
+        dir_path = QtWidgets.QFileDialog.getExistingDirectory(self, f"Find {len(missing)} moved case(s) in", "")
+        if not dir_path:
+            return
+        from identity import ContentIndex, rebind
+        from image_io import REGISTRY
+
+        candidates = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(dir_path) for name in sorted(names)
+            if REGISTRY.is_supported(os.path.join(root, name))
+        ]
+
+        def progress(done, total):
+            self.statusbar.showMessage(f"Hashing images: {done}/{total}")
+            QtWidgets.QApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
+
+        if self.file_paths:
+            self._write_scorer()
+        index = ContentIndex()
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            mapping = rebind(self.scorer, candidates, index, progress)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+            index.close()
+        if mapping:
+            # 共享会话的 baseline 与合并视图按同一映射改路径，否则旧路径会被当成新 case 重建并在提交时发出空值
+            if self.reader_session is not None:
+                self.reader_session.relocate(mapping)
+            if self.session_view is not None:
+                self.session_view.relocate(mapping)
+            self.session_deferred = {(mapping.get(key[0], key[0]),) + key[1:] for key in self.session_deferred}
+            current = mapping.get(self.current_path, self.current_path)
+            self._set_file_list([mapping.get(path, path) for path in self.file_paths])
+            self.current_path = current
+            self.LW_Files.setCurrentRow(self.current_case)
+        self.statusbar.showMessage(f"Relocated {len(mapping)} of {len(missing)} missing case(s)")
+
+    @profiled("main.file_changed")
     def _file_changed(self, row: int):
 
         """
@@ -879,11 +1672,19 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
             return
 
         file_path = self.file_paths[row]
-        ok = self.xray_viewer.update_image(file_path)
+        self.LW_Thumbs.blockSignals(True)
+        self.LW_Thumbs.setCurrentRow(row)
+        self.LW_Thumbs.blockSignals(False)
+        if self.prefetcher is None:
+            from scheduler import Prefetcher
+
+            self.prefetcher = Prefetcher()
+        self.prefetcher.acquire(file_path)
+        ok = self._init_viewer().update_image(file_path)
         old_idx = self.current_case
 
         new_idx = row
-        if old_idx != new_idx or self.scorer.get_file_list() == None:
+        if old_idx != new_idx or len(self.scorer.score_repo) == 0:
             self._write_scorer()
             self.current_case = row
 
@@ -892,11 +1693,23 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
             self.current_case = row
             self._load_scorer()
 
+        if self.session_deferred:
+            # 之前停留时跳过的其他阅片者变更，现在可以合并
+            self._refresh_session()
         self.update_reviewed()
+        self.telemetry.enter(file_path)
+        if ok:
+            self._refocus()
+        self.prefetcher.schedule(self.file_paths[row + 1:row + 1 + self.prefetcher.depth])
+        self._prefetch_focus()
+        self._prefetch_enhancement()
+        self._refresh_comparison()
 
         if ok:
             self.case_path = file_path
-            self.statusbar.showMessage(f"Loaded: {file_path}")
+            duplicate = self.duplicate_of.get(file_path)
+            note = f"  (same image as {os.path.basename(duplicate)})" if duplicate else ""
+            self.statusbar.showMessage(f"Loaded: {file_path}  [{self.xray_viewer.last_reader}]{note}")
         else:
             self.statusbar.showMessage("Failed to load image.")
 
@@ -930,6 +1743,23 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
             except Exception:
                 pass
 
+            if self.validator is not None:
+                summary = self.validator.summary()
+                issues = summary["cases"] - summary["ok"]
+                if issues:
+                    answer = QtWidgets.QMessageBox.question(
+                        self,
+                        "Validation",
+                        f"{issues} of {summary['cases']} cases have problems:\n"
+                        f"missing scores: {summary['missing']}\n"
+                        f"invalid scores: {summary['invalid']}\n"
+                        f"only one side: {summary['one_side']}\n"
+                        f"reviewed but incomplete: {summary['reviewed_incomplete']}\n\n"
+                        "Export anyway?",
+                    )
+                    if answer != QtWidgets.QMessageBox.Yes:
+                        return
+
             self.scorer.output_to_excel(path)
             self.statusbar.showMessage(f"Excel exported to {path}")
         except Exception as e:
@@ -964,22 +1794,92 @@ class MainWindow(QtWidgets.QMainWindow, Ui_RAScorer):
             scorer_open = Scorer()
             scorer_open.load_from_json(path)
             self.scorer = scorer_open
+            self.history.attach(self.scorer)
+            self.history.load(history_path(path))
+            self.telemetry.leave()
+            self.audit.attach(self.scorer)
+            self.telemetry.attach(self.scorer)
+            self.audit.open(audit_path(path))
             self.statusbar.showMessage(f"Load JSON：{path} Success")
 
+            # 合并其他阅片者的变更集
+            conflicts = self._open_session(path)
+
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "错误", f"读取 JSON 失败:\n{e}")
             return
 
         # ========== 2. 恢复左侧当前 case ==========
-        self.file_paths = self.scorer.get_file_list()
-
-        for path in self.file_paths:
-            self.LW_Files.addItem(path)
+        self._set_file_list(self.scorer.get_file_list() or [])
 
         self.current_case = 0
         self.LW_Files.setCurrentRow(0)
 
-        self.statusbar.showMessage("JSON Opened")
+        missing = sum(1 for case_path in self.file_paths if not os.path.exists(case_path))
+        if conflicts:
+            self.statusbar.showMessage(f"JSON Opened ({len(conflicts)} conflicts between readers)")
+        elif missing:
+            self.statusbar.showMessage(f"JSON Opened ({missing} case files not found, use Relocate cases)")
+        else:
+            self.statusbar.showMessage("JSON Opened")
+
+    # ====================================================
+    #  多阅片者会话：变更集写入与增量合并
+    # ====================================================
+    def _open_session(self, path):
+        """
+        打开共享会话：应用所有阅片者的变更集，返回冲突列表
+        """
+        self.reader_session = ReaderSession(path, self.reader)
+        self.session_view = ConsolidatedView(path)
+        self.session_deferred = set()
+        changed = self.session_view.refresh()
+        with self.history.muted(), self.audit.muted():
+            self.session_view.apply_to(self.scorer, changed)
+        self.reader_session.reset_baseline(self.scorer)
+        self.session_timer.start()
+        return self.session_view.conflicts(changed)
+
+    def _sync_session(self, path):
+        """
+        保存时把本阅片者的修改追加到自己的变更集，返回写入的变更数
+        """
+        if self.reader_session is None or self.reader_session.session_path != path:
+            # 首次保存到该会话：之前的所有评分都算作本阅片者的修改
+            self.reader_session = ReaderSession(path, self.reader)
+            self.session_view = ConsolidatedView(path)
+            self.session_deferred = set()
+            self.session_timer.start()
+        return self.reader_session.commit(self.scorer)
+
+    def _refresh_session(self):
+        """
+        定时读取其他阅片者新增的变更（只读增量），界面上正在编辑的 case 先不覆盖：
+        这些单元格记在 session_deferred 里，离开该 case 后再合并
+        """
+        if self.session_view is None:
+            return
+        self.audit.flush()
+        changed = self.session_view.refresh() | self.session_deferred
+        if not changed:
+            return
+
+        current = self.current_path
+        self.session_deferred = {key for key in changed if key[0] == current}
+        changed -= self.session_deferred
+        # 本阅片者尚未提交的修改保留本地值，不覆盖也不并入 baseline，下次保存时照常提交
+        local = self.reader_session.local_edits(self.scorer, changed)
+        with self.history.muted(), self.audit.muted():
+            applied = self.session_view.apply_to(self.scorer, changed, exclude_keys=local)
+        self.reader_session.absorb(applied)
+
+        conflicts = {c.key for c in self.session_view.conflicts(changed)} | local
+        self.statusbar.showMessage(
+            f"Session refreshed: {len(applied)} cells merged, {len(conflicts)} conflicts"
+            + (f" ({len(local)} unsaved local edits kept)" if local else "")
+            + (f" ({len(self.session_deferred)} cells wait until you leave this case)"
+               if self.session_deferred else "")
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+"""
+工作列表导航索引
+
+    index = CaseIndex(file_paths, scorer)   # 订阅 scorer 变更，状态位随评分增量更新
+    index.search("IMAGE007")                # 前缀 / 子串（trigram）检索，返回行号
+    index.search("2011-01-11")              # 日期可以带连字符
+    index.next_row(REVIEWED_BIT, row, False) # row 之后（循环）第一个未审阅的 case
+    index.timepoints(path)                  # 同一病人各次随访的路径，按日期排序
+
+状态位保存在 Python 整数里（第 i 位对应第 i 行）：
+- reviewed：L / R 都已标记 reviewed
+- complete：L / R 两条记录都存在，且所有 JSN / BE 关节都已打分
+- has_be：任一侧有 BE > 0（存在骨侵蚀）
+"""
+import bisect
+import os
+import re
+
+REVIEWED_BIT = 'reviewed'
+COMPLETE_BIT = 'complete'
+HAS_BE_BIT = 'has_be'
+STATUS_BITS = (REVIEWED_BIT, COMPLETE_BIT, HAS_BE_BIT)
+
+_DATE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+
+def split_case_id(case_id):
+    """
+    'IMAGE007_20110111' → ('IMAGE007', '20110111')；没有日期后缀时日期为 ''
+    """
+    head, sep, tail = case_id.rpartition('_')
+    if sep and len(tail) == 8 and tail.isdigit():
+        return head, tail
+    return case_id, ''
+
+
+def _normalize_query(text):
+    return _DATE_RE.sub(r'\1\2\3', text.strip().lower())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _positive(value):
+    # 旧版 JSON 里的分数可能是字符串
+    try:
+        return int(value) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def _lowest_bit(bits):
+    return (bits & -bits).bit_length() - 1
+
+
+class Bitset:
+    __slots__ = ('bits',)
+
+    def __init__(self):
+        self.bits = 0
+
+    def set(self, i, on=True):
+        if on:
+            self.bits |= 1 << i
+        else:
+            self.bits &= ~(1 << i)
+
+    def __contains__(self, i):
+        return bool(self.bits >> i & 1)
+
+    def count(self):
+        return bin(self.bits).count('1')
+
+    def next_index(self, start, size, value=True):
+        """
+        start 之后（不含 start，到末尾后从头继续）第一个取值为 value 的位，没有返回 -1
+        """
+        mask = (1 << size) - 1
+        bits = (self.bits if value else ~self.bits) & mask
+        if not bits:
+            return -1
+        high = bits >> (start + 1)
+        if high:
+            return start + 1 + _lowest_bit(high)
+        return _lowest_bit(bits)
+
+
+class CaseIndex:
+    def __init__(self, paths=(), scorer=None):
+        self.paths = list(paths)
+        self.position = {path: row for row, path in enumerate(self.paths)}
+
+        # 检索键：相对公共目录的路径（小写），单文件夹时就是文件名
+        if len(self.paths) > 1:
+            self._root = os.path.join(os.path.dirname(os.path.commonprefix(self.paths)), "")
+        else:
+            self._root = os.path.join(os.path.dirname(self.paths[0]), "") if self.paths else None
+        self.keys = [self._key(path) for path in self.paths]
+
+        # 前缀检索：按 case id（文件名去扩展名）与病人 id 排序
+        prefixes = []
+        self._patients = {}     # 病人 id → [(date, row)]
+        for row, path in enumerate(self.paths):
+            prefixes.extend(self._add_case(row, path))
+        prefixes.sort()
+        self._prefix_keys = [key for key, _ in prefixes]
+        self._prefix_rows = [row for _, row in prefixes]
+
+        # 子串检索：trigram → 行号列表（升序），第一次子串检索时再建
+        self._trigrams = None
+
+        self.status = {name: Bitset() for name in STATUS_BITS}
+        self.scorer = None
+        if scorer is not None:
+            self.attach(scorer)
+
+    def _key(self, path):
+        if self._root is not None and path.startswith(self._root):
+            return path[len(self._root):].lower()
+        return os.path.basename(path).lower()
+
+    def _add_case(self, row, path):
+        """
+        登记病人随访，返回该行的前缀检索键 [(key, row)]
+        """
+        case_id = os.path.splitext(os.path.basename(path))[0].lower()
+        patient, date = split_case_id(case_id)
+        prefixes = [(case_id, row)]
+        if date:
+            prefixes.append((date, row))
+            self._patients.setdefault(patient, []).append((date, row))
+        return prefixes
+
+    def append(self, paths):
+        """
+        在末尾追加 case（监视文件夹新到的文件），已有行号不变；返回新行号列表
+        """
+        rows = []
+        for path in paths:
+            if path in self.position:
+                continue
+            row = len(self.paths)
+            if self._root is None:
+                self._root = os.path.join(os.path.dirname(path), "")
+            self.paths.append(path)
+            self.position[path] = row
+            key = self._key(path)
+            self.keys.append(key)
+            for prefix in self._add_case(row, path):
+                i = bisect.bisect_right(self._prefix_keys, prefix[0])
+                self._prefix_keys.insert(i, prefix[0])
+                self._prefix_rows.insert(i, row)
+            if self._trigrams is not None:
+                for gram in _trigrams(key):
+                    self._trigrams.setdefault(gram, []).append(row)
+            if self.scorer is not None:
+                self._update_case(path)
+            rows.append(row)
+        return rows
+
+    # ====================================================
+    #  检索
+    # ====================================================
+    def row_of(self, path):
+        return self.position.get(path)
+
+    def search(self, text, limit=100):
+        """
+        返回匹配的行号（升序）。少于 3 个字符按 case id / 日期前缀匹配，否则按子串匹配。
+        """
+        query = _normalize_query(text)
+        if not query:
+            return []
+        if len(query) < 3:
+            return self._prefix_search(query, limit)
+
+        if self._trigrams is None:
+            self._build_trigrams()
+        postings = [self._trigrams.get(gram, ()) for gram in _trigrams(query)]
+        candidates = min(postings, key=len)
+        rows = []
+        for row in candidates:
+            if query in self.keys[row]:
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def _build_trigrams(self):
+        trigrams = {}
+        for row, key in enumerate(self.keys):
+            for gram in _trigrams(key):
+                trigrams.setdefault(gram, []).append(row)
+        self._trigrams = trigrams
+
+    def _prefix_search(self, query, limit):
+        start = bisect.bisect_left(self._prefix_keys, query)
+        rows = set()
+        for i in range(start, len(self._prefix_keys)):
+            if not self._prefix_keys[i].startswith(query) or len(rows) >= limit:
+                break
+            rows.add(self._prefix_rows[i])
+        return sorted(rows)
+
+    def next_row(self, name, row, value=True):
+        """
+        row 之后（循环）第一个状态位 name 为 value 的行号，没有返回 -1
+        """
+        return self.status[name].next_index(row, len(self.paths), value)
+
+    def count(self, name):
+        return self.status[name].count()
+
+    def timepoints(self, path):
+        """
+        与 path 同一病人（文件名中日期前的部分相同）的所有路径，按日期升序；
+        文件名没有日期时只返回 [path]
+        """
+        case_id = os.path.splitext(os.path.basename(path))[0].lower()
+        patient, date = split_case_id(case_id)
+        visits = self._patients.get(patient) if date else None
+        if not visits:
+            return [path]
+        return [self.paths[row] for _, row in sorted(visits)]
+
+    # ====================================================
+    #  状态位（随 Scorer 变更增量维护）
+    # ====================================================
+    def attach(self, scorer):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+        self.scorer = scorer
+        scorer.subscribe(self._on_score_event)
+        self.rebuild_status()
+
+    def detach(self):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+            self.scorer = None
+
+    def rebuild_status(self):
+        for bitset in self.status.values():
+            bitset.bits = 0
+        if self.scorer is None:
+            return
+        for path in self.scorer.get_file_list() or ():
+            self._update_case(path)
+
+    def _on_score_event(self, event):
+        if event.kind == 'reload':
+            self.rebuild_status()
+        else:
+            self._update_case(event.case_path)
+
+    def _update_case(self, path):
+        row = self.position.get(path)
+        if row is None:
+            return
+        records = []
+        for LorR in ('L', 'R'):
+            idx = self.scorer.index_map.get((path, LorR), -1)
+            if idx >= 0:
+                records.append(self.scorer.score_repo[idx])
+
+        both = len(records) == 2
+        self.status[REVIEWED_BIT].set(row, both and all(r.reviewed for r in records))
+        self.status[COMPLETE_BIT].set(row, both and all(
+            None not in r.jsn and None not in r.be for r in records))
+        self.status[HAS_BE_BIT].set(row, any(_positive(v) for r in records for v in r.be))
+
+
+if __name__ == "__main__":
+    import time
+    from scorer import Scorer, SVDH_SCHEMA
+
+    n = 50_000
+    paths = [f"/data/hands/P{i // 3:06d}_{20100101 + i % 3 * 10000}.bmp" for i in range(n)]
+    scorer = Scorer()
+
+    t0 = time.perf_counter()
+    index = CaseIndex(paths, scorer)
+    print(f"build {n} cases: {(time.perf_counter() - t0) * 1000:.0f} ms")
+    t0 = time.perf_counter()
+    index._build_trigrams()
+    print(f"trigram index: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    assert split_case_id("IMAGE007_20110111") == ("IMAGE007", "20110111")
+    assert split_case_id("scan") == ("scan", "")
+    assert index.search("p012345") == [37035, 37036, 37037]
+    assert index.search("P012345_2012-01-01") == [37037]
+    assert index.search("p0") and index.search("xyz") == []
+    assert index.timepoints(paths[37036]) == paths[37035:37038]
+    assert index.timepoints("/elsewhere/scan.bmp") == ["/elsewhere/scan.bmp"]
+
+    # 追加：行号不变，新 case 可检索、可按随访查找
+    grown = CaseIndex(paths[:6])
+    grown.search("p000001_2012")
+    assert grown.append(paths[6:9] + paths[:1]) == [6, 7, 8]
+    fresh = CaseIndex(paths[:9])
+    for query in ("p000002", "p000002_2011", "p0", "20110101"):
+        assert grown.search(query) == fresh.search(query), query
+    assert grown.timepoints(paths[7]) == paths[6:9] and grown.keys == fresh.keys
+    assert CaseIndex().append(paths[:2]) == [0, 1]
+
+    # 状态位随 scorer 增量更新
+    full_jsn = dict.fromkeys(SVDH_SCHEMA.jsn_keys, 0)
+    full_be = dict.fromkeys(SVDH_SCHEMA.be_keys, 0)
+    with scorer.transaction():
+        for path in paths[:10]:
+            for LorR in ('L', 'R'):
+                scorer.new_info(path, "id", "name", LorR, full_jsn, full_be)
+    scorer.set_reviewed(paths[3], True)
+    scorer.update_info(paths[5], 'R', full_jsn, dict(full_be, **{SVDH_SCHEMA.be_keys[0]: 2}))
+    assert index.count(COMPLETE_BIT) == 10 and index.count(REVIEWED_BIT) == 1
+    assert index.next_row(HAS_BE_BIT, 0) == 5 and index.next_row(HAS_BE_BIT, 5) == 5
+    assert index.next_row(REVIEWED_BIT, 2, False) == 4
+    assert index.next_row(COMPLETE_BIT, 20, False) == 21 and index.next_row(COMPLETE_BIT, n - 1, False) == 10
+
+    timings = {
+        "search substring": lambda: index.search("p04999"),
+        "search date": lambda: index.search("2011-01-01", limit=20),
+        "search prefix": lambda: index.search("p0", limit=20),
+        "next unreviewed": lambda: index.next_row(REVIEWED_BIT, 25_000, False),
+        "next has-BE": lambda: index.next_row(HAS_BE_BIT, 6),
+    }
+    for label, query in timings.items():
+        t0 = time.perf_counter()
+        for _ in range(100):
+            query()
+        print(f"{label:>16}: {(time.perf_counter() - t0) * 10:.3f} ms")
+    print("[OK] navigation")
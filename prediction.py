@@ -0,0 +1,354 @@
+"""
+模型预评分
+
+    runner = PredictionRunner("dummy")          # 或 "package.module:Class"，也可用环境变量 RASCORER_PREDICTOR
+    runner.start(paths, first=row)              # 从阅片者当前位置往后排队，进程池批量推理
+    results = runner.poll(0.015)                # GUI 定时器里取回 [(path, {'L': {'JSN': {...}, 'BE': {...}}, 'R': ...})]
+    apply_predictions(scorer, results, runner.model)   # 写入 scorer 的 proposed 层
+
+- 预测结果写入 Scorer 的 proposed 层，不直接改动正式评分；阅片者确认（accept_proposed）或自己修改
+- 结果按「文件内容 sha1 + 模型名 + 版本」缓存为 JSON，同一张片子换路径或重新打开会话都不重复推理
+- 每个工作进程只加载一次模型；未命中缓存的图像凑成一批再调用 predict
+
+接入新模型：继承 Predictor，实现 predict(batch)，batch 为 (N, input_size, input_size) float32，
+取值 0-1；返回长度为 N 的 list。ONNX 模型在 predict 里调用 onnxruntime 即可。
+"""
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from scorer import SCORE_SCALES, SVDH_SCHEMA
+from thumbnails import make_thumbnail
+
+BATCH_SIZE = 16
+
+
+def default_cache_dir():
+    root = os.environ.get("RASCORER_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "ra-scorer")
+    return os.path.join(root, "predictions")
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def prepare(array, size):
+    """
+    缩小到最长边 size 并补零成 (size, size)，灰度归一化到 0-1
+    """
+    thumb = make_thumbnail(array, size)
+    if thumb.ndim == 3:
+        thumb = thumb.mean(axis=2)
+    out = np.zeros((size, size), dtype=np.float32)
+    out[:thumb.shape[0], :thumb.shape[1]] = thumb / 255.0
+    return out
+
+
+# ================================
+#        模型接口
+# ================================
+class Predictor:
+    name = "base"
+    version = "0"
+    input_size = 256
+
+    def predict(self, batch):
+        """
+        batch: (N, input_size, input_size) float32 → [{'L': {'JSN': {...}, 'BE': {...}}, 'R': {...}}] * N
+        """
+        raise NotImplementedError
+
+
+class DummyPredictor(Predictor):
+    """
+    确定性的假模型：每个关节取图像固定位置一小块的平均灰度，量化到该关节的分值范围。
+    只依赖图像内容，便于离线测试整条流程。
+    """
+    name = "dummy"
+    version = "1"
+    input_size = 64
+
+    def __init__(self):
+        rng = np.random.default_rng(0)
+        n_joints = len(SVDH_SCHEMA.jsn_keys) + len(SVDH_SCHEMA.be_keys)
+        # (L/R, 关节) → 左上角坐标；L 取左半幅，R 取右半幅
+        half = self.input_size // 2
+        self.rows = rng.integers(0, self.input_size - 4, size=(2, n_joints))
+        self.cols = rng.integers(0, half - 4, size=(2, n_joints)) + np.array([[0], [half]])
+
+    def predict(self, batch):
+        n_jsn = len(SVDH_SCHEMA.jsn_keys)
+        scales = [SCORE_SCALES['JSN']] * n_jsn + [SCORE_SCALES['BE']] * len(SVDH_SCHEMA.be_keys)
+        results = []
+        for image in batch:
+            sides = {}
+            for s, LorR in enumerate(('L', 'R')):
+                values = []
+                for j, scale in enumerate(scales):
+                    r, c = self.rows[s, j], self.cols[s, j]
+                    level = float(image[r:r + 4, c:c + 4].mean())
+                    values.append(scale[min(int(level * len(scale)), len(scale) - 1)])
+                sides[LorR] = {
+                    'JSN': dict(zip(SVDH_SCHEMA.jsn_keys, values[:n_jsn])),
+                    'BE': dict(zip(SVDH_SCHEMA.be_keys, values[n_jsn:])),
+                }
+            results.append(sides)
+        return results
+
+
+PREDICTORS = {"dummy": DummyPredictor}
+
+
+def predictor_class(spec):
+    """
+    spec 为 PREDICTORS 中的名字，或 "package.module:ClassName"
+    """
+    if spec in PREDICTORS:
+        return PREDICTORS[spec]
+    module_name, sep, class_name = spec.partition(":")
+    if not sep:
+        raise ValueError(f"Unknown predictor: {spec!r}")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def model_key(cls):
+    return f"{cls.name}-{cls.version}"
+
+
+# ================================
+#        预测缓存
+# ================================
+class PredictionCache:
+    def __init__(self, root, model_key):
+        self.root = os.path.join(root, model_key)
+        os.makedirs(self.root, exist_ok=True)
+
+    def get(self, digest):
+        try:
+            with open(os.path.join(self.root, digest + ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest, prediction):
+        path = os.path.join(self.root, digest + ".json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(prediction, f)
+        os.replace(tmp, path)
+
+
+# ================================
+#        进程池中执行的任务
+# ================================
+_loaded = {}
+
+
+def _predict_batch(spec, root, paths):
+    from image_io import REGISTRY
+
+    predictor = _loaded.get(spec)
+    if predictor is None:
+        predictor = _loaded[spec] = predictor_class(spec)()
+    cache = PredictionCache(root, model_key(predictor))
+
+    results = {}
+    misses = []
+    for path in paths:
+        try:
+            digest = file_hash(path)
+        except OSError:
+            results[path] = None
+            continue
+        cached = cache.get(digest)
+        if cached is not None:
+            results[path] = cached
+            continue
+        try:
+            image = prepare(REGISTRY.load(path).array, predictor.input_size)
+        except Exception:
+            # 任何解码错误只让这一张无法推理，同批的其他文件照常
+            results[path] = None
+            continue
+        misses.append((path, digest, image))
+
+    if misses:
+        predictions = predictor.predict(np.stack([image for _, _, image in misses]))
+        for (path, digest, _), prediction in zip(misses, predictions):
+            cache.put(digest, prediction)
+            results[path] = prediction
+    return [(path, results[path]) for path in paths], len(misses)
+
+
+# ================================
+#        后台推理
+# ================================
+class PredictionRunner:
+    """
+    与 ThumbnailGenerator 相同的用法：start() 提交任务，GUI 定时 poll() 按时间预算取回结果
+    """
+    def __init__(self, spec=None, cache_dir=None, workers=None, batch=BATCH_SIZE):
+        self.spec = spec or os.environ.get("RASCORER_PREDICTOR") or "dummy"
+        # GUI 进程只解析模型类，不加载权重
+        self.model = model_key(predictor_class(self.spec))
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.workers = workers or max(1, min(2, (os.cpu_count() or 2) - 1))
+        self.batch = batch
+        self._pool = None
+        self._futures = []
+        self._ready = deque()
+        self.stats = {"requested": 0, "predicted": 0, "cached": 0, "failed": 0}
+
+    def _executor(self):
+        if self._pool is None:
+            ctx = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._pool
+
+    def start(self, paths, first=0, skip=()):
+        """
+        从 paths[first] 开始往后（到末尾后回到开头）排队，skip 中的路径不再推理
+        """
+        self.cancel()
+        paths = list(paths)
+        skip = set(skip)
+        self.stats = {"requested": 0, "predicted": 0, "cached": 0, "failed": 0}
+        self.extend([p for p in paths[first:] + paths[:first] if p not in skip])
+
+    def extend(self, paths):
+        """
+        追加到队尾，不取消已提交的任务
+        """
+        paths = list(paths)
+        self.stats["requested"] += len(paths)
+        pool = self._executor()
+        for i in range(0, len(paths), self.batch):
+            batch = paths[i:i + self.batch]
+            self._futures.append((pool.submit(_predict_batch, self.spec, self.cache_dir, batch), batch))
+
+    def cancel(self):
+        for future, _ in self._futures:
+            future.cancel()
+        self._futures = []
+        self._ready = deque()
+
+    @property
+    def done(self):
+        return not self._futures and not self._ready
+
+    def poll(self, budget=0.015):
+        """
+        返回 [(path, prediction)]，prediction 为 None 表示该文件无法推理
+        """
+        pending = []
+        for future, batch in self._futures:
+            if not future.done():
+                pending.append((future, batch))
+            elif future.cancelled():
+                continue
+            elif future.exception() is None:
+                results, predicted = future.result()
+                self.stats["predicted"] += predicted
+                self.stats["cached"] += sum(p is not None for _, p in results) - predicted
+                self.stats["failed"] += sum(p is None for _, p in results)
+                self._ready.extend(results)
+            else:
+                self._ready.extend((path, None) for path in batch)
+                self.stats["failed"] += len(batch)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    self._pool = None
+        self._futures = pending
+
+        deadline = time.perf_counter() + budget
+        results = []
+        while self._ready and time.perf_counter() < deadline:
+            results.append(self._ready.popleft())
+        return results
+
+    def shutdown(self):
+        self.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def apply_predictions(scorer, results, model):
+    """
+    把 poll() 的结果写入 scorer 的 proposed 层，返回写入的 case 数
+    """
+    count = 0
+    for path, prediction in results:
+        if prediction is None:
+            continue
+        for LorR in ('L', 'R'):
+            side = prediction.get(LorR) or {}
+            scorer.set_proposed(path, LorR, side.get('JSN'), side.get('BE'), model)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    from scorer import Scorer
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+    originals = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 复制出 96 个文件（内容只有 len(originals) 种），模拟一个工作列表
+        paths = []
+        for i in range(96):
+            src = originals[i % len(originals)]
+            dst = os.path.join(tmp, f"{i:03d}_{os.path.basename(src)}")
+            shutil.copyfile(src, dst)
+            paths.append(dst)
+
+        runner = PredictionRunner("dummy", cache_dir=os.path.join(tmp, "cache"))
+        for label in ("cold", "warm"):
+            t0 = time.perf_counter()
+            runner.start(paths, first=10)
+            results = []
+            while not runner.done:
+                results.extend(runner.poll())
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - t0
+            assert len(results) == len(paths) and all(p is not None for _, p in results)
+            assert results[0][0] == paths[10]
+            print(f"{label}: {len(results)} cases in {elapsed * 1000:.0f} ms, {runner.stats}")
+        runner.shutdown()
+
+        # 确定性：相同内容给出相同建议，且都在合法分值范围内
+        predictions = dict(results)
+        assert predictions[paths[0]] == predictions[paths[len(originals)]]
+        for side in predictions[paths[0]].values():
+            assert all(v in SCORE_SCALES['JSN'] for v in side['JSN'].values())
+            assert all(v in SCORE_SCALES['BE'] for v in side['BE'].values())
+
+        # proposed 层：只填阅片者还没打分的关节
+        scorer = Scorer()
+        for LorR in ('L', 'R'):
+            scorer.new_info(paths[0], "a", "a", LorR)
+        scorer.update_info(paths[0], 'L', {'MCP-T': 4}, None)
+        assert apply_predictions(scorer, results, runner.model) == len(paths)
+        JSN, BE, model = scorer.get_proposed(paths[0], 'L')
+        assert model == "dummy-1" and JSN == predictions[paths[0]]['L']['JSN']
+        filled = scorer.accept_proposed(paths[0])
+        assert scorer.get_info(paths[0], 'L')[0]['MCP-T'] == 4
+        assert filled == 2 * (len(SVDH_SCHEMA.jsn_keys) + len(SVDH_SCHEMA.be_keys)) - 1
+    print("[OK] prediction")
@@ -0,0 +1,179 @@
+"""
+耗时埋点
+
+    from profiling import profiled, span
+
+    @profiled("scorer.save_to_json")
+    def save_to_json(self, path): ...
+
+    with span("viewer.render"):
+        render_window.Render()
+
+- 默认关闭：@profiled 只多一次布尔判断，span() 返回共享的空上下文
+- 环境变量 RASCORER_PROFILE=1 启用；RASCORER_TRACE=trace.json 同时启用，
+  并在退出时写出 Chrome trace（chrome://tracing 或 https://ui.perfetto.dev 打开）
+- 最近 RING_SIZE 个 span 保存在环形缓冲区里，summary() 给出每个操作的 p50 / p95
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+RING_SIZE = 4096
+
+
+class Profiler:
+    def __init__(self, size=RING_SIZE):
+        self.enabled = False
+        # (name, start_ns, duration_ns, thread_id)；deque.append 在 GIL 下是原子的
+        self.spans = deque(maxlen=size)
+        self._origin = time.perf_counter_ns()
+
+    def enable(self, on=True):
+        self.enabled = on
+
+    def clear(self):
+        self.spans.clear()
+
+    def record(self, name, start_ns, duration_ns):
+        self.spans.append((name, start_ns, duration_ns, threading.get_ident()))
+
+    def summary(self):
+        """
+        {name: {'count', 'p50_ms', 'p95_ms', 'max_ms'}}，只统计环形缓冲区里的 span
+        """
+        durations = {}
+        for name, _, duration, _ in list(self.spans):
+            durations.setdefault(name, []).append(duration)
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            n = len(values)
+            result[name] = {
+                "count": n,
+                "p50_ms": values[(n - 1) // 2] / 1e6,
+                "p95_ms": values[min(n - 1, int(n * 0.95))] / 1e6,
+                "max_ms": values[-1] / 1e6,
+            }
+        return result
+
+    def format_summary(self, limit=None):
+        """
+        按 p95 从大到小排列，每个操作一行
+        """
+        rows = sorted(self.summary().items(), key=lambda item: -item[1]["p95_ms"])
+        if limit is not None:
+            rows = rows[:limit]
+        return [f"{name}: p50 {s['p50_ms']:.1f} / p95 {s['p95_ms']:.1f} ms (n={s['count']})"
+                for name, s in rows]
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = [
+            {"name": name, "ph": "X", "pid": pid, "tid": tid,
+             "ts": (start - self._origin) / 1000, "dur": duration / 1000}
+            for name, start, duration, tid in list(self.spans)
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+PROFILER = Profiler()
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        PROFILER.record(self.name, self.start, end - self.start)
+        return False
+
+
+_NULL_SPAN = nullcontext()
+
+
+def span(name):
+    if not PROFILER.enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def profiled(name=None):
+    """
+    装饰器；name 缺省时用函数的 __qualname__
+    """
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(label, start, time.perf_counter_ns() - start)
+        return wrapper
+    return decorator
+
+
+_trace_path = os.environ.get("RASCORER_TRACE")
+if _trace_path or os.environ.get("RASCORER_PROFILE", "") not in ("", "0"):
+    PROFILER.enable()
+if _trace_path:
+    atexit.register(PROFILER.dump_trace, _trace_path)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    @profiled("demo.work")
+    def work(n):
+        return sum(range(n))
+
+    # 关闭时不记录
+    work(10)
+    with span("demo.block"):
+        pass
+    assert len(PROFILER.spans) == 0
+
+    PROFILER.enable()
+    for i in range(100):
+        work(1000 * (i + 1))
+    with span("demo.block"):
+        time.sleep(0.01)
+    summary = PROFILER.summary()
+    assert summary["demo.work"]["count"] == 100
+    assert summary["demo.work"]["p50_ms"] <= summary["demo.work"]["p95_ms"] <= summary["demo.work"]["max_ms"]
+    assert summary["demo.block"]["p50_ms"] >= 10
+    print("\n".join(PROFILER.format_summary()))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = PROFILER.dump_trace(os.path.join(tmp, "trace.json"))
+        with open(path, encoding="utf-8") as f:
+            trace = json.load(f)
+        assert len(trace["traceEvents"]) == 101 and trace["traceEvents"][0]["ph"] == "X"
+
+    # 环形缓冲区只保留最近的 span
+    small = Profiler(size=10)
+    for i in range(25):
+        small.record("x", i, i)
+    assert len(small.spans) == 10 and small.summary()["x"]["max_ms"] == 24 / 1e6
+    print("[OK] profiling")
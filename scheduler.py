@@ -0,0 +1,212 @@
+"""
+工作列表排序与预取
+
+    paths = order_cases(paths, "longitudinal")          # 见 STRATEGIES
+    prefetcher = Prefetcher()                           # 与查看器共用 image_io.DECODE_CACHE
+    prefetcher.acquire(path)                            # 打开 case 之前：预取中的等它完成，并记录命中 / 等待
+    prefetcher.schedule(paths[row + 1:row + 4])         # 打开之后：按顺序预取接下来的几个 case
+    prefetcher.report()                                 # {'hit_rate', 'mean_wait_ms', ...}
+
+排序策略：
+- name：文件名顺序（导入文件夹时的默认顺序）
+- locality：按存储位置（设备、目录、inode）顺序，机械硬盘 / 网络共享上顺序读
+- longitudinal：同一病人的各次随访排在一起、按日期升序；病人之间按存储位置
+- unreviewed-first：未 reviewed 的在前，各自保持 longitudinal 顺序
+- random：按 seed 打乱（盲法阅片，不暴露随访先后），同一 seed 顺序不变
+"""
+import os
+import random
+import time
+
+from navigation import split_case_id
+
+STRATEGIES = ("name", "locality", "longitudinal", "unreviewed-first", "random")
+PREFETCH_DEPTH = 3
+
+
+def storage_key(path):
+    """
+    近似的磁盘位置：同一文件系统上 inode 分配顺序大致对应写入位置
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return float("inf"), os.path.dirname(path), 0
+    return st.st_dev, os.path.dirname(path), st.st_ino
+
+
+def _longitudinal(paths, keys):
+    patients = {}
+    for path in paths:
+        case_id = os.path.splitext(os.path.basename(path))[0].lower()
+        patient, date = split_case_id(case_id)
+        # 文件名里没有日期的 case 各自成组
+        patients.setdefault(patient if date else path, []).append((date, path))
+    groups = [sorted(visits) for visits in patients.values()]
+    groups.sort(key=lambda visits: min(keys[path] for _, path in visits))
+    return [path for visits in groups for _, path in visits]
+
+
+def order_cases(paths, strategy="name", reviewed=(), seed=0):
+    """
+    返回按 strategy 排好的新列表；reviewed 为已 reviewed 的路径集合（unreviewed-first 用）
+    """
+    paths = list(paths)
+    if strategy == "name":
+        return sorted(paths)
+    if strategy == "random":
+        ordered = sorted(paths)
+        random.Random(seed).shuffle(ordered)
+        return ordered
+    keys = {path: storage_key(path) for path in paths}
+    if strategy == "locality":
+        return sorted(paths, key=keys.__getitem__)
+    if strategy == "longitudinal":
+        return _longitudinal(paths, keys)
+    if strategy == "unreviewed-first":
+        reviewed = set(reviewed)
+        ordered = _longitudinal(paths, keys)
+        return [p for p in ordered if p not in reviewed] + [p for p in ordered if p in reviewed]
+    raise ValueError(f"Unknown strategy: {strategy!r}")
+
+
+class Prefetcher:
+    """
+    单个后台线程按工作列表顺序解码接下来的 case：顺序读，不和前台抢磁盘
+    """
+    def __init__(self, cache=None, depth=PREFETCH_DEPTH):
+        from concurrent.futures import ThreadPoolExecutor   # 延迟导入，不进入启动路径
+
+        if cache is None:
+            from image_io import DECODE_CACHE as cache
+        self.cache = cache
+        self.depth = depth
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._futures = {}      # path → Future
+        self.stats = {"requests": 0, "hits": 0, "waits": 0, "misses": 0, "wait_time": 0.0, "prefetched": 0}
+
+    def _warm(self, path):
+        from image_io import UnsupportedImage
+
+        try:
+            # scalar_range 会读遍整幅图，内存映射的图像也一起读进页缓存
+            self.cache.scalar_range(path)
+        except (UnsupportedImage, OSError):
+            return False
+        return True
+
+    def schedule(self, paths):
+        """
+        预取 paths 中前 depth 个；不再需要的、还没开始的任务取消
+        """
+        wanted = list(paths)[:self.depth]
+        for path, future in list(self._futures.items()):
+            if future.done() or (path not in wanted and future.cancel()):
+                del self._futures[path]
+        for path in wanted:
+            if path in self._futures or self.cache.contains(path):
+                continue
+            self._futures[path] = self._pool.submit(self._warm, path)
+            self.stats["prefetched"] += 1
+
+    def acquire(self, path):
+        """
+        打开 path 之前调用：已在缓存中记为命中；正在预取的等它完成；
+        还在排队的取消（由调用方直接读），记为未命中。返回等待秒数
+        """
+        stats = self.stats
+        stats["requests"] += 1
+        future = self._futures.pop(path, None)
+        if future is not None and not future.done() and not future.cancel():
+            t0 = time.perf_counter()
+            future.result()
+            wait = time.perf_counter() - t0
+            stats["waits"] += 1
+            stats["wait_time"] += wait
+            return wait
+        if self.cache.contains(path):
+            stats["hits"] += 1
+        else:
+            stats["misses"] += 1
+        return 0.0
+
+    def report(self):
+        s = self.stats
+        requests = s["requests"] or 1
+        return {
+            "requests": s["requests"],
+            "hit_rate": s["hits"] / requests,
+            "wait_rate": s["waits"] / requests,
+            "miss_rate": s["misses"] / requests,
+            "mean_wait_ms": s["wait_time"] / s["waits"] * 1000 if s["waits"] else 0.0,
+            "prefetched": s["prefetched"],
+        }
+
+    def format_report(self):
+        r = self.report()
+        return (f"Prefetch: {r['requests']} opens, {r['hit_rate']:.0%} ready, {r['wait_rate']:.0%} waited "
+                f"(mean {r['mean_wait_ms']:.0f} ms), {r['miss_rate']:.0%} missed")
+
+    def shutdown(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    from image_io import REGISTRY, DecodeCache
+
+    # 排序策略
+    names = ["/d/P2_20120101.bmp", "/d/P1_20130101.bmp", "/d/P1_20110101.bmp", "/d/scan.bmp", "/d/P2_20100101.bmp"]
+    assert order_cases(names) == sorted(names)
+    longitudinal = order_cases(names, "longitudinal")
+    assert longitudinal.index("/d/P1_20110101.bmp") + 1 == longitudinal.index("/d/P1_20130101.bmp")
+    assert longitudinal.index("/d/P2_20100101.bmp") + 1 == longitudinal.index("/d/P2_20120101.bmp")
+    first = order_cases(names, "unreviewed-first", reviewed={"/d/P1_20110101.bmp", "/d/scan.bmp"})
+    assert set(first[-2:]) == {"/d/P1_20110101.bmp", "/d/scan.bmp"}
+    assert order_cases(names, "random", seed=1) == order_cases(names, "random", seed=1) != sorted(names)
+
+    class SlowRegistry:
+        """
+        模拟慢存储：每次读取额外耗时 delay 秒
+        """
+        def __init__(self, delay):
+            self.delay = delay
+
+        def load(self, path):
+            time.sleep(self.delay)
+            return REGISTRY.load(path)
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+    originals = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir))
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(30):
+            dst = os.path.join(tmp, f"P{i // 3:03d}_{20100101 + i % 3 * 10000}.bmp")
+            shutil.copyfile(originals[i % len(originals)], dst)
+            paths.append(dst)
+        assert order_cases(paths, "longitudinal") == paths
+        assert sorted(order_cases(paths, "locality")) == sorted(paths)
+
+        # 读取 80 ms；阅片者在每个 case 停留 dwell 秒；depth 0 为不预取的基线
+        for dwell, depth in ((0.2, 0), (0.0, 3), (0.05, 3), (0.2, 3)):
+            cache = DecodeCache(SlowRegistry(0.08))
+            prefetcher = Prefetcher(cache, depth)
+            blocked = 0.0
+            for row, path in enumerate(paths):
+                t0 = time.perf_counter()
+                prefetcher.acquire(path)
+                cache.scalar_range(path)
+                blocked += time.perf_counter() - t0
+                prefetcher.schedule(paths[row + 1:])
+                time.sleep(dwell)
+            prefetcher.shutdown()
+            r = prefetcher.report()
+            print(f"dwell {dwell * 1000:3.0f} ms, depth {depth}: {prefetcher.format_report()}, "
+                  f"mean time to open {blocked / len(paths) * 1000:.0f} ms")
+            if dwell >= 0.2 and depth:
+                assert r["hit_rate"] > 0.9
+    print("[OK] scheduler")
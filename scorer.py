@@ -1,10 +1,11 @@
 import random
-import numpy as np
-import pandas as pd
-import random
 import os
 import time
 import json
+from collections import namedtuple
+from contextlib import contextmanager
+
+from profiling import profiled
 
 SVDH_TEMPLATE = {
     'case_path': '',
@@ -27,6 +28,135 @@ SVDH_TEMPLATE = {
     }
 }
 
+# 各关节允许的分值（评分控件的下拉框选项也由此生成）
+SCORE_SCALES = {
+    'JSN': (0, 1, 2, 3, 4),
+    'BE': (0, 1, 2, 3, 5),
+}
+
+
+# ================================
+#        评分记录 / Schema
+# ================================
+class ScoreRecord:
+    """
+    单侧（L 或 R）一个 case 的评分记录。
+    jsn / be 为定长 list，顺序与 SVDH_SCHEMA.jsn_keys / be_keys 一致。
+    """
+    __slots__ = ('case_path', 'case_id', 'case_name', 'reviewed', 'LorR', 'jsn', 'be')
+
+    def __init__(self, case_path, case_id, case_name, LorR, jsn, be, reviewed=False):
+        self.case_path = case_path
+        self.case_id = case_id
+        self.case_name = case_name
+        self.reviewed = reviewed
+        self.LorR = LorR
+        self.jsn = jsn
+        self.be = be
+
+    @property
+    def JSN(self):
+        return dict(zip(SVDH_SCHEMA.jsn_keys, self.jsn))
+
+    @property
+    def BE(self):
+        return dict(zip(SVDH_SCHEMA.be_keys, self.be))
+
+    def to_dict(self):
+        # 与 SVDH_TEMPLATE 结构一致，用于 JSON / Excel 导出
+        return {
+            'case_path': self.case_path,
+            'case_id': self.case_id,
+            'case_name': self.case_name,
+            'reviewed': self.reviewed,
+            'LorR': self.LorR,
+            'JSN': self.JSN,
+            'BE': self.BE,
+        }
+
+
+# Scorer 变更事件，通过 Scorer.subscribe 注册的回调接收
+ScoreEvent = namedtuple('ScoreEvent', ['kind', 'case_path', 'LorR', 'changes'])
+# kind:    'new' / 'update' / 'reviewed' / 'reload'（load_from_json 整体替换）
+# changes: {(mode, joint): (old, new)}，mode 为 'JSN' / 'BE' / REVIEWED；
+#          relocate 发出的 'reload' 为 {旧路径: 新路径}
+
+REVIEWED = 'reviewed'   # reviewed 标记在 changes 中的 mode，joint 为空串
+
+# 模型建议分数：jsn / be 为按 schema 关节顺序排列的 list，model 为给出建议的模型名
+ProposedScore = namedtuple('ProposedScore', ['jsn', 'be', 'model'])
+
+
+def score_changes(old_jsn, new_jsn, old_be, new_be):
+    """
+    比较两组定长分数 list，返回 {(mode, joint): (old, new)}
+    """
+    changes = {}
+    if old_jsn != new_jsn:
+        for joint, old, new in zip(SVDH_SCHEMA.jsn_keys, old_jsn, new_jsn):
+            if old != new:
+                changes[('JSN', joint)] = (old, new)
+    if old_be != new_be:
+        for joint, old, new in zip(SVDH_SCHEMA.be_keys, old_be, new_be):
+            if old != new:
+                changes[('BE', joint)] = (old, new)
+    return changes
+
+
+class SvdhSchema:
+    """
+    SvdH 评分的结构描述：预先算好 JSN / BE 的关节顺序，
+    直接从输入 dict 生成 ScoreRecord，不再每次深拷贝模板。
+    """
+    __slots__ = ('jsn_keys', 'be_keys', 'jsn_keyset', 'be_keyset', '_empty_jsn', '_empty_be')
+
+    def __init__(self, template=SVDH_TEMPLATE):
+        self.jsn_keys = tuple(template['JSN'])
+        self.be_keys = tuple(template['BE'])
+        self.jsn_keyset = frozenset(self.jsn_keys)
+        self.be_keyset = frozenset(self.be_keys)
+        self._empty_jsn = [None] * len(self.jsn_keys)
+        self._empty_be = [None] * len(self.be_keys)
+
+    def validate(self, JSN_dict=None, BE_dict=None):
+        """
+        检查输入中是否有模板以外的关节名，有则抛出 ValueError
+        """
+        if JSN_dict and not self.jsn_keyset.issuperset(JSN_dict):
+            unknown = sorted(set(JSN_dict) - self.jsn_keyset)
+            raise ValueError(f"Unexpected JSN joints: {unknown}")
+        if BE_dict and not self.be_keyset.issuperset(BE_dict):
+            unknown = sorted(set(BE_dict) - self.be_keyset)
+            raise ValueError(f"Unexpected BE joints: {unknown}")
+
+    def jsn_values(self, JSN_dict):
+        if JSN_dict is None:
+            return self._empty_jsn[:]
+        return list(map(JSN_dict.get, self.jsn_keys))
+
+    def be_values(self, BE_dict):
+        if BE_dict is None:
+            return self._empty_be[:]
+        return list(map(BE_dict.get, self.be_keys))
+
+    def new_record(self, case_path, case_id, case_name, LorR, JSN_dict=None, BE_dict=None):
+        self.validate(JSN_dict, BE_dict)
+        return ScoreRecord(case_path, case_id, case_name, LorR,
+                           self.jsn_values(JSN_dict), self.be_values(BE_dict))
+
+    def record_from_dict(self, item):
+        """
+        从 JSON 中的 dict（SVDH_TEMPLATE 结构）恢复 ScoreRecord
+        """
+        record = self.new_record(item['case_path'], item.get('case_id', 'null'),
+                                 item.get('case_name', 'null'), item['LorR'],
+                                 item.get('JSN'), item.get('BE'))
+        record.reviewed = item.get('reviewed', False)
+        return record
+
+
+SVDH_SCHEMA = SvdhSchema()
+
 
 class Scorer:
     def __init__(self):
@@ -35,117 +165,417 @@ class Scorer:
         self.recent_idx = 0
         self.recent_path = ''
 
-        self.score_repo = []  # 所有 case 的评分
+        self.score_repo = []  # 所有 case 的评分（ScoreRecord）
         self.mapping = []
         self.index_map = {}   # (path, LorR) → index
         self.count_idx = 0
+        # 模型给出的建议分数，与阅片者的分数分开保存：(path, LorR) → ProposedScore
+        self.proposed = {}
+        # 像素内容摘要：path → digest（见 identity.py），文件移动后据此重新绑定
+        self.content = {}
+
+        # 事务状态：None 表示不在事务中
+        self._txn = None
+        # 变更监听回调：callback(ScoreEvent)
+        self._listeners = []
 
     def get_file_list(self):
         if len(self.score_repo) == 0:
             return None
         else:
-            file_list = []
-            for i in self.score_repo:
-                if i['case_path'] not in file_list:
-                    file_list.append(i['case_path'])
+            # dict 保序去重，O(n)
+            return list(dict.fromkeys(i.case_path for i in self.score_repo))
 
-            return file_list
+    def has_case(self, case_path):
+        return self._index_of(case_path, 'L') >= 0 or self._index_of(case_path, 'R') >= 0
 
-    def new_info(self, case_path, case_id, case_name, LorR, JSN_dict=None, BE_dict=None):
-        # 深拷贝模板，避免各 case 数据互相污染
-        score_dict = json.loads(json.dumps(SVDH_TEMPLATE))
-
-        score_dict['case_path'] = case_path
-        score_dict['case_id'] = case_id
-        score_dict['case_name'] = case_name
-        score_dict['LorR'] = LorR
-
-        for key in score_dict['JSN'].keys():
-            if JSN_dict == None:
-                score_dict['JSN'][key] = None
-            else:
-                score_dict['JSN'][key] = JSN_dict.get(key)
-
-        for key in score_dict['BE'].keys():
-            if BE_dict == None:
-                score_dict['BE'][key] = None
-            else:
-                score_dict['BE'][key] = BE_dict.get(key)
-
-        self.index_map[(case_path, LorR)] = self.count_idx
-        self.score_repo.append(score_dict)
-        self.count_idx += 1
+    def has_info(self, case_path, LorR):
+        return self._index_of(case_path, LorR) >= 0
 
-    def update_info(self, case_path, LorR, JSN_dict, BE_dict):
+    # ====================================================
+    #  变更通知
+    # ====================================================
+    def subscribe(self, callback):
+        """
+        注册变更回调 callback(ScoreEvent)。回调在修改生效之后调用，
+        事务中的事件在提交后统一发出。
+        """
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _emit(self, kind, case_path, LorR, changes):
+        event = ScoreEvent(kind, case_path, LorR, changes)
+        if self._txn is not None:
+            self._txn['events'].append(event)
+            return
+        for callback in list(self._listeners):
+            callback(event)
+
+    # ====================================================
+    #  索引
+    # ====================================================
+    def _index_of(self, case_path, LorR):
+        """
+        (path, LorR) → score_repo 下标，不存在返回 -1。
+        事务中新建的 case 延迟写入 index_map，查不到时先补建再查。
+        """
         idx = self.index_map.get((case_path, LorR), -1)
-        score_dict = self.score_repo[idx]
+        if idx < 0 and self._txn is not None and self._txn['indexed'] < len(self.score_repo):
+            self._flush_index()
+            idx = self.index_map.get((case_path, LorR), -1)
+        return idx
+
+    def _require_index(self, case_path, LorR):
+        idx = self._index_of(case_path, LorR)
+        if idx < 0:
+            raise KeyError((case_path, LorR))
+        return idx
+
+    def _backup(self, record):
+        """
+        事务中第一次修改某条记录前保存它的原值，出错时据此回滚
+        """
+        if self._txn is not None and id(record) not in self._txn['backup']:
+            self._txn['backup'][id(record)] = (record, record.case_path, record.reviewed, record.jsn, record.be)
+
+    def _flush_index(self):
+        start = self._txn['indexed'] if self._txn is not None else 0
+        for idx in range(start, len(self.score_repo)):
+            item = self.score_repo[idx]
+            self.index_map[(item.case_path, item.LorR)] = idx
+        if self._txn is not None:
+            self._txn['indexed'] = len(self.score_repo)
+
+    def rebuild_index(self):
+        self.index_map = {}
+        for idx, item in enumerate(self.score_repo):
+            self.index_map[(item.case_path, item.LorR)] = idx
+        self.count_idx = len(self.score_repo)
 
-        for key in score_dict['JSN'].keys():
-            score_dict['JSN'][key] = JSN_dict.get(key)
+    # ====================================================
+    #  单条操作
+    # ====================================================
+    def _append_info(self, record):
+        if self._txn is None:
+            self.index_map[(record.case_path, record.LorR)] = len(self.score_repo)
+        self.score_repo.append(record)
+        self.count_idx = len(self.score_repo)
 
-        for key in score_dict['BE'].keys():
-            score_dict['BE'][key] = BE_dict.get(key)
+        if self._listeners:
+            empty_jsn, empty_be = SVDH_SCHEMA.jsn_values(None), SVDH_SCHEMA.be_values(None)
+            self._emit('new', record.case_path, record.LorR,
+                       score_changes(empty_jsn, record.jsn, empty_be, record.be))
 
-    def set_reviewed(self, case_path, state):
-        idx = self.index_map.get((case_path, 'L'), -1)
-        score_dict = self.score_repo[idx]
-        score_dict['reviewed'] = state
+    def new_info(self, case_path, case_id, case_name, LorR, JSN_dict=None, BE_dict=None):
+        self._append_info(SVDH_SCHEMA.new_record(case_path, case_id, case_name, LorR, JSN_dict, BE_dict))
 
-        idx = self.index_map.get((case_path, 'R'), -1)
-        score_dict = self.score_repo[idx]
-        score_dict['reviewed'] = state
+    def update_info(self, case_path, LorR, JSN_dict, BE_dict):
+        idx = self._index_of(case_path, LorR)
+        record = self.score_repo[idx]
+
+        SVDH_SCHEMA.validate(JSN_dict, BE_dict)
+        new_jsn = SVDH_SCHEMA.jsn_values(JSN_dict)
+        new_be = SVDH_SCHEMA.be_values(BE_dict)
+        self._backup(record)
+        old_jsn, old_be = record.jsn, record.be
+        record.jsn = new_jsn
+        record.be = new_be
+        if self._listeners:
+            changes = score_changes(old_jsn, new_jsn, old_be, new_be)
+            if changes:
+                self._emit('update', case_path, LorR, changes)
+
+    def set_reviewed(self, case_path, state):
+        """
+        标记该 case 已有的各侧记录；case 不存在时抛出 KeyError
+        """
+        indices = [idx for idx in (self._index_of(case_path, LorR) for LorR in ('L', 'R')) if idx >= 0]
+        if not indices:
+            raise KeyError(case_path)
+        for idx in indices:
+            self._set_reviewed_record(self.score_repo[idx], state)
+
+    def _set_reviewed_record(self, record, state):
+        self._backup(record)
+        old = record.reviewed
+        record.reviewed = state
+        if self._listeners and old != state:
+            self._emit('reviewed', record.case_path, record.LorR, {(REVIEWED, ''): (old, state)})
 
     def get_reviewed(self, case_path):
-        idx = self.index_map.get((case_path, 'L'), -1)
-        score_dict = self.score_repo[idx]
-        return score_dict['reviewed']
+        idx = self._index_of(case_path, 'L')
+        if idx < 0:
+            idx = self._require_index(case_path, 'R')
+        return self.score_repo[idx].reviewed
 
 
     def get_info(self, case_path, LorR):
-        idx = self.index_map.get((case_path, LorR), -1)
-        score_dict = self.score_repo[idx]
-        return score_dict['JSN'], score_dict['BE']
+        idx = self._index_of(case_path, LorR)
+        record = self.score_repo[idx]
+        return record.JSN, record.BE
+
+    # ====================================================
+    #  模型建议分数（proposed 层）
+    # ====================================================
+    def set_proposed(self, case_path, LorR, JSN_dict=None, BE_dict=None, model=''):
+        SVDH_SCHEMA.validate(JSN_dict, BE_dict)
+        self.proposed[(case_path, LorR)] = ProposedScore(
+            SVDH_SCHEMA.jsn_values(JSN_dict), SVDH_SCHEMA.be_values(BE_dict), model)
+
+    def get_proposed(self, case_path, LorR):
+        """
+        返回 (JSN_dict, BE_dict, model)，没有建议时返回 None
+        """
+        proposal = self.proposed.get((case_path, LorR))
+        if proposal is None:
+            return None
+        return (dict(zip(SVDH_SCHEMA.jsn_keys, proposal.jsn)),
+                dict(zip(SVDH_SCHEMA.be_keys, proposal.be)), proposal.model)
+
+    def accept_proposed(self, case_path, LorR=None, overwrite=False):
+        """
+        把建议分数写入正式评分。默认只填还没打分的关节，overwrite=True 时全部覆盖。
+        走 update_many，撤销 / 审计照常记录。返回写入的关节数。
+        """
+        updates = []
+        filled = 0
+        for side in ((LorR,) if LorR else ('L', 'R')):
+            proposal = self.proposed.get((case_path, side))
+            idx = self._index_of(case_path, side)
+            if proposal is None or idx < 0:
+                continue
+            record = self.score_repo[idx]
+            jsn = [p if p is not None and (overwrite or old is None) else old
+                   for old, p in zip(record.jsn, proposal.jsn)]
+            be = [p if p is not None and (overwrite or old is None) else old
+                  for old, p in zip(record.be, proposal.be)]
+            filled += sum(a != b for a, b in zip(jsn + be, record.jsn + record.be))
+            updates.append((case_path, side,
+                            dict(zip(SVDH_SCHEMA.jsn_keys, jsn)), dict(zip(SVDH_SCHEMA.be_keys, be))))
+        if filled:
+            self.update_many(updates)
+        return filled
+
+    def discard_proposed(self, case_path=None):
+        if case_path is None:
+            self.proposed.clear()
+            return
+        for side in ('L', 'R'):
+            self.proposed.pop((case_path, side), None)
+
+    # ====================================================
+    #  文件移动后改写路径
+    # ====================================================
+    def relocate(self, mapping):
+        """
+        mapping: {旧路径: 新路径}；评分、建议分数与内容摘要跟着改，返回改写的记录数
+        """
+        if not mapping:
+            return 0
+        moved = 0
+        for record in self.score_repo:
+            new_path = mapping.get(record.case_path)
+            if new_path is not None:
+                self._backup(record)
+                record.case_path = new_path
+                moved += 1
+        self.proposed = {(mapping.get(path, path), LorR): p for (path, LorR), p in self.proposed.items()}
+        self.content = {mapping.get(path, path): digest for path, digest in self.content.items()}
+        self.recent_path = mapping.get(self.recent_path, self.recent_path)
+        self.rebuild_index()
+        self._emit('reload', None, None, dict(mapping))
+        return moved
+
+    # ====================================================
+    #  批量操作
+    # ====================================================
+    def new_cases(self, cases):
+        """
+        批量新建 case。cases 的每一项可以是 new_info 参数组成的 dict，
+        也可以是 (case_path, case_id, case_name, LorR[, JSN_dict, BE_dict]) 元组。
+        """
+        new_record = SVDH_SCHEMA.new_record
+        with self.transaction():
+            for case in cases:
+                if isinstance(case, dict):
+                    record = new_record(**case)
+                else:
+                    record = new_record(*case)
+                self._append_info(record)
+
+    @profiled("scorer.update_many")
+    def update_many(self, records):
+        """
+        批量更新评分。records 的每一项为 (case_path, LorR, JSN_dict, BE_dict)，
+        或含这些键的 dict。
+        先检查全部记录：有不存在的 (case_path, LorR) 抛出 KeyError、有非法关节名抛出 ValueError，
+        此时不修改任何记录。
+        """
+        nested = self._txn is not None
+        with self.transaction():
+            # 热循环：局部变量 + 直接查 index_map，查不到再走 _index_of
+            repo = self.score_repo
+            index_get = self.index_map.get
+            schema = SVDH_SCHEMA
+            listening = bool(self._listeners)
+            # 先校验后修改，自己是最外层事务时不会改到一半，只有嵌套时才需要为外层事务备份
+            backup = self._txn['backup'] if nested else None
+            resolved = []
+            for item in records:
+                if isinstance(item, dict):
+                    case_path, LorR = item['case_path'], item['LorR']
+                    JSN_dict, BE_dict = item.get('JSN') or {}, item.get('BE') or {}
+                else:
+                    case_path, LorR, JSN_dict, BE_dict = item
+
+                idx = index_get((case_path, LorR), -1)
+                if idx < 0:
+                    idx = self._require_index(case_path, LorR)
+                schema.validate(JSN_dict, BE_dict)
+                resolved.append((idx, case_path, LorR, JSN_dict, BE_dict))
+
+            for idx, case_path, LorR, JSN_dict, BE_dict in resolved:
+                record = repo[idx]
+                new_jsn = schema.jsn_values(JSN_dict)
+                new_be = schema.be_values(BE_dict)
+                old_jsn, old_be = record.jsn, record.be
+                if backup is not None and id(record) not in backup:
+                    backup[id(record)] = (record, record.case_path, record.reviewed, old_jsn, old_be)
+                record.jsn = new_jsn
+                record.be = new_be
+                if listening:
+                    changes = score_changes(old_jsn, new_jsn, old_be, new_be)
+                    if changes:
+                        self._emit('update', case_path, LorR, changes)
+
+    def set_reviewed_many(self, case_paths, state=True):
+        """
+        L / R 两侧都必须存在，否则抛出 KeyError 且不修改任何记录
+        """
+        with self.transaction():
+            repo = self.score_repo
+            indices = [self._require_index(case_path, LorR) for case_path in case_paths for LorR in ('L', 'R')]
+            for idx in indices:
+                self._set_reviewed_record(repo[idx], state)
+
+    # ====================================================
+    #  事务：推迟索引重建与持久化，出错时回滚
+    # ====================================================
+    @contextmanager
+    def transaction(self, save_path=None):
+        """
+        with scorer.transaction(save_path):
+            scorer.new_info(...)
+            scorer.update_info(...)
+
+        - 事务内新建的 case 在提交时统一写入 index_map（事务内查询会按需补建）
+        - 提交时若给了 save_path，只写一次 JSON
+        - 事务内抛出异常时，记录的分数 / reviewed / 路径恢复到事务开始时的状态，
+          事务内新建的记录被删除，变更事件不发出，也不写文件；
+          relocate 之外对建议分数与内容摘要的修改不回滚
+        - 嵌套事务并入最外层，save_path 与回滚都以最外层为准
+        - 事务内产生的变更事件在结束时按顺序发出
+        """
+        if self._txn is not None:
+            yield self
+            return
+
+        txn = self._txn = {'indexed': len(self.score_repo), 'length': len(self.score_repo),
+                           'events': [], 'backup': {},
+                           'moved': (self.proposed, self.content, self.recent_path)}
+        try:
+            yield self
+        except BaseException:
+            self._txn = None
+            for record, case_path, reviewed, jsn, be in txn['backup'].values():
+                record.case_path, record.reviewed, record.jsn, record.be = case_path, reviewed, jsn, be
+            del self.score_repo[txn['length']:]
+            self.proposed, self.content, self.recent_path = txn['moved']
+            self.rebuild_index()
+            raise
+
+        self._flush_index()
+        self._txn = None
+        for event in txn['events']:
+            for callback in list(self._listeners):
+                callback(event)
+
+        if save_path:
+            self.save_to_json(save_path)
 
     # ====================================================
     #  保存当前状态到 JSON 文件
     # ====================================================
-    def save_to_json(self, path):
-        data = {
-            "score_repo": self.score_repo,
+    def snapshot(self):
+        """
+        会话 JSON 的内容（全部是新建的 dict / list，之后修改 Scorer 不影响它）；
+        与 write_json 分开，调用方可以在持有 Scorer 的线程里取快照、在别的线程里写盘
+        """
+        return {
+            "score_repo": [record.to_dict() for record in self.score_repo],
             "count_idx": self.count_idx,
             "datetime": self.datetime,
+            "proposed": [
+                {"case_path": case_path, "LorR": LorR, "model": p.model,
+                 "JSN": dict(zip(SVDH_SCHEMA.jsn_keys, p.jsn)), "BE": dict(zip(SVDH_SCHEMA.be_keys, p.be))}
+                for (case_path, LorR), p in self.proposed.items()
+            ],
+            "content": {path: digest for path, digest in self.content.items() if self.has_case(path)},
         }
 
-        with open(path, "w", encoding="utf-8") as f:
+    @staticmethod
+    def write_json(data, path):
+        # 先写临时文件再替换，其他进程不会读到写了一半的 JSON
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
 
         print(f"[OK] 已保存到 {path}")
 
+    @profiled("scorer.save_to_json")
+    def save_to_json(self, path):
+        self.write_json(self.snapshot(), path)
+
 
     # ====================================================
     #  从 JSON 读取并恢复状态
     # ====================================================
+    @profiled("scorer.load_from_json")
     def load_from_json(self, path):
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
 
         # 恢复基本内容
-        self.score_repo = data.get("score_repo", [])
+        self.score_repo = [SVDH_SCHEMA.record_from_dict(item) for item in data.get("score_repo", [])]
         self.count_idx = data.get("count_idx", len(self.score_repo))
         self.datetime = data.get("datetime", 0)
+        self.proposed = {}
+        for item in data.get("proposed", []):
+            self.set_proposed(item["case_path"], item["LorR"], item.get("JSN"), item.get("BE"), item.get("model", ''))
+        self.content = dict(data.get("content", {}))
 
         # 自动重建 index_map
-        self.index_map = {}
-        for idx, item in enumerate(self.score_repo):
-            key = (item["case_path"], item["LorR"])
-            self.index_map[key] = idx
+        self.rebuild_index()
+        self._emit('reload', None, None, {})
 
         print(f"[OK] 已从 {path} 恢复状态")
 
+    @profiled("scorer.output_to_excel")
     def output_to_excel(self, path):
+        self.write_excel(self.excel_rows(), path)
+
+    def excel_rows(self):
+        """
+        Excel 导出的行（快照，与 snapshot 一样可以交给别的线程写盘）
+        """
         rows = []
 
-        for item in self.score_repo:
+        for record in self.score_repo:
+            item = record.to_dict()
             base_info = {
                 "case_path": item["case_path"],
                 "case_id": item["case_id"],
@@ -163,6 +593,12 @@ class Scorer:
             # 合并成一行
             row = {**base_info, **jsn_info, **be_info}
             rows.append(row)
+        return rows
+
+    @staticmethod
+    def write_excel(rows, path):
+        # pandas / openpyxl 只有导出时才用到，延迟导入以加快启动
+        import pandas as pd
 
         df = pd.DataFrame(rows)
 
@@ -0,0 +1,455 @@
+"""
+RA-Scorer 本地评分服务（asyncio，无第三方依赖）
+
+    python server.py session.json --port 8765
+
+接口（JSON）：
+    GET  /cases                              case 列表
+    GET  /cases/info?path=...&side=L         单侧 JSN / BE 分数
+    PUT  /cases/info?path=...&side=L         body: {"JSN": {...}, "BE": {...}}，只更新给出的关节
+    GET  /cases/reviewed?path=...            reviewed 标记
+    PUT  /cases/reviewed?path=...            body: {"reviewed": true}
+    GET  /export?format=json|xlsx            导出全部评分
+    POST /save                               保存会话 JSON（只写启动时指定的会话文件）
+    GET  /image?path=...                     原始图像字节，支持 Range
+    GET  /events                             Server-Sent Events，推送 Scorer 变更
+
+连接默认 keep-alive（HTTP/1.1），空闲 KEEPALIVE_TIMEOUT 秒后关闭。
+Scorer 只在事件循环线程中访问，不需要加锁；写盘前先在事件循环里取快照，
+线程池只负责写文件。
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import tempfile
+from urllib.parse import parse_qs, urlsplit
+
+from scorer import SCORE_SCALES, Scorer
+
+KEEPALIVE_TIMEOUT = 15.0
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+REASONS = {
+    200: "OK", 204: "No Content", 206: "Partial Content", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    416: "Range Not Satisfiable", 500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+        self.message = message or REASONS.get(status, "")
+
+
+class Request:
+    __slots__ = ('method', 'path', 'query', 'version', 'headers', 'body')
+
+    def __init__(self, method, target, version, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b'{}')
+        except ValueError:
+            raise HttpError(400, "Invalid JSON body")
+        if not isinstance(data, dict):
+            raise HttpError(400, "JSON body must be an object")
+        return data
+
+    def arg(self, name):
+        value = self.query.get(name)
+        if not value:
+            raise HttpError(400, f"Missing query parameter: {name}")
+        return value
+
+
+def parse_range(header, size):
+    """
+    解析单段 Range（bytes=a-b / bytes=a- / bytes=-n），返回 (start, end)，end 含
+    """
+    if not header.startswith('bytes=') or ',' in header:
+        raise HttpError(416)
+    start_s, _, end_s = header[6:].strip().partition('-')
+    try:
+        if start_s == '':
+            length = int(end_s)
+            if length <= 0:
+                raise HttpError(416)
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        raise HttpError(416)
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HttpError(416)
+    return start, end
+
+
+class ScoringServer:
+    """
+    server = ScoringServer(scorer, session_path)
+    asyncio.run(server.serve_forever(host, port))
+    """
+    def __init__(self, scorer, session_path=None):
+        self.scorer = scorer
+        self.session_path = session_path
+        self._event_queues = set()
+        self._server = None
+        self.scorer.subscribe(self._on_score_event)
+
+        self.routes = {
+            ('GET', '/cases'): self.list_cases,
+            ('GET', '/cases/info'): self.get_info,
+            ('PUT', '/cases/info'): self.update_info,
+            ('GET', '/cases/reviewed'): self.get_reviewed,
+            ('PUT', '/cases/reviewed'): self.set_reviewed,
+            ('POST', '/save'): self.save,
+        }
+        # 流式接口：自己负责写响应，返回是否保持连接
+        self.streams = {
+            ('GET', '/export'): self.stream_export,
+            ('GET', '/image'): self.stream_image,
+            ('GET', '/events'): self.stream_events,
+        }
+
+    # ====================================================
+    #  启动
+    # ====================================================
+    async def start(self, host="127.0.0.1", port=8765):
+        self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_HEADER_SIZE)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        host, port = await self.start(host, port)
+        print(f"Serving on http://{host}:{port}", flush=True)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for queue in list(self._event_queues):
+            queue.put_nowait(None)
+
+    # ====================================================
+    #  HTTP 连接处理
+    # ====================================================
+    async def _read_request(self, reader):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Header too large")
+
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Bad request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HttpError(400, "Bad Content-Length")
+        if length < 0 or length > MAX_BODY_SIZE:
+            raise HttpError(413)
+        body = await reader.readexactly(length) if length else b''
+        return Request(method, target, version, headers, body)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                key = (request.method, request.path)
+                keep_alive = request.keep_alive
+                try:
+                    if key in self.streams:
+                        keep_open = await self.streams[key](request, writer)
+                        if not keep_open:
+                            break
+                        continue
+                    handler = self.routes.get(key)
+                    if handler is None:
+                        known = {path for _, path in self.routes} | {path for _, path in self.streams}
+                        raise HttpError(405 if request.path in known else 404)
+                    status, payload = await handler(request)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except ValueError as e:
+                    # 请求内容不合法（关节名等）
+                    status, payload = 400, {"error": str(e)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    # 服务端错误：流式接口可能已经发出了部分响应，之后关闭连接
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                    keep_alive = False
+
+                await self._send_json(writer, status, payload, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, body=b'', content_type='application/json',
+                    headers=None, keep_alive=True):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, keep_alive=True):
+        body = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await self._send(writer, status, body, keep_alive=keep_alive)
+
+    # ====================================================
+    #  Scorer 接口
+    # ====================================================
+    def _require_case(self, case_path, LorR=None):
+        found = self.scorer.has_info(case_path, LorR) if LorR else self.scorer.has_case(case_path)
+        if not found:
+            raise HttpError(404, f"Unknown case: {case_path}")
+
+    async def list_cases(self, request):
+        cases = {}
+        for record in self.scorer.score_repo:
+            case = cases.setdefault(record.case_path, {
+                "case_path": record.case_path,
+                "case_id": record.case_id,
+                "case_name": record.case_name,
+                "reviewed": record.reviewed,
+                "sides": [],
+            })
+            case["sides"].append(record.LorR)
+        return 200, list(cases.values())
+
+    async def get_info(self, request):
+        case_path, LorR = request.arg('path'), request.arg('side')
+        self._require_case(case_path, LorR)
+        JSN, BE = self.scorer.get_info(case_path, LorR)
+        return 200, {"case_path": case_path, "LorR": LorR, "JSN": JSN, "BE": BE}
+
+    async def update_info(self, request):
+        case_path, LorR = request.arg('path'), request.arg('side')
+        self._require_case(case_path, LorR)
+        body = request.json()
+
+        updates = {mode: body.get(mode) or {} for mode in ("JSN", "BE")}
+        for mode, values in updates.items():
+            if not isinstance(values, dict):
+                raise HttpError(400, f"{mode} must be an object")
+            # 只接受量表内的整数（null 表示清空），与界面下拉框一致
+            invalid = {joint: value for joint, value in values.items()
+                       if value is not None and (type(value) is not int or value not in SCORE_SCALES[mode])}
+            if invalid:
+                raise HttpError(400, f"{mode} scores must be one of {list(SCORE_SCALES[mode])} or null: {invalid}")
+
+        JSN, BE = self.scorer.get_info(case_path, LorR)
+        JSN.update(updates["JSN"])
+        BE.update(updates["BE"])
+        self.scorer.update_info(case_path, LorR, JSN, BE)
+
+        JSN, BE = self.scorer.get_info(case_path, LorR)
+        return 200, {"case_path": case_path, "LorR": LorR, "JSN": JSN, "BE": BE}
+
+    async def get_reviewed(self, request):
+        case_path = request.arg('path')
+        self._require_case(case_path)
+        return 200, {"case_path": case_path, "reviewed": self.scorer.get_reviewed(case_path)}
+
+    async def set_reviewed(self, request):
+        case_path = request.arg('path')
+        self._require_case(case_path)
+        state = bool(request.json().get("reviewed", True))
+        self.scorer.set_reviewed(case_path, state)
+        return 200, {"case_path": case_path, "reviewed": state}
+
+    async def save(self, request):
+        # 只允许写会话文件本身，不接受客户端指定的任意路径
+        path = request.json().get("path")
+        if not self.session_path:
+            raise HttpError(400, "No session path")
+        if path is not None and os.path.abspath(str(path)) != os.path.abspath(self.session_path):
+            raise HttpError(400, "Saving is only allowed to the session file")
+        data = self.scorer.snapshot()
+        await asyncio.get_running_loop().run_in_executor(None, Scorer.write_json, data, self.session_path)
+        return 200, {"saved": self.session_path}
+
+    # ====================================================
+    #  流式接口
+    # ====================================================
+    async def stream_export(self, request, writer):
+        fmt = request.query.get('format', 'json')
+        if fmt == 'json':
+            payload = [record.to_dict() for record in self.scorer.score_repo]
+            await self._send_json(writer, 200, payload, keep_alive=request.keep_alive)
+            return request.keep_alive
+        if fmt != 'xlsx':
+            raise HttpError(400, f"Unsupported format: {fmt}")
+
+        # 在事件循环里取行快照，线程池只负责写临时文件，写完后整体发送
+        rows = self.scorer.excel_rows()
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, Scorer.write_excel, rows, path)
+            with open(path, "rb") as f:
+                body = f.read()
+        finally:
+            os.remove(path)
+        await self._send(
+            writer, 200, body,
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": 'attachment; filename="RAScorer.xlsx"'},
+            keep_alive=request.keep_alive,
+        )
+        return request.keep_alive
+
+    async def stream_image(self, request, writer):
+        case_path = request.arg('path')
+        # 只允许访问会话中登记过的图像
+        self._require_case(case_path)
+        try:
+            size = os.path.getsize(case_path)
+        except OSError:
+            raise HttpError(404, f"Image not found: {case_path}")
+
+        content_type = mimetypes.guess_type(case_path)[0] or 'application/octet-stream'
+        range_header = request.headers.get('range')
+        if range_header:
+            start, end = parse_range(range_header, size)
+            status = 206
+            extra = {"Content-Range": f"bytes {start}-{end}/{size}"}
+        else:
+            start, end, status, extra = 0, size - 1, 200, {}
+        extra["Accept-Ranges"] = "bytes"
+        length = end - start + 1
+
+        keep_alive = request.keep_alive
+        head = [f"HTTP/1.1 {status} {REASONS[status]}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {length}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{k}: {v}" for k, v in extra.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1'))
+
+        loop = asyncio.get_running_loop()
+        with open(case_path, "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = await loop.run_in_executor(None, f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+                remaining -= len(chunk)
+        # 文件在发送途中变短：已声明的 Content-Length 无法满足，只能关闭连接
+        return keep_alive and remaining == 0
+
+    async def stream_events(self, request, writer):
+        """
+        Server-Sent Events：每个 Scorer 变更推送一条 data: {...}
+        """
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n"
+                     b": connected\n\n")
+        await writer.drain()
+
+        queue = asyncio.Queue()
+        self._event_queues.add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")   # 心跳，防止中间代理断开
+                    await writer.drain()
+                    continue
+                if event is None:
+                    break
+                writer.write(b"data: " + json.dumps(event, ensure_ascii=False).encode('utf-8') + b"\n\n")
+                await writer.drain()
+        finally:
+            self._event_queues.discard(queue)
+        return False
+
+    def _on_score_event(self, event):
+        if not self._event_queues:
+            return
+        if event.kind == 'reload':
+            # relocate 发出的 reload 带 {旧路径: 新路径}
+            changes = [{"old": old, "new": new} for old, new in event.changes.items()]
+        else:
+            changes = [
+                {"mode": mode, "joint": joint, "old": old, "new": new}
+                for (mode, joint), (old, new) in event.changes.items()
+            ]
+        payload = {
+            "kind": event.kind,
+            "case_path": event.case_path,
+            "LorR": event.LorR,
+            "changes": changes,
+        }
+        for queue in self._event_queues:
+            queue.put_nowait(payload)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RA-Scorer local scoring server")
+    parser.add_argument("session", nargs="?", help="会话 JSON（Scorer.save_to_json 的输出）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    scorer = Scorer()
+    if args.session and os.path.exists(args.session):
+        scorer.load_from_json(args.session)
+
+    try:
+        asyncio.run(ScoringServer(scorer, args.session).serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
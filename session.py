@@ -0,0 +1,494 @@
+"""
+多阅片者并发会话
+
+同一个会话 JSON（例如 RAScorer_xxx.json）旁边放一个目录 RAScorer_xxx.json.readers/，
+每位阅片者一个只追加的变更文件 <reader>.jsonl，每行一条单元格级别的变更：
+
+    {"ts": 1700000000.0, "reader": "alice", "case_path": "...", "LorR": "L",
+     "mode": "JSN", "joint": "MCP-T", "value": 2, "case_id": "...", "case_name": "..."}
+
+- 写入变更文件时持有咨询锁（fcntl.flock / msvcrt.locking），多进程追加互不覆盖
+- MergeEngine 以 (case_path, LorR, mode, joint) 为粒度合并各阅片者的最新值，
+  不同阅片者给出不同值时记为冲突（默认取时间戳最新的值）
+- ConsolidatedView 记录每个变更文件已读到的偏移量，refresh() 只读新增部分
+"""
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
+from scorer import REVIEWED, SVDH_SCHEMA
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+def changeset_dir(session_path):
+    return f"{session_path}.readers"
+
+
+def _safe_name(reader):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', reader) or 'reader'
+
+
+# ================================
+#        咨询文件锁
+# ================================
+class FileLock:
+    """
+    with FileLock(path):            # 独占锁
+    with FileLock(path, shared=True):  # 共享锁（Windows 下退化为独占）
+
+    锁加在 path + '.lock' 上，不影响数据文件本身的读写。
+    """
+    def __init__(self, path, shared=False, timeout=10.0, poll=0.01):
+        self.lock_path = f"{path}.lock"
+        self.shared = shared
+        self.timeout = timeout
+        self.poll = poll
+        self._fh = None
+
+    def acquire(self):
+        self._fh = open(self.lock_path, "a+b")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if fcntl is not None:
+                    mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                    fcntl.flock(self._fh.fileno(), mode | fcntl.LOCK_NB)
+                else:
+                    self._fh.seek(0)
+                    msvcrt.locking(self._fh.fileno(), msvcrt.LK_NBLCK, 1)
+                return self
+            except OSError:
+                if time.monotonic() >= deadline:
+                    self._fh.close()
+                    self._fh = None
+                    raise TimeoutError(f"Lock timeout: {self.lock_path}")
+                time.sleep(self.poll)
+
+    def release(self):
+        if self._fh is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            else:
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+# ================================
+#        单元格快照
+# ================================
+def scorer_cells(scorer, case_paths=None):
+    """
+    把 Scorer 展开成 {(case_path, LorR, mode, joint): value}
+    case_paths 不为 None 时只展开这些 case
+    """
+    jsn_keys, be_keys = SVDH_SCHEMA.jsn_keys, SVDH_SCHEMA.be_keys
+    if case_paths is None:
+        records = scorer.score_repo
+    else:
+        records = []
+        for case_path in case_paths:
+            for LorR in ('L', 'R'):
+                idx = scorer.index_map.get((case_path, LorR), -1)
+                if idx >= 0:
+                    records.append(scorer.score_repo[idx])
+
+    cells = {}
+    for record in records:
+        base = (record.case_path, record.LorR)
+        for joint, value in zip(jsn_keys, record.jsn):
+            cells[base + ('JSN', joint)] = value
+        for joint, value in zip(be_keys, record.be):
+            cells[base + ('BE', joint)] = value
+        cells[base + (REVIEWED, '')] = record.reviewed
+    return cells
+
+
+def apply_cells(scorer, cells, case_names=None):
+    """
+    把 {(case_path, LorR, mode, joint): value} 写回 Scorer，缺失的 case 自动新建。
+    case_names: {case_path: (case_id, case_name)}，新建 case 时使用
+    """
+    case_names = case_names or {}
+    grouped = {}
+    for (case_path, LorR, mode, joint), value in cells.items():
+        grouped.setdefault((case_path, LorR), []).append((mode, joint, value))
+
+    with scorer.transaction():
+        missing = [key for key in grouped if scorer.index_map.get(key, -1) < 0]
+        for case_path, LorR in missing:
+            case_id, case_name = case_names.get(case_path, (None, None))
+            if case_id is None:
+                case_id = case_name = os.path.splitext(os.path.basename(case_path))[0]
+            scorer.new_info(case_path, case_id, case_name, LorR)
+
+        updates = []
+        for (case_path, LorR), items in grouped.items():
+            JSN, BE = scorer.get_info(case_path, LorR)
+            for mode, joint, value in items:
+                if mode == 'JSN':
+                    JSN[joint] = value
+                elif mode == 'BE':
+                    BE[joint] = value
+                elif mode == REVIEWED:
+                    # 只改该单元格所在的一侧：case 可能只有一侧记录
+                    record = scorer.score_repo[scorer._require_index(case_path, LorR)]
+                    scorer._set_reviewed_record(record, bool(value))
+            updates.append((case_path, LorR, JSN, BE))
+        scorer.update_many(updates)
+
+
+# ================================
+#        单个阅片者的变更集
+# ================================
+class ReaderSession:
+    """
+    记录一位阅片者相对 baseline 的修改，并追加到 <session>.readers/<reader>.jsonl
+    """
+    def __init__(self, session_path, reader):
+        self.session_path = session_path
+        self.reader = reader
+        self.path = os.path.join(changeset_dir(session_path), f"{_safe_name(reader)}.jsonl")
+        self._baseline = {}
+
+    def reset_baseline(self, scorer):
+        self._baseline = scorer_cells(scorer)
+
+    def relocate(self, mapping):
+        """
+        mapping: {旧路径: 新路径}，与 Scorer.relocate 一起调用，移动过的 case 不会被当成新修改
+        """
+        self._baseline = {(mapping.get(key[0], key[0]),) + key[1:]: value
+                          for key, value in self._baseline.items()}
+
+    def absorb(self, cells):
+        """
+        其他阅片者的变更被应用到本地 Scorer 后调用，避免下次 commit 时当成自己的修改
+        """
+        self._baseline.update(cells)
+
+    def diff(self, scorer, case_paths=None):
+        current = scorer_cells(scorer, case_paths)
+        baseline = self._baseline
+        changes = {}
+        for key, value in current.items():
+            if key in baseline:
+                if baseline[key] != value:
+                    changes[key] = value
+            elif value is not None and value is not False:
+                # baseline 中没有的新 case，只记录已填写的单元格
+                changes[key] = value
+        return changes
+
+    def local_edits(self, scorer, keys):
+        """
+        keys 中本阅片者已修改、尚未 commit 的单元格；合并其他阅片者的变更时
+        不能覆盖这些单元格，也不能 absorb 进 baseline
+        """
+        changes = self.diff(scorer, {key[0] for key in keys})
+        return {key for key in keys if key in changes}
+
+    def commit(self, scorer, case_paths=None):
+        """
+        把当前 Scorer 与 baseline 的差异追加到变更文件，返回写入的变更数
+        """
+        changes = self.diff(scorer, case_paths)
+        if not changes:
+            return 0
+
+        ts = time.time()
+        names = {}
+        lines = []
+        for (case_path, LorR, mode, joint), value in changes.items():
+            if case_path not in names:
+                idx = scorer.index_map.get((case_path, LorR), -1)
+                record = scorer.score_repo[idx]
+                names[case_path] = (record.case_id, record.case_name)
+            case_id, case_name = names[case_path]
+            lines.append(json.dumps({
+                "ts": ts, "reader": self.reader,
+                "case_path": case_path, "LorR": LorR, "mode": mode, "joint": joint,
+                "value": value, "case_id": case_id, "case_name": case_name,
+            }, ensure_ascii=False))
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with FileLock(self.path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._baseline.update(changes)
+        return len(changes)
+
+
+# ================================
+#        合并
+# ================================
+Conflict = namedtuple('Conflict', ['key', 'values', 'chosen'])
+# key:    (case_path, LorR, mode, joint)
+# values: {reader: value}，各阅片者对该单元格的最新值
+# chosen: 合并后采用的值
+
+
+class MergeEngine:
+    """
+    按单元格保存每位阅片者的最新值；同一单元格多位阅片者取值不同即为冲突，
+    合并结果取时间戳最新者（时间戳相同按 reader 名排序）
+    """
+    def __init__(self):
+        self.cells = {}      # key → {reader: (ts, value)}
+        self.case_names = {}  # case_path → (case_id, case_name)
+        self.aliases = {}    # 旧路径 → 新路径（relocate 之后其他阅片者仍可能写旧路径）
+
+    def add(self, change):
+        case_path = self.aliases.get(change["case_path"], change["case_path"])
+        key = (case_path, change["LorR"], change["mode"], change["joint"])
+        per_reader = self.cells.setdefault(key, {})
+        old = per_reader.get(change["reader"])
+        if old is None or old[0] <= change["ts"]:
+            per_reader[change["reader"]] = (change["ts"], change["value"])
+        if change.get("case_id") is not None:
+            self.case_names.setdefault(case_path, (change["case_id"], change["case_name"]))
+        return key
+
+    def relocate(self, mapping):
+        """
+        mapping: {旧路径: 新路径}；已合并的单元格改到新路径，之后读到的旧路径变更也归到新路径
+        """
+        for old, new in mapping.items():
+            self.aliases[old] = new
+        # 链式移动：a → b 之后又 b → c，a 也指向 c
+        for old, new in self.aliases.items():
+            self.aliases[old] = mapping.get(new, new)
+        cells = {}
+        for key, per_reader in self.cells.items():
+            key = (mapping.get(key[0], key[0]),) + key[1:]
+            merged = cells.setdefault(key, {})
+            for reader, (ts, value) in per_reader.items():
+                if reader not in merged or merged[reader][0] <= ts:
+                    merged[reader] = (ts, value)
+        self.cells = cells
+        self.case_names = {mapping.get(path, path): names for path, names in self.case_names.items()}
+
+    def resolve(self, key):
+        per_reader = self.cells[key]
+        reader = max(per_reader, key=lambda r: (per_reader[r][0], r))
+        return per_reader[reader][1]
+
+    def conflict(self, key):
+        per_reader = self.cells.get(key, {})
+        values = {reader: value for reader, (_, value) in per_reader.items()}
+        if len(set(map(json.dumps, values.values()))) <= 1:
+            return None
+        return Conflict(key, values, self.resolve(key))
+
+    def merged(self, keys=None):
+        keys = self.cells if keys is None else keys
+        return {key: self.resolve(key) for key in keys if key in self.cells}
+
+    def conflicts(self, keys=None):
+        keys = self.cells if keys is None else keys
+        result = []
+        for key in keys:
+            conflict = self.conflict(key)
+            if conflict is not None:
+                result.append(conflict)
+        return result
+
+
+# ================================
+#        合并视图（增量刷新）
+# ================================
+class ConsolidatedView:
+    """
+    view = ConsolidatedView(session_path)
+    changed = view.refresh()     # 只读取各变更文件的新增行
+    view.apply_to(scorer, changed)
+    """
+    def __init__(self, session_path):
+        self.session_path = session_path
+        self.dir = changeset_dir(session_path)
+        self.engine = MergeEngine()
+        self._offsets = {}   # 变更文件 → 已读取的字节偏移
+
+    def readers(self):
+        return sorted({reader for per_reader in self.engine.cells.values() for reader in per_reader})
+
+    def refresh(self):
+        """
+        读取新增变更，返回本次有变化的单元格 key 集合
+        """
+        changed = set()
+        if not os.path.isdir(self.dir):
+            return changed
+
+        for name in sorted(os.listdir(self.dir)):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(self.dir, name)
+            offset = self._offsets.get(path, 0)
+            try:
+                if os.path.getsize(path) <= offset:
+                    continue
+            except OSError:
+                continue
+
+            with FileLock(path, shared=True):
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read()
+
+            # 只处理完整的行，半行留到下次
+            end = chunk.rfind(b"\n") + 1
+            for line in chunk[:end].splitlines():
+                if line.strip():
+                    changed.add(self.engine.add(json.loads(line)))
+            self._offsets[path] = offset + end
+
+        return changed
+
+    def merged(self, keys=None):
+        return self.engine.merged(keys)
+
+    def relocate(self, mapping):
+        self.engine.relocate(mapping)
+
+    def conflicts(self, keys=None):
+        return self.engine.conflicts(keys)
+
+    def apply_to(self, scorer, keys=None, exclude_cases=(), exclude_keys=()):
+        """
+        把合并结果写回 Scorer，返回实际写入的单元格 {key: value}
+        exclude_cases: 不写入的 case_path（例如界面上正在编辑的 case）
+        exclude_keys:  不写入的单元格（例如 ReaderSession.local_edits 给出的未提交修改）
+        """
+        merged = self.engine.merged(keys)
+        if exclude_cases or exclude_keys:
+            exclude_cases, exclude_keys = set(exclude_cases), set(exclude_keys)
+            merged = {key: value for key, value in merged.items()
+                      if key[0] not in exclude_cases and key not in exclude_keys}
+        if merged:
+            apply_cells(scorer, merged, self.engine.case_names)
+        return merged
+
+
+# ================================
+#        多进程测试
+# ================================
+def _reader_process(session_path, reader, case_paths, rounds, seed):
+    import random
+    from scorer import Scorer
+
+    rng = random.Random(seed)
+    scorer = Scorer()
+    scorer.new_cases((p, os.path.basename(p)[:-4], os.path.basename(p)[:-4], LorR)
+                     for p in case_paths for LorR in ('L', 'R'))
+    session = ReaderSession(session_path, reader)
+    session.reset_baseline(scorer)
+
+    for _ in range(rounds):
+        case_path = rng.choice(case_paths)
+        LorR = rng.choice('LR')
+        JSN, BE = scorer.get_info(case_path, LorR)
+        JSN[rng.choice(SVDH_SCHEMA.jsn_keys)] = rng.randint(0, 4)
+        BE[rng.choice(SVDH_SCHEMA.be_keys)] = rng.choice((0, 1, 2, 3, 5))
+        scorer.update_info(case_path, LorR, JSN, BE)
+        session.commit(scorer, [case_path])
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    import tempfile
+    from scorer import Scorer
+
+    tmp_dir = tempfile.mkdtemp(prefix="rascorer_session_")
+    session_path = os.path.join(tmp_dir, "session.json")
+    case_paths = [f"/data/IMAGE{i:03d}_20110111.bmp" for i in range(20)]
+    # 两个进程共用 carol 的变更文件，验证同一文件的并发追加
+    readers = ["alice", "bob", "carol", "carol"]
+    rounds = 200
+
+    view = ConsolidatedView(session_path)
+    procs = [
+        multiprocessing.Process(target=_reader_process,
+                                args=(session_path, reader, case_paths, rounds, i))
+        for i, reader in enumerate(readers)
+    ]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+
+    # 写入进行中就开始增量刷新
+    refreshes = 0
+    while any(p.is_alive() for p in procs):
+        view.refresh()
+        refreshes += 1
+        time.sleep(0.01)
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0, p.exitcode
+    changed = view.refresh()
+    elapsed = time.perf_counter() - t0
+
+    total_lines = 0
+    for reader in sorted(set(readers)):
+        with open(os.path.join(changeset_dir(session_path), f"{reader}.jsonl"), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        # 每一行都必须是完整 JSON，说明并发追加没有互相覆盖
+        for line in lines:
+            json.loads(line)
+        total_lines += len(lines)
+
+    merged = view.merged()
+    conflicts = view.conflicts()
+    print(f"{len(readers)} readers x {rounds} rounds in {elapsed:.2f}s, "
+          f"{refreshes} incremental refreshes, last refresh {len(changed)} keys")
+    print(f"change lines: {total_lines}, merged cells: {len(merged)}, conflicts: {len(conflicts)}")
+    for conflict in conflicts[:5]:
+        print("  ", conflict.key, conflict.values, "->", conflict.chosen)
+
+    scorer = Scorer()
+    view.apply_to(scorer)
+    print("consolidated cases:", len(scorer.get_file_list() or []))
+
+    # 未提交的本地修改不被其他阅片者的变更覆盖，并报告为冲突
+    local = ReaderSession(session_path, "dave")
+    local.reset_baseline(scorer)
+    case_path = case_paths[0]
+    JSN, BE = scorer.get_info(case_path, 'L')
+    JSN['MCP-T'] = 4 if JSN['MCP-T'] != 4 else 3
+    scorer.update_info(case_path, 'L', JSN, BE)
+    remote = ReaderSession(session_path, "erin")
+    remote_scorer = Scorer()
+    view.apply_to(remote_scorer)
+    remote.reset_baseline(remote_scorer)
+    remote_JSN, remote_BE = remote_scorer.get_info(case_path, 'L')
+    remote_JSN['MCP-T'] = 1 if JSN['MCP-T'] != 1 else 2
+    remote_scorer.update_info(case_path, 'L', remote_JSN, remote_BE)
+    remote.commit(remote_scorer)
+
+    changed = view.refresh()
+    kept = local.local_edits(scorer, changed)
+    applied = view.apply_to(scorer, changed, exclude_keys=kept)
+    local.absorb(applied)
+    assert kept == {(case_path, 'L', 'JSN', 'MCP-T')}, kept
+    assert scorer.get_info(case_path, 'L')[0]['MCP-T'] == JSN['MCP-T']
+    assert local.diff(scorer) == {(case_path, 'L', 'JSN', 'MCP-T'): JSN['MCP-T']}
+    print("local edits kept across refresh:", len(kept))
@@ -0,0 +1,382 @@
+"""
+工作列表分片：一个文件夹分给多位阅片者，各自的会话 JSON 再合并回一个 Scorer
+
+    plan = plan_shards(paths, ["alice", "bob", "carol"], weights=estimate_times(paths, telemetry),
+                       group_patients=True, overlap=0.1)
+    plan.save("trial.shards.json")
+    write_shard_sessions(plan, "shards/")               # shards/<reader>.json，case 已建好，直接在界面里打开
+    ...
+    merged, report = merge_shards({"alice": "shards/alice.json", ...}, plan)
+    merged.save_to_json("trial.json")
+
+    python sharding.py plan <folder> <out_dir> --readers alice,bob,carol [--overlap 0.1] [--by-patient]
+    python sharding.py merge <out_dir>/plan.json <out_dir>/*.json -o merged.json
+
+分片：
+- 权重默认每个 case 为 1（按数量平均）；给出 weights（例如按阅片耗时估计）时按权重平均
+- group_patients：同一病人的所有随访分给同一位阅片者
+- 按权重从大到小依次分给当前负担最轻的阅片者（LPT 贪心），最重与最轻的差不超过最重的一组
+- overlap：随机抽取这一比例的组，再额外分给一位阅片者，用于一致性检验
+
+合并以 (case_path, LorR) 为键：
+- 计划内的重叠 case 取主阅片者的结果，另一份用于统计一致率
+- 计划外的重复、计划里有但没有任何会话包含的 case、只有一侧的 case、未打完分的 case 都列在报告里
+"""
+import json
+import os
+import random
+import statistics
+import sys
+
+from navigation import split_case_id
+from scorer import Scorer, SVDH_SCHEMA
+
+DEFAULT_SECONDS = 120.0
+
+
+# ================================
+#        分片计划
+# ================================
+class ShardPlan:
+    def __init__(self, assignments, primary, weights=None):
+        self.assignments = assignments      # reader → [path]（含重叠 case）
+        self.primary = primary              # path → 主阅片者
+        self.weights = weights or {}
+
+    @property
+    def overlap(self):
+        """
+        path → [额外阅片者]
+        """
+        extra = {}
+        for reader, paths in self.assignments.items():
+            for path in paths:
+                if self.primary[path] != reader:
+                    extra.setdefault(path, []).append(reader)
+        return extra
+
+    def loads(self):
+        return {reader: sum(self.weights.get(p, 1.0) for p in paths) for reader, paths in self.assignments.items()}
+
+    def to_dict(self):
+        return {"assignments": self.assignments, "primary": self.primary, "weights": self.weights}
+
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["assignments"], data["primary"], data.get("weights"))
+
+
+def estimate_times(paths, telemetry=None, default=DEFAULT_SECONDS):
+    """
+    每个 case 的预计阅片秒数：telemetry 里有记录的取各阅片者有效时长的均值，
+    其余取已知 case 的中位数（都没有时为 default）
+    """
+    known = {}
+    if telemetry is not None:
+        per_case = {}
+        for (case_path, _), item in telemetry.per_case().items():
+            per_case.setdefault(case_path, []).append(item['active'])
+        known = {path: statistics.fmean(times) for path, times in per_case.items()}
+    fallback = statistics.median(known.values()) if known else default
+    return {path: known.get(path, fallback) for path in paths}
+
+
+def _groups(paths, group_patients):
+    if not group_patients:
+        return [[path] for path in paths]
+    groups = {}
+    for path in paths:
+        case_id = os.path.splitext(os.path.basename(path))[0].lower()
+        patient, date = split_case_id(case_id)
+        groups.setdefault(patient if date else path, []).append(path)
+    return list(groups.values())
+
+
+def plan_shards(paths, readers, weights=None, group_patients=False, overlap=0.0, seed=0):
+    """
+    返回 ShardPlan；每位阅片者的列表保持 paths 中的原有顺序
+    """
+    readers = list(readers)
+    if not readers:
+        raise ValueError("At least one reader is needed")
+    if overlap and len(readers) < 2:
+        raise ValueError("Overlap cases need at least two readers")
+    paths = list(dict.fromkeys(paths))
+    weights = dict(weights) if weights else {}
+    weight = lambda group: sum(weights.get(p, 1.0) for p in group)
+
+    groups = _groups(paths, group_patients)
+    load = dict.fromkeys(readers, 0.0)
+    owners = {}     # group 下标 → [reader]
+    # 重的先分；权重相同时按原有顺序，结果可复现
+    for i in sorted(range(len(groups)), key=lambda i: -weight(groups[i])):
+        reader = min(readers, key=load.__getitem__)
+        owners[i] = [reader]
+        load[reader] += weight(groups[i])
+
+    n_overlap = round(len(groups) * overlap)
+    for i in sorted(random.Random(seed).sample(range(len(groups)), n_overlap)):
+        reader = min((r for r in readers if r not in owners[i]), key=load.__getitem__)
+        owners[i].append(reader)
+        load[reader] += weight(groups[i])
+
+    order = {path: row for row, path in enumerate(paths)}
+    assignments = {reader: [] for reader in readers}
+    primary = {}
+    for i, group in enumerate(groups):
+        for path in group:
+            primary[path] = owners[i][0]
+            for reader in owners[i]:
+                assignments[reader].append(path)
+    for reader in readers:
+        assignments[reader].sort(key=order.__getitem__)
+    return ShardPlan(assignments, primary, {p: weights[p] for p in paths if p in weights})
+
+
+def write_shard_sessions(plan, out_dir):
+    """
+    每位阅片者一个会话 JSON（<out_dir>/<reader>.json），case 的 L / R 记录已建好；返回 {reader: path}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    for reader, paths in plan.assignments.items():
+        scorer = Scorer()
+        cases = []
+        for path in paths:
+            case_id = os.path.splitext(os.path.basename(path))[0]
+            cases.extend((path, case_id, case_id, LorR) for LorR in ('L', 'R'))
+        scorer.new_cases(cases)
+        written[reader] = os.path.join(out_dir, f"{reader}.json")
+        scorer.save_to_json(written[reader])
+    return written
+
+
+# ================================
+#        合并
+# ================================
+def _complete(record):
+    return None not in record.jsn and None not in record.be
+
+
+def merge_shards(sessions, plan=None):
+    """
+    sessions: {reader: 会话 JSON 路径或 Scorer}；返回 (Scorer, report)
+
+    report:
+        duplicates   计划外出现在多个会话里的 (case_path, LorR, [readers])，取先出现的
+        missing      计划里有、但没有任何会话包含的 case_path
+        missing_sides  计划里有、会话里只出现了另一侧的 (case_path, LorR)
+        unexpected   不在计划里的 case_path（没有 plan 时为空）
+        incomplete   合并结果中还有关节未打分的 (case_path, LorR)
+        overlap      {'cells', 'agree', 'rate', 'disagreements': [(case_path, LorR, mode, joint, {reader: value})]}
+    """
+    primary = plan.primary if plan is not None else {}
+    merged = []
+    index = {}          # (case_path, LorR) → (merged 下标, reader)
+    seen = {}           # (case_path, LorR) → [reader]
+    others = []         # (reader, record) 重叠 / 重复的另一份
+    for reader, session in sessions.items():
+        if isinstance(session, Scorer):
+            records = session.score_repo
+        else:
+            with open(session, encoding="utf-8") as f:
+                records = [SVDH_SCHEMA.record_from_dict(item) for item in json.load(f).get("score_repo", [])]
+        for record in records:
+            key = (record.case_path, record.LorR)
+            seen.setdefault(key, []).append(reader)
+            if key not in index:
+                index[key] = (len(merged), reader)
+                merged.append(record)
+                continue
+            # 主阅片者的结果优先
+            i, kept = index[key]
+            if primary.get(record.case_path) == reader and kept != reader:
+                others.append((kept, merged[i]))
+                merged[i] = record
+                index[key] = (i, reader)
+            else:
+                others.append((reader, record))
+
+    overlap = plan.overlap if plan is not None else {}
+    duplicates = [(path, LorR, readers) for (path, LorR), readers in seen.items()
+                  if len(readers) > 1 and path not in overlap]
+
+    cells = agree = 0
+    disagreements = []
+    modes = (('JSN', SVDH_SCHEMA.jsn_keys, 'jsn'), ('BE', SVDH_SCHEMA.be_keys, 'be'))
+    for reader, record in others:
+        if record.case_path not in overlap:
+            continue
+        i, kept = index[(record.case_path, record.LorR)]
+        for mode, keys, attr in modes:
+            for joint, a, b in zip(keys, getattr(merged[i], attr), getattr(record, attr)):
+                if a is None or b is None:
+                    continue
+                cells += 1
+                if a == b:
+                    agree += 1
+                else:
+                    disagreements.append((record.case_path, record.LorR, mode, joint, {kept: a, reader: b}))
+
+    present = {path for path, _ in index}
+    planned = set(primary)
+    missing_sides = sorted((path, LorR) for path in planned & present for LorR in ('L', 'R')
+                           if (path, LorR) not in index)
+    scorer = Scorer()
+    scorer.score_repo = merged
+    scorer.rebuild_index()
+    report = {
+        "duplicates": duplicates,
+        "missing": sorted(planned - present),
+        "missing_sides": missing_sides,
+        "unexpected": sorted(present - planned) if plan is not None else [],
+        "incomplete": [(r.case_path, r.LorR) for r in merged if not _complete(r)],
+        "overlap": {"cells": cells, "agree": agree, "rate": agree / cells if cells else None,
+                    "disagreements": disagreements},
+    }
+    return scorer, report
+
+
+def format_report(report):
+    overlap = report["overlap"]
+    lines = [f"{len(report['missing'])} missing, {len(report['missing_sides'])} missing sides, "
+             f"{len(report['unexpected'])} unexpected, "
+             f"{len(report['duplicates'])} unplanned duplicates, {len(report['incomplete'])} incomplete sides"]
+    if overlap["cells"]:
+        lines.append(f"Overlap agreement: {overlap['agree']}/{overlap['cells']} cells ({overlap['rate']:.1%})")
+    return lines
+
+
+def _self_check():
+    import tempfile
+    import time
+
+    paths = [f"/data/P{i // 3:04d}_{20100101 + i % 3 * 10000}.bmp" for i in range(300)]
+    readers = ["alice", "bob", "carol"]
+
+    plan = plan_shards(paths, readers)
+    assert sorted(len(p) for p in plan.assignments.values()) == [100, 100, 100]
+    assert sorted(p for ps in plan.assignments.values() for p in ps) == sorted(paths)
+
+    weights = {p: (300.0 if i < 30 else 60.0) for i, p in enumerate(paths)}
+    plan = plan_shards(paths, readers, weights, group_patients=True, overlap=0.1, seed=1)
+    loads = plan.loads()
+    assert max(loads.values()) - min(loads.values()) <= 3 * 300.0
+    for reader_paths in plan.assignments.values():
+        # 同一病人的三次随访在同一位阅片者手里
+        patients = {p.rsplit("_", 1)[0] for p in reader_paths}
+        assert all(sum(p.startswith(pt + "_") for p in reader_paths) == 3 for pt in patients)
+    assert len(plan.overlap) == 30 and all(len(r) == 1 for r in plan.overlap.values())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plan.save(os.path.join(tmp, "plan.json"))
+        plan = ShardPlan.load(os.path.join(tmp, "plan.json"))
+        written = write_shard_sessions(plan, tmp)
+
+        # 各阅片者打分：重叠 case 上 bob 与别人有一处不同；carol 漏掉一个 case、另一个 case 只剩 L，
+        # alice 多读了一个计划外的 case
+        scorers = {}
+        for reader, path in written.items():
+            scorer = Scorer()
+            scorer.load_from_json(path)
+            full_jsn = dict.fromkeys(SVDH_SCHEMA.jsn_keys, 1)
+            full_be = dict.fromkeys(SVDH_SCHEMA.be_keys, 0)
+            updates = [(p, LorR, dict(full_jsn, **({"MCP-T": 2} if reader == "bob" else {})), full_be)
+                       for p in scorer.get_file_list() for LorR in ('L', 'R')]
+            scorer.update_many(updates)
+            scorers[reader] = scorer
+        dropped = next(p for p in plan.assignments["carol"] if p not in plan.overlap)
+        one_sided = next(p for p in plan.assignments["carol"] if p not in plan.overlap and p != dropped)
+        scorers["carol"].score_repo = [r for r in scorers["carol"].score_repo
+                                       if r.case_path != dropped and (r.case_path, r.LorR) != (one_sided, 'R')]
+        scorers["alice"].new_info("/data/extra.bmp", "extra", "extra", 'L')
+        stray = next(p for p in plan.assignments["bob"] if p not in plan.overlap)
+        scorers["alice"].new_info(stray, "stray", "stray", 'L')
+
+        merged, report = merge_shards(scorers, plan)
+        assert report["missing"] == [dropped] and report["unexpected"] == ["/data/extra.bmp"]
+        assert report["missing_sides"] == [(one_sided, 'R')]
+        assert report["duplicates"] == [(stray, 'L', ["alice", "bob"])]
+        assert ("/data/extra.bmp", 'L') in report["incomplete"]
+        bob_overlap = sum(1 for p, extra in plan.overlap.items() if "bob" in extra or plan.primary[p] == "bob")
+        assert len(report["overlap"]["disagreements"]) == 2 * bob_overlap
+        # 重叠 case 取主阅片者的结果
+        for p in plan.overlap:
+            expected = 2 if plan.primary[p] == "bob" else 1
+            assert merged.get_info(p, 'L')[0]["MCP-T"] == expected
+        print("\n".join(format_report(report)))
+
+    # 合并速度：10 位阅片者 × 1 万个 case
+    n, k = 100_000, 10
+    big = [f"/data/C{i:06d}.bmp" for i in range(n)]
+    plan = plan_shards(big, [f"r{i}" for i in range(k)], overlap=0.05)
+    shards = {}
+    for reader, reader_paths in plan.assignments.items():
+        scorer = Scorer()
+        scorer.new_cases((p, "id", "name", LorR) for p in reader_paths for LorR in ('L', 'R'))
+        shards[reader] = scorer
+    t0 = time.perf_counter()
+    merged, report = merge_shards(shards, plan)
+    elapsed = time.perf_counter() - t0
+    assert len(merged.score_repo) == 2 * n and not report["missing"] and not report["missing_sides"]
+    assert not report["duplicates"]
+    print(f"merge {k} shards, {sum(len(s.score_repo) for s in shards.values())} records: {elapsed * 1000:.0f} ms")
+    print("[OK] sharding")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    if len(sys.argv) == 1:
+        _self_check()
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Split a worklist among readers and merge their sessions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_plan = sub.add_parser("plan", help="Split a folder into per-reader session files")
+    p_plan.add_argument("folder")
+    p_plan.add_argument("out_dir")
+    p_plan.add_argument("--readers", required=True, help="Comma-separated reader names")
+    p_plan.add_argument("--overlap", type=float, default=0.0, help="Fraction of cases read twice")
+    p_plan.add_argument("--by-patient", action="store_true", help="Keep all visits of a patient together")
+    p_plan.add_argument("--audit", help="<session>.audit.sqlite with reading times to balance by")
+    p_plan.add_argument("--seed", type=int, default=0)
+    p_merge = sub.add_parser("merge", help="Merge per-reader sessions into one")
+    p_merge.add_argument("plan")
+    p_merge.add_argument("sessions", nargs="+")
+    p_merge.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        from image_io import REGISTRY
+
+        folder = os.path.abspath(args.folder)
+        paths = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+                 if os.path.isfile(os.path.join(folder, f)) and REGISTRY.is_supported(os.path.join(folder, f))]
+        weights = None
+        if args.audit:
+            from audit import AuditLog
+            from telemetry import Telemetry
+
+            weights = estimate_times(paths, Telemetry(AuditLog(args.audit)))
+        plan = plan_shards(paths, args.readers.split(","), weights, args.by_patient, args.overlap, args.seed)
+        os.makedirs(args.out_dir, exist_ok=True)
+        plan.save(os.path.join(args.out_dir, "plan.json"))
+        write_shard_sessions(plan, args.out_dir)
+        for reader, load in plan.loads().items():
+            print(f"{reader}: {len(plan.assignments[reader])} cases, load {load:.0f}")
+    else:
+        plan = ShardPlan.load(args.plan)
+        sessions = {os.path.splitext(os.path.basename(path))[0]: path
+                    for path in args.sessions if os.path.abspath(path) != os.path.abspath(args.plan)}
+        merged, report = merge_shards(sessions, plan)
+        merged.save_to_json(args.output)
+        print("\n".join(format_report(report)))
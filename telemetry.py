@@ -0,0 +1,280 @@
+"""
+阅片耗时统计
+
+    telemetry = Telemetry(audit, scorer)    # 与审计日志共用 <session>.audit.sqlite
+    telemetry.enter(case_path)              # 切换到某个 case（同时结束上一个 case 的访问）
+    telemetry.touch()                       # 键盘 / 鼠标操作
+    telemetry.leave()                       # 关闭窗口、换会话
+
+    telemetry.report()                      # {reader: {'cases', 'active_hours', 'cases_per_hour', ...}}
+    telemetry.slowest_joints()              # [((mode, joint), 平均秒数, 次数)]
+    python telemetry.py <session>.audit.sqlite   # 命令行打印汇总
+
+每次进入一个 case 记为一次访问（visits 表一行）：
+- dwell：进入到离开的总时长
+- active：相邻两次操作间隔超过 IDLE_SECONDS 的部分视为离开，不计入
+- edits：访问期间改动的单元格数（不含 reviewed 标记）
+- reviewed_after：本次访问中标记 reviewed 时已累计的 active 秒数，没有标记为 NULL
+关节耗时取审计日志中同一次访问内相邻两次修改的间隔（第一次修改从进入 case 算起）。
+"""
+import sys
+import time
+
+from audit import AuditLog
+from scorer import REVIEWED
+
+IDLE_SECONDS = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS visits (
+    reader         INTEGER NOT NULL REFERENCES readers(id),
+    case_          INTEGER NOT NULL REFERENCES cases(id),
+    start          REAL    NOT NULL,
+    end            REAL    NOT NULL,
+    active         REAL    NOT NULL,
+    edits          INTEGER NOT NULL,
+    reviewed_after REAL
+);
+CREATE INDEX IF NOT EXISTS visits_reader ON visits (reader, start);
+CREATE INDEX IF NOT EXISTS visits_case   ON visits (case_, start);
+"""
+
+
+class _Visit:
+    __slots__ = ('case_path', 'start', 'last', 'active', 'edits', 'reviewed_after')
+
+    def __init__(self, case_path, now):
+        self.case_path = case_path
+        self.start = now
+        self.last = now
+        self.active = 0.0
+        self.edits = 0
+        self.reviewed_after = None
+
+
+class Telemetry:
+    def __init__(self, audit, scorer=None, idle=IDLE_SECONDS, clock=time.time):
+        self.audit = audit
+        self.idle = idle
+        self.clock = clock
+        self.visit = None
+        self._pending = []      # (case_path, start, end, active, edits, reviewed_after)
+        self._schema_db = None
+        self.scorer = None
+        if scorer is not None:
+            self.attach(scorer)
+
+    def attach(self, scorer):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+        self.scorer = scorer
+        scorer.subscribe(self._on_score_event)
+
+    # ====================================================
+    #  采集
+    # ====================================================
+    def enter(self, case_path, now=None):
+        now = self.clock() if now is None else now
+        if self.visit is not None:
+            if self.visit.case_path == case_path:
+                self.touch(now)
+                return
+            self.leave(now)
+        self.visit = _Visit(case_path, now)
+
+    def touch(self, now=None):
+        visit = self.visit
+        if visit is None:
+            return
+        now = self.clock() if now is None else now
+        visit.active += min(now - visit.last, self.idle)
+        visit.last = now
+
+    def leave(self, now=None):
+        visit = self.visit
+        if visit is None:
+            return
+        now = self.clock() if now is None else now
+        self.touch(now)
+        self.visit = None
+        self._pending.append((visit.case_path, visit.start, now, visit.active,
+                              visit.edits, visit.reviewed_after))
+        self.flush()
+
+    def _on_score_event(self, event):
+        visit = self.visit
+        if visit is None or event.case_path != visit.case_path or event.kind == 'reload':
+            return
+        self.touch()
+        for (mode, _), (_, new) in event.changes.items():
+            if mode != REVIEWED:
+                visit.edits += 1
+            elif new and visit.reviewed_after is None:
+                visit.reviewed_after = visit.active
+
+    # ====================================================
+    #  存储（审计库打开之前先缓存）
+    # ====================================================
+    def flush(self):
+        audit = self.audit
+        if audit.db is None or not self._pending:
+            return 0
+        if self._schema_db is not audit.db:
+            audit.db.executescript(_SCHEMA)
+            self._schema_db = audit.db
+        pending, self._pending = self._pending, []
+        with audit.db:
+            reader = audit._name_id("readers", "name", audit._reader_ids, audit.reader)
+            audit.db.executemany(
+                "INSERT INTO visits VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(reader, audit._name_id("cases", "path", audit._case_ids, case_path), *rest)
+                 for case_path, *rest in pending],
+            )
+        return len(pending)
+
+    # ====================================================
+    #  汇总
+    # ====================================================
+    def _query(self, sql, params=()):
+        self.audit.flush()
+        self.flush()
+        if self._schema_db is not self.audit.db:
+            self.audit.db.executescript(_SCHEMA)
+            self._schema_db = self.audit.db
+        return self.audit.db.execute(sql, params).fetchall()
+
+    def per_case(self, reader=None):
+        """
+        {(case_path, reader): {'visits', 'dwell', 'active', 'edits', 'time_to_reviewed'}}
+        time_to_reviewed：首次标记 reviewed 之前累计的 active 秒数，未标记为 None
+        """
+        where, params = ("WHERE r.name = ?", (reader,)) if reader is not None else ("", ())
+        rows = self._query(
+            "SELECT c.path, r.name, v.start, v.end, v.active, v.edits, v.reviewed_after "
+            "FROM visits v JOIN cases c ON c.id = v.case_ JOIN readers r ON r.id = v.reader "
+            f"{where} ORDER BY v.start",
+            params,
+        )
+        result = {}
+        for case_path, name, start, end, active, edits, reviewed_after in rows:
+            item = result.get((case_path, name))
+            if item is None:
+                item = result[(case_path, name)] = {
+                    'visits': 0, 'dwell': 0.0, 'active': 0.0, 'edits': 0, 'time_to_reviewed': None}
+            if item['time_to_reviewed'] is None and reviewed_after is not None:
+                item['time_to_reviewed'] = item['active'] + reviewed_after
+            item['visits'] += 1
+            item['dwell'] += end - start
+            item['active'] += active
+            item['edits'] += edits
+        return result
+
+    def report(self):
+        """
+        {reader: {'cases', 'reviewed', 'active_hours', 'cases_per_hour', 'median_active', 'median_to_reviewed'}}
+        cases_per_hour 按标记 reviewed 的 case 数 / active 小时计算
+        """
+        per_reader = {}
+        for (_, name), item in self.per_case().items():
+            per_reader.setdefault(name, []).append(item)
+        result = {}
+        for name, items in per_reader.items():
+            active = sorted(item['active'] for item in items)
+            to_reviewed = sorted(item['time_to_reviewed'] for item in items
+                                 if item['time_to_reviewed'] is not None)
+            hours = sum(active) / 3600
+            result[name] = {
+                'cases': len(items),
+                'reviewed': len(to_reviewed),
+                'active_hours': hours,
+                'cases_per_hour': len(to_reviewed) / hours if hours else 0.0,
+                'median_active': active[len(active) // 2] if active else None,
+                'median_to_reviewed': to_reviewed[len(to_reviewed) // 2] if to_reviewed else None,
+            }
+        return result
+
+    def slowest_joints(self, limit=10, reader=None):
+        """
+        [((mode, joint), 平均秒数, 修改次数)]，按平均耗时从大到小；间隔超过 idle 的不计入
+        """
+        where, params = ("AND e.reader = (SELECT id FROM readers WHERE name = ?)", (reader,)) \
+            if reader is not None else ("", ())
+        rows = self._query(
+            "SELECT j.mode, j.joint, AVG(gap), COUNT(*) FROM ("
+            "  SELECT e.joint, e.ts - COALESCE("
+            "      LAG(e.ts) OVER (PARTITION BY v.rowid ORDER BY e.ts, e.rowid), v.start) AS gap"
+            "  FROM visits v JOIN events e"
+            "    ON e.reader = v.reader AND e.case_ = v.case_ AND e.ts BETWEEN v.start AND v.end"
+            f"  WHERE 1 {where}"
+            ") t JOIN joints j ON j.id = t.joint "
+            "WHERE j.mode != ? AND gap <= ? "
+            "GROUP BY t.joint ORDER BY AVG(gap) DESC LIMIT ?",
+            params + (REVIEWED, self.idle, limit),
+        )
+        return [((mode, joint), seconds, n) for mode, joint, seconds, n in rows]
+
+    def format_report(self, limit=5):
+        lines = []
+        for name, s in sorted(self.report().items()):
+            line = (f"{name}: {s['reviewed']}/{s['cases']} cases reviewed, "
+                    f"{s['active_hours']:.2f} h active, {s['cases_per_hour']:.1f} cases/h")
+            if s['median_to_reviewed'] is not None:
+                line += f", median to reviewed {s['median_to_reviewed']:.0f} s"
+            lines.append(line)
+        slow = self.slowest_joints(limit)
+        if slow:
+            lines.append("Slowest joints: " + ", ".join(
+                f"{mode} {joint} {seconds:.1f} s" for (mode, joint), seconds, _ in slow))
+        return lines
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print("\n".join(Telemetry(AuditLog(sys.argv[1])).format_report(limit=10)))
+        sys.exit(0)
+
+    import os
+    import tempfile
+    from scorer import Scorer
+
+    scorer = Scorer()
+    for case in ("a.bmp", "b.bmp"):
+        for LorR in ('L', 'R'):
+            scorer.new_info(case, case, case, LorR)
+
+    now = [1000.0]
+    with tempfile.TemporaryDirectory() as tmp:
+        audit = AuditLog(reader="alice", scorer=scorer)
+        telemetry = Telemetry(audit, scorer, clock=lambda: now[0])
+
+        # a.bmp：进入后 10 s 改两个关节，离开 500 s（超过 idle，只算 60 s），回来后 5 s 标记 reviewed
+        telemetry.enter("a.bmp")
+        now[0] += 10
+        scorer.update_info("a.bmp", "L", {"MCP-T": 1, "MCP-I": 2}, None)
+        now[0] += 500
+        telemetry.enter("b.bmp")
+        now[0] += 3
+        telemetry.enter("a.bmp")
+        now[0] += 5
+        scorer.set_reviewed("a.bmp", True)
+        telemetry.leave()
+
+        audit.open(os.path.join(tmp, "s.json.audit.sqlite"))
+        cases = telemetry.per_case()
+        a = cases[("a.bmp", "alice")]
+        assert a['visits'] == 2 and a['dwell'] == 515 and a['active'] == 75 and a['edits'] == 2
+        assert a['time_to_reviewed'] == 75
+        assert cases[("b.bmp", "alice")]['active'] == 3
+        report = telemetry.report()["alice"]
+        assert report['reviewed'] == 1 and abs(report['cases_per_hour'] - 3600 / 78) < 1e-9
+
+        # 关节耗时：时间戳由审计日志写入，这里直接构造
+        audit._pending = [(2000.0, "c.bmp", "L", 0, None, 1), (2030.0, "c.bmp", "L", 1, None, 1),
+                          (2031.0, "c.bmp", "L", 2, None, 1)]
+        telemetry._pending = [("c.bmp", 1990.0, 2040.0, 50.0, 3, None)]
+        slow = telemetry.slowest_joints()
+        assert [(joint, seconds) for (_, joint), seconds, _ in slow[:3]] == [
+            ("MCP-I", 30.0), ("MCP-T", 10.0), ("MCP-M", 1.0)]
+        print("\n".join(telemetry.format_report()))
+        audit.close()
+    print("[OK] telemetry")
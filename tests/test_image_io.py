@@ -0,0 +1,34 @@
+"""
+DecodeCache：内存映射的图像不计入字节数，但条目数有上限，淘汰后文件描述符随即释放
+"""
+import gc
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from image_io import DecodeCache
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc/self/fd")
+def test_mapped_entries_are_capped(tmp_path):
+    test_dir = os.path.join(ROOT, "test")
+    source = os.path.join(test_dir, sorted(f for f in os.listdir(test_dir) if f.endswith(".bmp"))[0])
+    paths = []
+    for i in range(40):
+        path = str(tmp_path / f"case_{i}.bmp")
+        shutil.copyfile(source, path)
+        paths.append(path)
+
+    before = len(os.listdir("/proc/self/fd"))
+    cache = DecodeCache(max_entries=8)
+    for path in paths:
+        cache.load(path)
+    gc.collect()
+    assert len(cache._entries) == 8 and cache.bytes == 0
+    assert len(os.listdir("/proc/self/fd")) - before <= 8
+    assert cache.decodes == 40
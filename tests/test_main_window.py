@@ -0,0 +1,66 @@
+"""
+MainWindow 切换 case（经 LW_Files.setCurrentRow → _file_changed）：
+查看器、预取、关节放大与对比视图共用 DECODE_CACHE，整个会话每张图只解码一次
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+
+class DecodeOnlyViewer:
+    # offscreen 下没有 OpenGL：只做 XRayVTKViewer.update_image 中渲染之前的部分
+    last_reader = None
+
+    def update_image(self, path):
+        from image_io import DECODE_CACHE
+
+        image = DECODE_CACHE.load(path)
+        self.last_reader = image.source
+        DECODE_CACHE.scalar_range(path)
+        return True
+
+    def focus_on(self, *args):
+        pass
+
+    def reset_view(self):
+        pass
+
+    def set_enhancement(self, params):
+        pass
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def test_each_image_decoded_once(app, tmp_path, monkeypatch):
+    monkeypatch.setenv("RASCORER_CACHE_DIR", str(tmp_path))
+    import main
+    from image_io import DECODE_CACHE
+
+    test_dir = os.path.join(ROOT, "test")
+    paths = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir))
+    DECODE_CACHE.clear()
+    decodes = DECODE_CACHE.decodes
+
+    window = main.MainWindow()
+    window.xray_viewer = DecodeOnlyViewer()
+    window._set_file_list(paths)
+    window.set_enable(True)
+    try:
+        for _ in range(3):
+            for row in range(len(paths)):
+                window.LW_Files.setCurrentRow(row)
+                app.processEvents()
+        assert DECODE_CACHE.decodes - decodes == len(paths)
+        assert window.current_path == paths[-1]
+    finally:
+        window.close()
@@ -0,0 +1,90 @@
+"""
+载入 case 时 SvgScoreWidget 的信号次数：combobox 不逐个发 currentIndexChanged，
+scoresChanged 只发一次；重复载入同一 case 不发（与 benchmark.py 的 gui 基准检查一致）
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def widget(app):
+    from main import BE_POINT, JSN_POINT, SvgScoreWidget
+
+    svg_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "hand.svg")
+    widget = SvgScoreWidget(svg_path=svg_path, jsn_points=JSN_POINT, be_points=BE_POINT)
+    yield widget
+    widget.deleteLater()
+
+
+def _state(scorer, path):
+    JSN_L, BE_L = scorer.get_info(path, 'L')
+    JSN_R, BE_R = scorer.get_info(path, 'R')
+    return {'JSN': {'L': JSN_L, 'R': JSN_R}, 'BE': {'L': BE_L, 'R': BE_R}}
+
+
+def test_load_case_emits_once(widget):
+    from scorer import Scorer
+
+    scorer = Scorer()
+    for path in ("a.bmp", "b.bmp"):
+        for side in ('L', 'R'):
+            scorer.new_info(path, path[0], path[0], side)
+    scorer.update_info("a.bmp", 'L', {'MCP-T': 1, 'MCP-I': 2}, {'IP': 3})
+    scorer.update_info("a.bmp", 'R', {'PIP-M': 4}, None)
+    scorer.update_info("b.bmp", 'L', {'SC': 2}, None)
+
+    emitted = {"combo": 0, "scores": 0}
+
+    def count(key):
+        emitted[key] += 1
+
+    for m_dict in widget.combos.values():
+        for info in m_dict.values():
+            info["CB"].currentIndexChanged.connect(lambda *_: count("combo"))
+    widget.scoresChanged.connect(lambda changes: count("scores"))
+
+    signals = {}
+    for label, path in (("load", "a.bmp"), ("reload", "a.bmp"), ("switch", "b.bmp")):
+        emitted.update(combo=0, scores=0)
+        widget.set_score_state(_state(scorer, path))
+        signals[label] = dict(emitted)
+
+    assert signals == {"load": {"combo": 0, "scores": 1},
+                       "reload": {"combo": 0, "scores": 0},
+                       "switch": {"combo": 0, "scores": 1}}
+    assert widget.get_score_state()['JSN']['L']['SC'] == 2
+
+
+def test_out_of_scale_values_survive_load(widget):
+    from scorer import Scorer
+
+    scorer = Scorer()
+    for side in ('L', 'R'):
+        scorer.new_info("a.bmp", "a", "a", side)
+    scorer.update_info("a.bmp", 'L', {'MCP-T': 9, 'MCP-I': 'x', 'MCP-M': 2}, None)
+
+    emitted = []
+    widget.scoresChanged.connect(emitted.append)
+    widget.set_score_state(_state(scorer, "a.bmp"))
+    assert len(emitted) == 1
+
+    # 下拉框显示为空，但值不会被当成用户修改清掉
+    cb = widget.combos['JSN']['MCP-T']["CB"]
+    assert cb.currentIndex() == -1
+    widget.set_LorR_mode('R')
+    widget.set_LorR_mode('L')
+    JSN = widget.get_score_state()['JSN']['L']
+    assert (JSN['MCP-T'], JSN['MCP-I'], JSN['MCP-M']) == (9, 'x', 2)
+    assert len(emitted) == 1
@@ -0,0 +1,53 @@
+"""
+Scorer 批量接口与事务：出错时抛出异常，且不留下修改了一半的记录
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scorer import Scorer
+
+
+@pytest.fixture
+def scorer():
+    scorer = Scorer()
+    scorer.new_cases([("a.bmp", "a", "a", "L"), ("a.bmp", "a", "a", "R"), ("b.bmp", "b", "b", "L")])
+    return scorer
+
+
+def test_update_many_unknown_case(scorer):
+    with pytest.raises(KeyError):
+        scorer.update_many([("a.bmp", "L", {"SC": 1}, None), ("c.bmp", "L", {"SC": 2}, None)])
+    assert scorer.get_info("a.bmp", "L")[0]["SC"] is None
+
+
+def test_set_reviewed_many_unknown_side(scorer):
+    with pytest.raises(KeyError):
+        scorer.set_reviewed_many(["a.bmp", "b.bmp"])
+    assert scorer.get_reviewed("a.bmp") is False
+    scorer.set_reviewed_many(["a.bmp"])
+    assert scorer.get_reviewed("a.bmp") is True
+
+
+def test_transaction_rolls_back_on_error(scorer):
+    events = []
+    scorer.subscribe(events.append)
+    with pytest.raises(RuntimeError):
+        with scorer.transaction():
+            scorer.update_info("a.bmp", "L", {"SC": 1}, None)
+            scorer.set_reviewed("a.bmp", True)
+            scorer.update_many([("b.bmp", "L", {"SC": 3}, None)])
+            scorer.new_info("c.bmp", "c", "c", "L")
+            scorer.relocate({"b.bmp": "moved/b.bmp"})
+            raise RuntimeError("abort")
+    assert scorer.get_info("a.bmp", "L")[0]["SC"] is None
+    assert scorer.get_reviewed("a.bmp") is False
+    assert scorer.get_file_list() == ["a.bmp", "b.bmp"]
+    assert scorer.get_info("b.bmp", "L")[0]["SC"] is None and not scorer.has_case("c.bmp")
+    assert events == []
+
+    scorer.update_info("a.bmp", "L", {"SC": 2}, None)
+    assert scorer.get_info("a.bmp", "L")[0]["SC"] == 2 and len(events) == 1
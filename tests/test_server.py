@@ -0,0 +1,65 @@
+"""
+评分服务：输入检查（400）、保存路径限制、单侧 case 的 reviewed 标记
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scorer import Scorer
+from server import ScoringServer
+
+
+async def _request(port, method, target, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = b"" if body is None else json.dumps(body).encode("utf-8")
+    writer.write(f"{method} {target} HTTP/1.1\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n"
+                 .encode("latin-1") + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload or b"null")
+
+
+def _run(scorer, session_path, calls):
+    async def main():
+        app = ScoringServer(scorer, session_path)
+        server = await asyncio.start_server(app._handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [await _request(port, *call) for call in calls]
+        finally:
+            server.close()
+            await server.wait_closed()
+    return asyncio.run(main())
+
+
+def test_input_validation_and_save(tmp_path):
+    scorer = Scorer()
+    scorer.new_cases([("a.bmp", "a", "a", side) for side in ('L', 'R')])
+    session_path = str(tmp_path / "session.json")
+    results = _run(scorer, session_path, [
+        ("PUT", "/cases/info?path=a.bmp&side=L", {"JSN": {"MCP-T": 9}}),
+        ("PUT", "/cases/info?path=a.bmp&side=L", {"JSN": {"MCP-T": "x"}}),
+        ("PUT", "/cases/info?path=a.bmp&side=L", {"BE": {"IP": 4}}),
+        ("PUT", "/cases/info?path=a.bmp&side=L", {"JSN": [1]}),
+        ("PUT", "/cases/info?path=a.bmp&side=L", {"JSN": {"MCP-T": 3}, "BE": {"IP": 5}}),
+        ("POST", "/save", []),
+        ("POST", "/save", {"path": str(tmp_path / "elsewhere.json")}),
+        ("POST", "/save", {}),
+    ])
+    assert [status for status, _ in results] == [400, 400, 400, 400, 200, 400, 400, 200]
+    JSN, BE = scorer.get_info("a.bmp", 'L')
+    assert JSN["MCP-T"] == 3 and BE["IP"] == 5
+    assert os.path.exists(session_path) and not os.path.exists(tmp_path / "elsewhere.json")
+
+
+def test_reviewed_one_sided_case(tmp_path):
+    scorer = Scorer()
+    scorer.new_cases([("a.bmp", "a", "a", 'L'), ("b.bmp", "b", "b", 'L'), ("b.bmp", "b", "b", 'R')])
+    results = _run(scorer, None, [("PUT", "/cases/reviewed?path=a.bmp", {"reviewed": True})])
+    assert results[0][0] == 200
+    assert [r.reviewed for r in scorer.score_repo] == [True, False, False]
@@ -0,0 +1,87 @@
+"""
+多阅片者会话：多进程并发追加变更集、增量合并、单侧 case 的 reviewed 单元格
+"""
+import json
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scorer import REVIEWED, Scorer
+from session import ConsolidatedView, ReaderSession, _reader_process, apply_cells, changeset_dir
+
+
+def test_multiprocess_merge(tmp_path):
+    session_path = str(tmp_path / "session.json")
+    case_paths = [f"/data/IMAGE{i:03d}_20110111.bmp" for i in range(8)]
+    # 两个进程共用 carol 的变更文件，验证同一文件的并发追加
+    readers = ["alice", "bob", "carol", "carol"]
+    rounds = 50
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_reader_process, args=(session_path, reader, case_paths, rounds, i))
+             for i, reader in enumerate(readers)]
+    view = ConsolidatedView(session_path)
+    for p in procs:
+        p.start()
+    while any(p.is_alive() for p in procs):
+        view.refresh()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    view.refresh()
+
+    # 每一行都是完整 JSON；每位阅片者每轮至少写一行
+    latest = {}
+    for reader in sorted(set(readers)):
+        with open(os.path.join(changeset_dir(session_path), f"{reader}.jsonl"), encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f.read().splitlines()]
+        assert len(lines) >= rounds * readers.count(reader)
+        for change in lines:
+            key = (change["case_path"], change["LorR"], change["mode"], change["joint"])
+            if latest.get(key, (-1,))[0] <= change["ts"]:
+                latest[key] = (change["ts"], change["value"])
+
+    # 增量刷新的结果与一次性读完全部变更相同
+    fresh = ConsolidatedView(session_path)
+    fresh.refresh()
+    assert view.merged() == fresh.merged()
+    assert set(view.merged()) == set(latest)
+
+    scorer = Scorer()
+    view.apply_to(scorer)
+    assert sorted(scorer.get_file_list()) == sorted(case_paths)
+
+
+def test_local_edits_survive_merge(tmp_path):
+    session_path = str(tmp_path / "session.json")
+    scorer = Scorer()
+    scorer.new_cases([("a.bmp", "a", "a", side) for side in ('L', 'R')])
+    local = ReaderSession(session_path, "dave")
+    local.reset_baseline(scorer)
+    scorer.update_info("a.bmp", 'L', {'SC': 3}, None)
+
+    remote_scorer = Scorer()
+    remote_scorer.new_cases([("a.bmp", "a", "a", side) for side in ('L', 'R')])
+    remote = ReaderSession(session_path, "erin")
+    remote.reset_baseline(remote_scorer)
+    remote_scorer.update_info("a.bmp", 'L', {'SC': 1, 'SR': 2}, None)
+    remote.commit(remote_scorer)
+
+    view = ConsolidatedView(session_path)
+    changed = view.refresh()
+    kept = local.local_edits(scorer, changed)
+    local.absorb(view.apply_to(scorer, changed, exclude_keys=kept))
+    assert kept == {("a.bmp", 'L', 'JSN', 'SC')}
+    JSN, _ = scorer.get_info("a.bmp", 'L')
+    assert JSN['SC'] == 3 and JSN['SR'] == 2
+    assert local.diff(scorer) == {("a.bmp", 'L', 'JSN', 'SC'): 3}
+
+
+def test_reviewed_cell_one_sided_case():
+    scorer = Scorer()
+    scorer.new_cases([("a.bmp", "a", "a", 'L'), ("b.bmp", "b", "b", 'L'), ("b.bmp", "b", "b", 'R')])
+    apply_cells(scorer, {("a.bmp", 'L', REVIEWED, ''): True})
+    assert scorer.get_reviewed("a.bmp") is True
+    assert [r.reviewed for r in scorer.score_repo] == [True, False, False]
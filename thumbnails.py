@@ -0,0 +1,266 @@
+"""
+案例列表缩略图
+
+    cache = ThumbnailCache()                  # 默认 ~/.cache/ra-scorer/thumbnails，可用 RASCORER_CACHE_DIR 覆盖
+    generator = ThumbnailGenerator(cache)
+    generator.start(paths)                    # 进程池后台生成，已缓存的直接命中
+    for path, thumb in generator.poll(0.015): # GUI 定时器里按时间预算取回 (H, W[, 3]) uint8
+        ...
+
+- 缓存文件名是 sha1(path | size | mtime_ns | 尺寸)，原图被修改后自然失效
+- 命中时刷新缓存文件的 mtime，超出磁盘配额时按 mtime 从旧到新删除（LRU）
+- 工作进程只回传缓存文件路径，缩略图数据经磁盘交给 GUI，不走进程间管道
+"""
+import hashlib
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+THUMB_SIZE = 128
+QUOTA_BYTES = 256 * 1024 * 1024
+BATCH_SIZE = 32
+
+
+def default_cache_dir():
+    root = os.environ.get("RASCORER_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "ra-scorer")
+    return os.path.join(root, "thumbnails")
+
+
+def make_thumbnail(array, size=THUMB_SIZE):
+    """
+    按块取平均缩小到最长边不超过 size，再把灰度范围拉伸到 uint8
+    """
+    rows, cols = array.shape[:2]
+    step = max(1, math.ceil(max(rows, cols) / size))
+    rows, cols = rows // step * step, cols // step * step
+    blocks = array[:rows, :cols].reshape(rows // step, step, cols // step, step, *array.shape[2:])
+    small = blocks.mean(axis=(1, 3), dtype=np.float32)
+
+    lo, hi = float(small.min()), float(small.max())
+    if hi <= lo:
+        return np.zeros(small.shape, dtype=np.uint8)
+    return ((small - lo) * (255.0 / (hi - lo))).astype(np.uint8)
+
+
+# ================================
+#        磁盘缓存
+# ================================
+class ThumbnailCache:
+    def __init__(self, root=None, size=THUMB_SIZE, quota=QUOTA_BYTES):
+        self.root = root or default_cache_dir()
+        self.size = size
+        self.quota = quota
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, path):
+        """
+        缓存文件路径；原图不存在时返回 None
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{self.size}"
+        return os.path.join(self.root, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+    def lookup(self, path):
+        """
+        命中时返回缓存文件路径并刷新其 mtime（LRU），未命中返回 None
+        """
+        cache_file = self.path_for(path)
+        if cache_file is None:
+            return None
+        try:
+            os.utime(cache_file)
+        except OSError:
+            return None
+        return cache_file
+
+    def render(self, path):
+        """
+        查缓存，未命中则解码原图生成缩略图；返回缓存文件路径，无法读取时返回 None
+        """
+        cache_file = self.lookup(path)
+        if cache_file is not None:
+            return cache_file
+
+        from image_io import REGISTRY
+        try:
+            thumb = make_thumbnail(REGISTRY.load(path).array, self.size)
+        except Exception:
+            # 任何解码错误（截断的 DICOM、尺寸不符等）只影响这一张，不让整批失败
+            return None
+
+        cache_file = self.path_for(path)
+        tmp = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, thumb)
+        os.replace(tmp, cache_file)
+        return cache_file
+
+    def usage(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.root) if entry.name.endswith(".npy"))
+
+    def evict(self):
+        """
+        超出配额时按最近使用时间从旧到新删除，返回删除的文件数
+        """
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".npy"):
+                st = entry.stat()
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.quota:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+# ================================
+#        进程池中执行的任务
+# ================================
+def _render_batch(root, size, paths):
+    cache = ThumbnailCache(root, size)
+    return [(path, cache.render(path)) for path in paths]
+
+
+def _evict(root, size, quota):
+    return ThumbnailCache(root, size, quota).evict()
+
+
+# ================================
+#        后台生成
+# ================================
+class ThumbnailGenerator:
+    """
+    start() 只提交任务，不等待；GUI 定时调用 poll() 取回结果，每次只处理 budget 秒以内的量，
+    一万张缩略图也不会卡住界面。全部完成后在进程池里执行一次配额淘汰。
+    """
+    def __init__(self, cache=None, workers=None, batch=BATCH_SIZE):
+        self.cache = cache or ThumbnailCache()
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.batch = batch
+        self._pool = None
+        self._futures = []
+        self._ready = []
+        self._evicting = None
+        self.stats = {"requested": 0, "loaded": 0, "failed": 0}
+
+    def _executor(self):
+        if self._pool is None:
+            # spawn：GUI 进程里已经加载了 Qt，fork 出来的子进程不安全
+            ctx = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._pool
+
+    def start(self, paths):
+        self.cancel()
+        self.stats = {"requested": 0, "loaded": 0, "failed": 0}
+        self.extend(paths)
+
+    def extend(self, paths):
+        """
+        追加任务，不取消已提交的（监视文件夹新到的文件）
+        """
+        paths = list(paths)
+        self.stats["requested"] += len(paths)
+        self._evicting = None
+        pool = self._executor()
+        for i in range(0, len(paths), self.batch):
+            batch = paths[i:i + self.batch]
+            self._futures.append((pool.submit(_render_batch, self.cache.root, self.cache.size, batch), batch))
+
+    def cancel(self):
+        for future, _ in self._futures:
+            future.cancel()
+        self._futures = []
+        self._ready = []
+
+    @property
+    def done(self):
+        return not self._futures and not self._ready
+
+    def poll(self, budget=0.015):
+        """
+        返回 [(path, thumbnail)]，thumbnail 为 None 表示该文件无法生成缩略图
+        """
+        pending = []
+        for future, batch in self._futures:
+            if not future.done():
+                pending.append((future, batch))
+            elif future.cancelled():
+                continue
+            elif future.exception() is None:
+                self._ready.extend(future.result())
+            else:
+                # 工作进程异常退出：这一批记为失败，进程池下次使用时重建
+                self._ready.extend((path, None) for path in batch)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    self._pool = None
+        self._futures = pending
+
+        deadline = time.perf_counter() + budget
+        results = []
+        while self._ready and time.perf_counter() < deadline:
+            path, cache_file = self._ready.pop()
+            thumb = None
+            if cache_file is not None:
+                try:
+                    thumb = np.load(cache_file)
+                except (OSError, ValueError):
+                    thumb = None
+            self.stats["loaded" if thumb is not None else "failed"] += 1
+            results.append((path, thumb))
+
+        if self.done and self.stats["requested"] and self._evicting is None:
+            self._evicting = self._executor().submit(_evict, self.cache.root, self.cache.size, self.cache.quota)
+        return results
+
+    def shutdown(self):
+        self.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+    paths = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = ThumbnailGenerator(ThumbnailCache(tmp))
+        for label in ("cold", "warm"):
+            t0 = time.perf_counter()
+            generator.start(paths)
+            thumbs = {}
+            while not generator.done:
+                thumbs.update(generator.poll())
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - t0
+            assert len(thumbs) == len(paths) and all(t is not None for t in thumbs.values())
+            assert max(max(t.shape[:2]) for t in thumbs.values()) <= THUMB_SIZE
+            print(f"{label}: {len(thumbs)} thumbnails in {elapsed * 1000:.0f} ms")
+            generator._evicting.result()
+        generator.shutdown()
+
+        # 配额只够放一张：淘汰掉其余的
+        cache = ThumbnailCache(tmp)
+        cache.quota = max(os.path.getsize(cache.path_for(p)) for p in paths)
+        assert cache.evict() == len(paths) - 1
+        assert cache.usage() <= cache.quota
+    print("[OK] thumbnails")
@@ -0,0 +1,329 @@
+"""
+评分完整性 / 合法性校验
+
+    validator = Validator(scorer)     # 订阅 scorer，case 状态随每次 update_info 增量更新
+    validator.case_status(path)       # 位标志：MISSING | INVALID | ONE_SIDE | REVIEWED_INCOMPLETE
+    validator.describe(path)          # 给界面显示的一句话
+    validator.problems()              # [(case_path, LorR, mode, joint, value, problem)]，导出前检查用
+
+分数按 score_repo 的行号编码进两个 int16 矩阵（JSN / BE）：
+- >= 0：SCORE_SCALES 里的合法分值（数字字符串也接受，旧版 JSON 里存的是字符串）
+- MISSING_CODE：未打分
+- INVALID_CODE：不在刻度上，例如 PTE_Load 里输入的 '9'
+整库检查是矩阵运算；scorer 有变更时只重新编码变动的那一行。
+"""
+from itertools import chain, repeat
+
+import numpy as np
+
+from scorer import SCORE_SCALES, SVDH_SCHEMA
+
+MISSING = 1
+INVALID = 2
+ONE_SIDE = 4
+REVIEWED_INCOMPLETE = 8
+
+MISSING_CODE = -1
+INVALID_CODE = -2
+
+
+def _code_table(scale):
+    table = {None: MISSING_CODE, '': MISSING_CODE}
+    for value in scale:
+        table[value] = value
+        table[str(value)] = value
+    return table
+
+
+_CODES = {mode: _code_table(scale) for mode, scale in SCORE_SCALES.items()}
+
+
+def encode(values, mode):
+    """
+    分值序列 → int16 编码数组
+    """
+    get = _CODES[mode].get
+    try:
+        return np.fromiter(map(get, values, repeat(INVALID_CODE)), dtype=np.int16, count=len(values))
+    except TypeError:
+        # 不可哈希的值（list 等）逐个处理
+        codes = []
+        for value in values:
+            try:
+                codes.append(get(value, INVALID_CODE))
+            except TypeError:
+                codes.append(INVALID_CODE)
+        return np.array(codes, dtype=np.int16)
+
+
+class Validator:
+    def __init__(self, scorer=None):
+        self.jsn = np.empty((0, len(SVDH_SCHEMA.jsn_keys)), dtype=np.int16)
+        self.be = np.empty((0, len(SVDH_SCHEMA.be_keys)), dtype=np.int16)
+        self.rows = 0
+        self.case_flags = {}
+        self.scorer = None
+        # 状态变化回调 callback(case_path, flags)
+        self._listeners = []
+        if scorer is not None:
+            self.attach(scorer)
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def attach(self, scorer):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+        self.scorer = scorer
+        scorer.subscribe(self._on_score_event)
+        self.rebuild()
+
+    def detach(self):
+        if self.scorer is not None:
+            self.scorer.unsubscribe(self._on_score_event)
+            self.scorer = None
+
+    # ====================================================
+    #  编码
+    # ====================================================
+    def _reserve(self, rows):
+        capacity = self.jsn.shape[0]
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 64)
+        for name in ('jsn', 'be'):
+            old = getattr(self, name)
+            new = np.empty((capacity, old.shape[1]), dtype=np.int16)
+            new[:self.rows] = old[:self.rows]
+            setattr(self, name, new)
+
+    def _encode_rows(self, start, stop):
+        repo = self.scorer.score_repo
+        if stop <= start:
+            return
+        # 所有行拼成一个长 list 一次编码，比逐行调用快得多
+        records = repo[start:stop]
+        for name, mode in (('jsn', 'JSN'), ('be', 'BE')):
+            matrix = getattr(self, name)
+            flat = list(chain.from_iterable(getattr(record, name) for record in records))
+            matrix[start:stop] = encode(flat, mode).reshape(stop - start, -1)
+
+    def rebuild(self):
+        n = len(self.scorer.score_repo) if self.scorer is not None else 0
+        self.rows = 0
+        self._reserve(n)
+        if n:
+            self._encode_rows(0, n)
+        self.rows = n
+        self.case_flags = self.validate_all()
+
+    # ====================================================
+    #  整库检查（矩阵运算）
+    # ====================================================
+    def validate_all(self):
+        """
+        返回 {case_path: flags}，按当前编码矩阵整体重新计算
+        """
+        if self.scorer is None or self.rows == 0:
+            return {}
+        n = self.rows
+        jsn, be = self.jsn[:n], self.be[:n]
+        rec_missing = (jsn == MISSING_CODE).any(axis=1) | (be == MISSING_CODE).any(axis=1)
+        rec_invalid = (jsn == INVALID_CODE).any(axis=1) | (be == INVALID_CODE).any(axis=1)
+        repo = self.scorer.score_repo
+        reviewed = np.fromiter((repo[i].reviewed for i in range(n)), dtype=bool, count=n)
+
+        paths = self.scorer.get_file_list() or []
+        index_get = self.scorer.index_map.get
+        flags = np.zeros(len(paths), dtype=np.int64)
+        present = []
+        for LorR in ('L', 'R'):
+            idx = np.fromiter((index_get((p, LorR), -1) for p in paths), dtype=np.int64, count=len(paths))
+            has = idx >= 0
+            safe = np.where(has, idx, 0)
+            flags |= np.where(has & rec_missing[safe], MISSING, 0)
+            flags |= np.where(has & rec_invalid[safe], INVALID, 0)
+            present.append((has, has & reviewed[safe]))
+        (has_l, reviewed_l), (has_r, reviewed_r) = present
+        flags |= np.where(has_l != has_r, ONE_SIDE, 0)
+        flags |= np.where((reviewed_l | reviewed_r) & (flags != 0), REVIEWED_INCOMPLETE, 0)
+        return dict(zip(paths, flags.tolist()))
+
+    # ====================================================
+    #  增量更新
+    # ====================================================
+    def _on_score_event(self, event):
+        if event.kind == 'reload':
+            self.rebuild()
+            for path, flags in self.case_flags.items():
+                self._notify(path, flags)
+            return
+
+        n = len(self.scorer.score_repo)
+        if n > self.rows:
+            self._reserve(n)
+            self._encode_rows(self.rows, n)
+            self.rows = n
+        if event.kind == 'update':
+            idx = self.scorer.index_map.get((event.case_path, event.LorR), -1)
+            if 0 <= idx < self.rows:
+                record = self.scorer.score_repo[idx]
+                self.jsn[idx] = encode(record.jsn, 'JSN')
+                self.be[idx] = encode(record.be, 'BE')
+
+        flags = self._case_flags(event.case_path)
+        if self.case_flags.get(event.case_path) != flags:
+            self.case_flags[event.case_path] = flags
+            self._notify(event.case_path, flags)
+
+    def _notify(self, path, flags):
+        for callback in list(self._listeners):
+            callback(path, flags)
+
+    def _case_flags(self, path):
+        flags = 0
+        sides = 0
+        reviewed = False
+        for LorR in ('L', 'R'):
+            idx = self.scorer.index_map.get((path, LorR), -1)
+            if idx < 0 or idx >= self.rows:
+                continue
+            sides += 1
+            codes = np.concatenate((self.jsn[idx], self.be[idx]))
+            if (codes == MISSING_CODE).any():
+                flags |= MISSING
+            if (codes == INVALID_CODE).any():
+                flags |= INVALID
+            reviewed = reviewed or self.scorer.score_repo[idx].reviewed
+        if sides == 1:
+            flags |= ONE_SIDE
+        if reviewed and flags:
+            flags |= REVIEWED_INCOMPLETE
+        return flags
+
+    # ====================================================
+    #  查询
+    # ====================================================
+    def case_status(self, path):
+        return self.case_flags.get(path, 0)
+
+    def summary(self):
+        values = np.fromiter(self.case_flags.values(), dtype=np.int64, count=len(self.case_flags))
+        return {
+            "cases": len(values),
+            "ok": int((values == 0).sum()),
+            "missing": int((values & MISSING != 0).sum()),
+            "invalid": int((values & INVALID != 0).sum()),
+            "one_side": int((values & ONE_SIDE != 0).sum()),
+            "reviewed_incomplete": int((values & REVIEWED_INCOMPLETE != 0).sum()),
+        }
+
+    def problems(self, include_missing=True):
+        """
+        [(case_path, LorR, mode, joint, value, problem)]，problem 为
+        'missing' / 'invalid' / 'one side' / 'reviewed but incomplete'
+        """
+        repo = self.scorer.score_repo
+        result = []
+        for mode, matrix, keys, attr in (('JSN', self.jsn, SVDH_SCHEMA.jsn_keys, 'jsn'),
+                                         ('BE', self.be, SVDH_SCHEMA.be_keys, 'be')):
+            codes = matrix[:self.rows]
+            mask = (codes < 0) if include_missing else (codes == INVALID_CODE)
+            for idx, col in zip(*np.nonzero(mask)):
+                record = repo[idx]
+                problem = 'missing' if codes[idx, col] == MISSING_CODE else 'invalid'
+                result.append((record.case_path, record.LorR, mode, keys[col],
+                               getattr(record, attr)[col], problem))
+        for path, flags in self.case_flags.items():
+            if flags & ONE_SIDE:
+                result.append((path, '', '', '', None, 'one side'))
+            if flags & REVIEWED_INCOMPLETE:
+                result.append((path, '', '', '', None, 'reviewed but incomplete'))
+        return result
+
+    def describe(self, path):
+        """
+        例如 'Missing: L JSN 3, R BE 16 | Invalid: L JSN MCP-T=9 | Reviewed but incomplete'
+        """
+        flags = self.case_status(path)
+        if flags == 0:
+            return "Complete" if self.scorer is not None and self.scorer.has_case(path) else ""
+        parts = []
+        missing, invalid = [], []
+        for LorR in ('L', 'R'):
+            idx = self.scorer.index_map.get((path, LorR), -1)
+            if idx < 0 or idx >= self.rows:
+                continue
+            record = self.scorer.score_repo[idx]
+            for mode, codes, keys, values in (('JSN', self.jsn[idx], SVDH_SCHEMA.jsn_keys, record.jsn),
+                                              ('BE', self.be[idx], SVDH_SCHEMA.be_keys, record.be)):
+                n_missing = int((codes == MISSING_CODE).sum())
+                if n_missing:
+                    missing.append(f"{LorR} {mode} {n_missing}")
+                for col in np.nonzero(codes == INVALID_CODE)[0]:
+                    invalid.append(f"{LorR} {mode} {keys[col]}={values[col]}")
+        if missing:
+            parts.append("Missing: " + ", ".join(missing))
+        if invalid:
+            parts.append("Invalid: " + ", ".join(invalid))
+        if flags & ONE_SIDE:
+            parts.append("Only one side")
+        if flags & REVIEWED_INCOMPLETE:
+            parts.append("Reviewed but incomplete")
+        return " | ".join(parts)
+
+
+if __name__ == "__main__":
+    import time
+    from scorer import Scorer
+
+    full_jsn = dict.fromkeys(SVDH_SCHEMA.jsn_keys, 0)
+    full_be = dict.fromkeys(SVDH_SCHEMA.be_keys, 0)
+
+    scorer = Scorer()
+    scorer.new_info("a.bmp", "a", "a", "L", full_jsn, full_be)
+    scorer.new_info("a.bmp", "a", "a", "R", full_jsn, full_be)
+    scorer.new_info("b.bmp", "b", "b", "L", full_jsn, dict(full_be, IP=None))
+    scorer.new_info("b.bmp", "b", "b", "R", dict(full_jsn, **{"MCP-T": "9"}), dict(full_be, Tm="2"))
+    scorer.new_info("c.bmp", "c", "c", "L", full_jsn, full_be)
+
+    validator = Validator(scorer)
+    changes = []
+    validator.subscribe(lambda path, flags: changes.append((path, flags)))
+
+    assert validator.case_status("a.bmp") == 0
+    assert validator.case_status("b.bmp") == MISSING | INVALID
+    assert validator.case_status("c.bmp") == ONE_SIDE
+    print(validator.describe("b.bmp"))
+
+    # 增量：审阅一个不完整的 case，修正后状态跟着变
+    scorer.set_reviewed("b.bmp", True)
+    assert validator.case_status("b.bmp") == MISSING | INVALID | REVIEWED_INCOMPLETE
+    scorer.update_info("b.bmp", "R", full_jsn, full_be)
+    scorer.update_info("b.bmp", "L", full_jsn, full_be)
+    assert validator.case_status("b.bmp") == 0 and changes[-1] == ("b.bmp", 0)
+    scorer.new_info("c.bmp", "c", "c", "R", full_jsn, full_be)
+    assert validator.case_status("c.bmp") == 0
+    assert validator.validate_all() == validator.case_flags
+
+    # 规模：10 万个 case，编码 + 矩阵检查 / 单次增量更新
+    n = 100_000
+    big = Scorer()
+    with big.transaction():
+        for i in range(n):
+            for LorR in ('L', 'R'):
+                big.new_info(f"/synthetic/{i:06d}.bmp", str(i), str(i), LorR,
+                             full_jsn if i % 7 else None, full_be)
+    t0 = time.perf_counter()
+    validator = Validator(big)
+    t1 = time.perf_counter()
+    validator.validate_all()
+    t2 = time.perf_counter()
+    for i in range(1000):
+        big.update_info(f"/synthetic/{i:06d}.bmp", 'L', full_jsn, dict(full_be, IP=9))
+    t3 = time.perf_counter()
+    print(f"{n} cases: build (encode + validate) {(t1 - t0) * 1000:.0f} ms, validate_all {(t2 - t1) * 1000:.0f} ms, "
+          f"incremental {(t3 - t2) / 1000 * 1e6:.0f} µs/update_info")
+    print(validator.summary())
+    assert validator.validate_all() == validator.case_flags
+    print("[OK] validation")
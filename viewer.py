@@ -0,0 +1,287 @@
+import os
+
+from PyQt5 import QtCore, QtWidgets
+
+# 只加载查看器真正用到的 VTK 模块，避免 vtkmodules.all 拖慢启动
+import vtkmodules.vtkInteractionStyle  # noqa: F401  注册交互样式工厂
+import vtkmodules.vtkRenderingOpenGL2  # noqa: F401  注册 OpenGL 渲染后端
+from vtkmodules.vtkInteractionStyle import vtkInteractorStyleImage
+from vtkmodules.vtkRenderingCore import vtkImageActor, vtkRenderer, vtkTextActor
+from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+
+from image_io import DECODE_CACHE, REGISTRY, UnsupportedImage
+from profiling import profiled, span
+
+
+# ================== 独立 VTK 交互类 ==================
+class XRayVTKViewer(QtWidgets.QWidget):
+    """
+    单独封装 VTK 显示逻辑的类：
+    - 负责创建 QVTKRenderWindowInteractor
+    - 设置 renderer / interactor style
+    - 提供 show_xray(filepath) 接口
+    - focus_on(row, col, radius) 把相机移到原图某个位置（关节放大视图）
+    - Ctrl + 左键点击时发出 imageClicked(row, col)，坐标为原图像素（第 0 行在最上面）
+    - set_overlay_text(text) 在左上角叠加只读文字（对比视图显示往次评分）
+    - set_enhancement(params) 切换图像增强（见 enhance.py）：没算好时先显示原图，后台算完再换上，相机不动
+    """
+    imageClicked = QtCore.pyqtSignal(float, float)
+
+    def __init__(self, parent=None, cache=None):
+        super().__init__(parent)
+        # 解码缓存：默认与其他视图共用进程内的 DECODE_CACHE
+        self.cache = cache or DECODE_CACHE
+
+        # QVTK 组件
+        self.vtkWidget = QVTKRenderWindowInteractor(self)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.vtkWidget)
+
+        # renderer / interactor
+        self.renderer = vtkRenderer()
+        self.vtkWidget.GetRenderWindow().AddRenderer(self.renderer)
+
+        self.interactor = self.vtkWidget.GetRenderWindow().GetInteractor()
+        style = vtkInteractorStyleImage()
+        self.style = style
+        self.interactor.SetInteractorStyle(style)
+        self.interactor.Initialize()
+
+        # 最近一次成功读取所用的 reader 名称（状态栏显示用）
+        self.last_reader = None
+        # 当前图像的 (行数, spacing, flip_y) 与整幅显示时的相机参数
+        self.geometry = None
+        self._home_camera = None
+        self.overlay = None
+        # 当前显示的文件与 actor；图像增强参数（None 为原图）与后台计算中的任务
+        self.filepath = None
+        self.image_actor = None
+        self.enhancement = None
+        self._enhance_pending = None
+        self._enhance_timer = QtCore.QTimer(self)
+        self._enhance_timer.setInterval(30)
+        self._enhance_timer.timeout.connect(self._poll_enhancement)
+        # 在 style 上注册观察者会替代它的默认处理，非 Ctrl 点击时在回调里转交回去
+        style.AddObserver("LeftButtonPressEvent", self._on_left_press)
+
+    @profiled("viewer.update_image")
+    def update_image(self, filepath: str) -> bool:
+        """
+        显示 X-ray 图像（DICOM 或 BMP）。
+        只负责图像显示和相机设置，不处理 scorer 逻辑。
+        返回：
+            True  - 显示成功
+            False - 文件不存在或格式不支持
+        """
+        if not os.path.exists(filepath):
+            QtWidgets.QMessageBox.warning(self, "Error", f"File not found:\n{filepath}")
+            return False
+
+        loaded = self._load_image_data(filepath)
+        if loaded is None:
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Unsupported",
+                "Unsupported image format:\n" + filepath
+                + "\n\nSupported: " + " ".join(REGISTRY.extensions()),
+            )
+            return False
+        image_data, display_extent, flip_y, scalar_range = loaded
+
+        image_actor = vtkImageActor()
+        self._set_actor_input(image_actor, image_data, display_extent, scalar_range)
+        if flip_y:
+            # 数据按从上到下存放（DICOM 零拷贝），沿 y 翻转显示
+            image_actor.SetScale(1, -1, 1)
+        self.image_actor = image_actor
+        self.filepath = filepath
+
+        # 清空并添加新 actor
+        self.renderer.RemoveAllViewProps()
+        self.renderer.AddActor(image_actor)
+        if self.overlay is not None:
+            self.renderer.AddActor2D(self.overlay)
+
+        # 相机设置
+        camera = self.renderer.GetActiveCamera()
+        camera.ParallelProjectionOn()
+        self.renderer.ResetCamera()
+
+        extent = display_extent
+        spacing = image_data.GetSpacing()
+        img_w = (extent[1] - extent[0] + 1) * spacing[0]
+        img_h = (extent[3] - extent[2] + 1) * spacing[1]
+
+        if img_w > 0 and img_h > 0:
+            rw = max(self.vtkWidget.width(), 1)
+            rh = max(self.vtkWidget.height(), 1)
+
+            view_aspect = rw / rh
+            img_aspect = img_w / img_h
+
+            if view_aspect > img_aspect:
+                scale = img_h / 2.0
+            else:
+                scale = img_w / (2.0 * view_aspect)
+
+            camera.SetParallelScale(scale)
+
+        self.geometry = (extent[3] - extent[2] + 1, spacing, flip_y)
+        self._home_camera = (camera.GetFocalPoint(), camera.GetPosition(), camera.GetParallelScale())
+        self.renderer.ResetCameraClippingRange()
+        with span("viewer.render"):
+            self.vtkWidget.GetRenderWindow().Render()
+
+        return True
+
+    @staticmethod
+    def _set_actor_input(image_actor, image_data, display_extent, scalar_range):
+        min_val, max_val = scalar_range
+        window = max_val - min_val
+        if window <= 0:
+            window = 1.0
+        level = (max_val + min_val) / 2.0
+
+        # window / level 交给 actor 的 property 在渲染时处理，
+        # 不再经过 vtkImageMapToWindowLevelColors 生成一份 RGBA 拷贝
+        image_actor.GetMapper().SetInputData(image_data)
+        image_actor.GetProperty().SetColorWindow(window)
+        image_actor.GetProperty().SetColorLevel(level)
+        image_actor.SetDisplayExtent(*display_extent)
+
+    # ====================================================
+    #  图像增强
+    # ====================================================
+    def set_enhancement(self, params):
+        """
+        params 为 enhance.EnhanceParams，None 或全部关闭时显示原图；已缓存的立即换上
+        """
+        from enhance import is_active
+
+        params = params if is_active(params) else None
+        if params == self.enhancement:
+            return
+        self.enhancement = params
+        self._refresh_image()
+
+    def _refresh_image(self):
+        """
+        按当前增强参数换掉 actor 的输入数据，相机与坐标映射不变
+        """
+        if self.image_actor is None or self.filepath is None:
+            return
+        loaded = self._load_image_data(self.filepath)
+        if loaded is None:
+            return
+        image_data, display_extent, _, scalar_range = loaded
+        self._set_actor_input(self.image_actor, image_data, display_extent, scalar_range)
+        with span("viewer.render"):
+            self.vtkWidget.GetRenderWindow().Render()
+
+    def _poll_enhancement(self):
+        future = self._enhance_pending
+        if future is None or future.done():
+            self._enhance_timer.stop()
+            self._enhance_pending = None
+            if future is not None and not future.cancelled() and future.exception() is None:
+                self._refresh_image()
+
+    def set_overlay_text(self, text):
+        if self.overlay is None:
+            # 文字渲染后端只在用到时加载
+            import vtkmodules.vtkRenderingFreeType  # noqa: F401
+
+            self.overlay = vtkTextActor()
+            prop = self.overlay.GetTextProperty()
+            prop.SetFontSize(14)
+            prop.SetColor(1.0, 0.85, 0.2)
+            prop.SetBackgroundColor(0.0, 0.0, 0.0)
+            prop.SetBackgroundOpacity(0.6)
+            prop.SetVerticalJustificationToTop()
+            self.overlay.GetPositionCoordinate().SetCoordinateSystemToNormalizedViewport()
+            self.overlay.SetPosition(0.01, 0.99)
+            self.renderer.AddActor2D(self.overlay)
+        self.overlay.SetInput(text)
+        self.vtkWidget.GetRenderWindow().Render()
+
+    # ====================================================
+    #  原图像素坐标 ↔ VTK 世界坐标
+    # ====================================================
+    def image_to_world(self, row, col):
+        rows, spacing, flip_y = self.geometry
+        # flip_y：数据从上到下存放，actor 沿 y 缩放 -1；否则第 0 行数据在最下面
+        y = -row * spacing[1] if flip_y else (rows - 1 - row) * spacing[1]
+        return col * spacing[0], y
+
+    def world_to_image(self, x, y):
+        rows, spacing, flip_y = self.geometry
+        row = -y / spacing[1] if flip_y else rows - 1 - y / spacing[1]
+        return row, x / spacing[0]
+
+    def focus_on(self, row, col, radius):
+        """
+        以原图 (row, col) 为中心放大，视野半高为 radius 个像素
+        """
+        if self.geometry is None:
+            return
+        x, y = self.image_to_world(row, col)
+        camera = self.renderer.GetActiveCamera()
+        fx, fy, fz = camera.GetFocalPoint()
+        px, py, pz = camera.GetPosition()
+        camera.SetFocalPoint(x, y, fz)
+        camera.SetPosition(x + px - fx, y + py - fy, pz)
+        camera.SetParallelScale(radius * self.geometry[1][1])
+        self.renderer.ResetCameraClippingRange()
+        with span("viewer.render"):
+            self.vtkWidget.GetRenderWindow().Render()
+
+    def reset_view(self):
+        if self._home_camera is None:
+            return
+        focal, position, scale = self._home_camera
+        camera = self.renderer.GetActiveCamera()
+        camera.SetFocalPoint(*focal)
+        camera.SetPosition(*position)
+        camera.SetParallelScale(scale)
+        self.renderer.ResetCameraClippingRange()
+        self.vtkWidget.GetRenderWindow().Render()
+
+    def _on_left_press(self, obj, event):
+        if self.geometry is None or not self.interactor.GetControlKey():
+            self.style.OnLeftButtonDown()
+            return
+        x, y = self.interactor.GetEventPosition()
+        self.renderer.SetDisplayPoint(x, y, 0)
+        self.renderer.DisplayToWorld()
+        wx, wy, _, w = self.renderer.GetWorldPoint()
+        if w:
+            wx, wy = wx / w, wy / w
+        self.imageClicked.emit(*self.world_to_image(wx, wy))
+
+    def _load_image_data(self, filepath):
+        """
+        返回 (vtkImageData, display_extent, flip_y, scalar_range)，不支持时返回 None。
+        reader 由 image_io.REGISTRY 按 magic bytes / 扩展名选择：
+        未压缩的 BMP / DICOM 走内存映射零拷贝，其他编码交给原生解码器或 pydicom。
+        解码结果与灰度范围都在 self.cache 里，再次显示同一文件时不重新解码。
+        设置了增强且结果已缓存时返回增强后的 uint8 图像。
+        """
+        try:
+            with span("image.decode"):
+                image = self.cache.load(filepath)
+        except UnsupportedImage:
+            return None
+        self.last_reader = image.source
+        if self.enhancement is not None:
+            from enhance import ENHANCE_CACHE
+
+            enhanced = ENHANCE_CACHE.cached(filepath, self.enhancement)
+            if enhanced is not None:
+                image_data, display_extent, flip_y = enhanced.to_vtk()
+                return image_data, display_extent, flip_y, (0.0, 255.0)
+            # 还没算好：先显示原图，后台算完由 _poll_enhancement 换上
+            self._enhance_pending = ENHANCE_CACHE.submit(filepath, self.enhancement)
+            self._enhance_timer.start()
+        image_data, display_extent, flip_y = image.to_vtk()
+        return image_data, display_extent, flip_y, self.cache.scalar_range(filepath)